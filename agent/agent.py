@@ -7,52 +7,230 @@ import hashlib
 import json
 import os
 import sys
-from datetime import datetime
-from typing import Dict
+from typing import Dict, List, Optional
+
+if __package__:
+    from . import eventlog, merkle, shadow, watch
+    from .manifest_db import ManifestDB, has_manifest
+    from .protect import DEFAULT_WORKERS, VerifyCache, print_progress, verify_hashes
+else:  # run as a script: python agent/agent.py
+    import eventlog
+    import merkle
+    import shadow
+    import watch
+    from manifest_db import ManifestDB, has_manifest
+    from protect import DEFAULT_WORKERS, VerifyCache, print_progress, verify_hashes
 
 LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "offline_logs", "agent.log")
 MANIFEST_PATH = os.path.join(os.path.dirname(__file__), "core_manifest.json")
+TREE_PATH = merkle.tree_path(MANIFEST_PATH)
+# when it exists and has entries, the SQLite manifest is used instead of core_manifest.json
+MANIFEST_DB_PATH = os.path.join(os.path.dirname(__file__), "core_manifest.db")
+SHADOW_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "shadow")
 KEYS_PATH = os.path.join(os.path.dirname(__file__), "keys.json")
+VERIFY_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "runtime_cache", "verify_cache.json")
 
 
-def _log(line: str) -> None:
-    os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
-    ts = datetime.utcnow().isoformat() + "Z"
-    with open(LOG_PATH, "a", encoding="utf-8") as f:
-        f.write(f"{ts} {line}\n")
+def _log(event: str, **fields) -> None:
+    eventlog.get_log(LOG_PATH).emit(event, **fields)
 
 
 def load_manifest() -> Dict[str, str]:
+    if has_manifest(MANIFEST_DB_PATH):
+        with ManifestDB(MANIFEST_DB_PATH, readonly=True) as db:
+            return db.manifest()
     if not os.path.exists(MANIFEST_PATH):
         return {}
     with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
-def verify_manifest() -> None:
-    manifest = load_manifest()
-    mismatches = []
-    missing = []
-    for path, saved_hash in manifest.items():
-        if not os.path.exists(path):
-            missing.append(path)
-            continue
-        h = hashlib.sha256()
-        try:
-            with open(path, "rb") as f:
-                for chunk in iter(lambda: f.read(8192), b""):
-                    h.update(chunk)
-            if h.hexdigest() != saved_hash:
-                mismatches.append(path)
-        except Exception as e:
-            mismatches.append(path)
+def load_tree() -> merkle.Node:
+    """Merkle tree of the manifest; rebuilt from the flat file if it is missing or stale."""
+    if os.path.exists(TREE_PATH) and (not os.path.exists(MANIFEST_PATH)
+                                      or os.stat(TREE_PATH).st_mtime_ns >= os.stat(MANIFEST_PATH).st_mtime_ns):
+        return merkle.load(TREE_PATH)
+    return merkle.build_tree(load_manifest())
+
+
+def verify_manifest(workers: int = DEFAULT_WORKERS, progress: bool = False, full: bool = False,
+                    subdir: Optional[str] = None) -> None:
+    started_at = eventlog.utc_now()
+    use_db = has_manifest(MANIFEST_DB_PATH)
+    if subdir:
+        if use_db:
+            with ManifestDB(MANIFEST_DB_PATH, readonly=True) as db:
+                manifest = db.manifest(subdir) or None
+        else:
+            manifest = merkle.subtree_manifest(load_tree(), subdir)
+        if manifest is None:
+            print(f"{subdir} is not tracked by the manifest")
+            sys.exit(1)
+    else:
+        manifest = load_manifest()
+    result = verify_hashes(manifest, workers, print_progress() if progress else None,
+                           cache=VerifyCache(VERIFY_CACHE_PATH), full=full)
+    if progress:
+        sys.stderr.write("\n")
+    missing = result["missing"]
+    mismatches = result["mismatched"]
+    stats = result["stats"]
     print(f"Manifest entries: {len(manifest)}")
     print(f"Missing: {len(missing)}")
     print(f"Mismatched: {len(mismatches)}")
-    if missing or mismatches:
-        _log(f"verify FAILED: missing={len(missing)} mismatched={len(mismatches)}")
+    print(f"Hashed {result['hashed']} files ({stats['bytes'] / (1 << 20):.1f} MiB) in {stats['seconds']:.2f}s "
+          f"({stats['mb_per_s']} MB/s); {result['cached']} unchanged since last verify")
+    mode = "full" if full else "fast"
+    if use_db:
+        with ManifestDB(MANIFEST_DB_PATH) as db:
+            run_id = db.record_run(result, "verify", mode, subdir, started_at)
+        print(f"Recorded as run {run_id} in {MANIFEST_DB_PATH}")
+    _log("verify", status="fail" if missing or mismatches else "ok", mode=mode, subdir=subdir, checked=len(manifest),
+         hashed=result["hashed"], cached=result["cached"], missing=len(missing), mismatched=len(mismatches),
+         paths=sorted(missing + mismatches))
+
+
+def diff_manifests(path_a: str, path_b: str) -> int:
+    """Print files added (+), removed (-) or changed (~) from A to B; returns the count."""
+    stats: Dict[str, int] = {}
+    changes = list(merkle.diff(merkle.load(path_a), merkle.load(path_b), stats=stats))
+    for status, path in changes:
+        print(status, path)
+    print(f"{len(changes)} difference(s); compared {stats.get('visited', 0)} tree nodes")
+    return len(changes)
+
+
+def watch_manifest(debounce: float, poll: bool, interval: float, workers: int) -> None:
+    """Run the integrity watch until interrupted (SIGTERM or Ctrl+C)."""
+    import signal
+    import threading
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    def log(event: str, **fields) -> None:
+        print(eventlog.format_record({"ts": eventlog.utc_now(), "event": event, **fields}), flush=True)
+        _log(event, **fields)
+
+    manifest_path = MANIFEST_DB_PATH if has_manifest(MANIFEST_DB_PATH) else MANIFEST_PATH
+    watch.watch(load_manifest, manifest_path, log, cache=VerifyCache(VERIFY_CACHE_PATH), debounce=debounce,
+                poll=poll, interval=interval, workers=workers, stop=stop)
+
+
+def snapshot_manifest(codec: str, note: str) -> None:
+    manifest = load_manifest()
+    store = shadow.ShadowStore(SHADOW_DIR)
+    stats = store.snapshot(list(manifest), codec, note, cache=VerifyCache(VERIFY_CACHE_PATH))
+    print(f"Snapshot {stats['id']}: {stats['files']} files, {stats['stored']} new objects "
+          f"({stats['bytes_stored']} bytes), {stats['skipped']} unchanged")
+    for path in stats["unreadable"]:
+        print("  not stored (missing or unreadable):", path)
+    _log("snapshot", id=stats["id"], files=stats["files"], new_objects=stats["stored"], bytes=stats["bytes_stored"],
+         paths=stats["unreadable"])
+
+
+def list_snapshots() -> None:
+    store = shadow.ShadowStore(SHADOW_DIR)
+    for snap_id in store.list_snapshots():
+        record = store.load_snapshot(snap_id)
+        note = f"  {record['note']}" if record.get("note") else ""
+        print(f"{snap_id}  {len(record['files'])} files{note}")
+
+
+def restore_files(paths: List[str], snap_id: Optional[str] = None, dry_run: bool = False) -> None:
+    """Restore files that fail verification from the shadow store.
+
+    Without --snapshot the target is the manifest (an object with the
+    manifest's hash must exist); with it, the files as they were in that snapshot.
+    """
+    store = shadow.ShadowStore(SHADOW_DIR)
+    modes: Dict[str, int] = {}
+    if snap_id:
+        record = store.load_snapshot(snap_id)
+        expected = {p: f["sha256"] for p, f in record["files"].items()}
+        modes = {p: f["mode"] for p, f in record["files"].items()}
     else:
-        _log("verify OK")
+        expected = load_manifest()
+    if paths:
+        tree = merkle.build_tree(expected)
+        wanted: Dict[str, str] = {}
+        for p in paths:
+            sub = merkle.subtree_manifest(tree, p)
+            if sub is None:
+                print(f"{p} is not tracked")
+                continue
+            wanted.update({k: v for k, v in expected.items() if merkle.join_path(merkle.split_path(k)) in sub})
+        expected = wanted
+    result = verify_hashes(expected, cache=VerifyCache(VERIFY_CACHE_PATH))
+    broken = sorted(result["missing"] + result["mismatched"])
+    if not broken:
+        print(f"All {len(expected)} files match; nothing to restore")
+        return
+    restored = failed = 0
+    for path in broken:
+        if dry_run:
+            print("would restore", path)
+            continue
+        mode = modes.get(path)
+        if mode is None and os.path.exists(path):
+            mode = os.stat(path).st_mode & 0o7777
+        try:
+            store.restore_file(expected[path], path, mode)
+        except (OSError, ValueError) as e:
+            failed += 1
+            print(f"cannot restore {path}: {e}")
+            _log("restore", status="fail", path=path, error=str(e))
+            continue
+        restored += 1
+        print("restored", path)
+        _log("restore", status="ok", path=path, sha256=expected[path], snapshot=snap_id)
+    if not dry_run:
+        print(f"Restored {restored} file(s), {failed} failed")
+
+
+def query_log(since: Optional[str], until: Optional[str], events: List[str], path: Optional[str],
+              tail: Optional[int], as_json: bool, log_path: str = LOG_PATH) -> None:
+    from collections import deque
+
+    records = eventlog.iter_records(log_path, eventlog.parse_time(since) if since else None,
+                                    eventlog.parse_time(until) if until else None, events or None, path)
+    if tail:
+        records = deque(records, maxlen=tail)
+    for record in records:
+        print(json.dumps(record, ensure_ascii=False) if as_json else eventlog.format_record(record))
+
+
+def db_command(action: str, json_path: str, run_id: Optional[int], limit: int) -> None:
+    """import/export between core_manifest.json and core_manifest.db, or show verify history.
+
+    Only import creates the database; the other actions open it read-only.
+    """
+    if action == "import":
+        with ManifestDB(MANIFEST_DB_PATH) as db:
+            n = db.import_json(json_path)
+        print(f"Imported {n} entries from {json_path} into {MANIFEST_DB_PATH}")
+        _log("db.import", source=json_path, entries=n)
+        return
+    if not os.path.exists(MANIFEST_DB_PATH):
+        print(f"No manifest database at {MANIFEST_DB_PATH}; create one with: agent db import")
+        sys.exit(1)
+    with ManifestDB(MANIFEST_DB_PATH, readonly=True) as db:
+        if action == "export":
+            if not db.count():
+                # never replace a real JSON manifest with an empty one
+                print(f"{MANIFEST_DB_PATH} has no manifest entries; {json_path} left unchanged")
+                sys.exit(1)
+            n = db.export_json(json_path)
+            print(f"Exported {n} entries to {json_path}")
+            _log("db.export", target=json_path, entries=n)
+        elif action == "runs" and run_id is None:
+            for r in db.runs(limit):
+                scope = f" {r['subdir']}" if r["subdir"] else ""
+                print(f"#{r['id']}  {r['started_at']}  {r['kind']} {r['mode']}{scope}  {r['status']}  "
+                      f"checked={r['checked']} hashed={r['hashed']} missing={r['missing']} mismatched={r['mismatched']}")
+        else:
+            for path, status in db.run_results(run_id):
+                print(status, path)
 
 
 def show_manifest():
@@ -79,13 +257,70 @@ def require_override(key: str) -> bool:
 def main():
     parser = argparse.ArgumentParser(description="CriderGPT agent helper")
     sub = parser.add_subparsers(dest="cmd")
-    sub.add_parser("verify", help="Verify manifest checksums for tracked files")
+    verify = sub.add_parser("verify", help="Verify manifest checksums for tracked files")
+    verify.add_argument("subdir", nargs="?", help="Only verify files under this directory")
+    verify.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Hashing threads")
+    verify.add_argument("--progress", action="store_true", help="Show a live progress line")
+    verify.add_argument("--full", action="store_true", help="Re-hash every file, ignoring the verification cache")
     sub.add_parser("show", help="Show manifest paths")
+    snap = sub.add_parser("snapshot", help="Store the manifest's files in the shadow/ object store")
+    snap.add_argument("--codec", choices=sorted(shadow.CODECS), default=shadow.DEFAULT_CODEC,
+                      help="Compression for new objects")
+    snap.add_argument("--note", default="", help="Free-form note saved with the snapshot")
+    snap.add_argument("--list", action="store_true", help="List snapshots instead of taking one")
+    restore = sub.add_parser("restore", help="Restore files that fail verification from shadow/")
+    restore.add_argument("paths", nargs="*", help="Limit to these files or directories")
+    restore.add_argument("--snapshot", help="Restore to this snapshot id instead of the manifest")
+    restore.add_argument("--dry-run", action="store_true", help="Only list what would be restored")
+    dbp = sub.add_parser("db", help="SQLite manifest: import/export JSON, show verify history")
+    dbp.add_argument("action", choices=["import", "export", "runs"])
+    dbp.add_argument("run_id", nargs="?", type=int, help="With runs: list the failed files of this run")
+    dbp.add_argument("--json", default=MANIFEST_PATH, help="JSON manifest to import from / export to")
+    dbp.add_argument("--limit", type=int, default=20, help="Number of runs to list")
+    lg = sub.add_parser("log", help="Query the structured agent log (rotated files included)")
+    lg.add_argument("--since", help='Start time: ISO date/time or relative like "15m", "2h", "7d"')
+    lg.add_argument("--until", help="End time (exclusive), same formats as --since")
+    lg.add_argument("--event", action="append", default=[], help='Event type, e.g. verify or watch (repeatable)')
+    lg.add_argument("--path", help="Only records about this path (substring or glob)")
+    lg.add_argument("--tail", type=int, help="Only the last N matching records")
+    lg.add_argument("--json", action="store_true", help="Print raw JSON Lines")
+    lg.add_argument("--file", default=LOG_PATH, help="Log file to read (default: %(default)s)")
+    w = sub.add_parser("watch", help="Keep running and re-verify protected files as they change")
+    w.add_argument("--debounce", type=float, default=watch.DEFAULT_DEBOUNCE,
+                   help="Seconds of quiet before a burst of writes is checked")
+    w.add_argument("--poll", action="store_true", help="Use stat polling instead of inotify")
+    w.add_argument("--interval", type=float, default=watch.DEFAULT_POLL_INTERVAL, help="Polling interval in seconds")
+    w.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Hashing threads")
+    diff = sub.add_parser("diff", help="Show files that differ between two manifests (flat or .merkle.json)")
+    diff.add_argument("manifest_a")
+    diff.add_argument("manifest_b")
     erase = sub.add_parser("erase", help="Advisory: Erase path (requires override)")
     erase.add_argument("path")
     args = parser.parse_args()
     if args.cmd == "verify":
-        verify_manifest()
+        verify_manifest(args.workers, args.progress, args.full, args.subdir)
+        return
+    if args.cmd == "diff":
+        if diff_manifests(args.manifest_a, args.manifest_b):
+            sys.exit(1)
+        return
+    if args.cmd == "snapshot":
+        if args.list:
+            list_snapshots()
+        else:
+            snapshot_manifest(args.codec, args.note)
+        return
+    if args.cmd == "restore":
+        restore_files(args.paths, args.snapshot, args.dry_run)
+        return
+    if args.cmd == "db":
+        db_command(args.action, args.json, args.run_id, args.limit)
+        return
+    if args.cmd == "log":
+        query_log(args.since, args.until, args.event, args.path, args.tail, args.json, args.file)
+        return
+    if args.cmd == "watch":
+        watch_manifest(args.debounce, args.poll, args.interval, args.workers)
         return
     if args.cmd == "show":
         show_manifest()
@@ -95,7 +330,7 @@ def main():
         k = input("Enter override key: ")
         if not require_override(k):
             print("Override key invalid. Action denied.")
-            _log(f"unauthorized erase attempt: {args.path}")
+            _log("erase", status="denied", path=args.path)
             sys.exit(1)
         # If valid, perform the destructive operation after confirmation
         confirm = input(f"CONFIRM erase {args.path}? Type YES to proceed: ")
@@ -108,13 +343,13 @@ def main():
                 else:
                     os.remove(args.path)
                 print("Erased")
-                _log(f"erase OK: {args.path}")
+                _log("erase", status="ok", path=args.path)
             except Exception as e:
                 print("Failed to erase:", e)
-                _log(f"erase FAIL: {args.path} {e}")
+                _log("erase", status="fail", path=args.path, error=str(e))
         else:
             print("Cancelled")
-            _log(f"erase cancelled: {args.path}")
+            _log("erase", status="cancelled", path=args.path)
 
 
 if __name__ == "__main__":
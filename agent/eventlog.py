@@ -0,0 +1,299 @@
+"""Structured event log shared by the agent tools and the backend.
+
+Records are JSON Lines, one object per event::
+
+    {"ts": "2026-01-02T03:04:05.678901Z", "event": "verify", "status": "ok", ...}
+
+`EventLog.emit` only puts the record on a bounded queue, so callers (request
+threads included) never wait on disk; a background thread writes whatever has
+queued up in one append and flushes. When the file passes `max_bytes` it is
+rotated to `<name>.1.gz`, `<name>.2.gz`, ... and the oldest is dropped.
+
+`iter_records` streams the rotated files and the live one line by line, so
+`python -m agent.agent log` can filter by time, event and path without
+loading the log into memory. Plain-text lines from older versions are read as
+{"event": "text", "message": ...}.
+"""
+import atexit
+import fnmatch
+import gzip
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+DEFAULT_MAX_BYTES = 5 << 20  # 5 MiB
+DEFAULT_BACKUPS = 5
+FLUSH_INTERVAL = 0.5
+QUEUE_SIZE = 10000
+
+_STOP = object()
+_RELATIVE = re.compile(r"^(\d+(?:\.\d+)?)([smhd])$")
+_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+
+
+def utc_now() -> str:
+    return _iso_z(datetime.now(timezone.utc))
+
+
+def _iso_z(dt: datetime) -> str:
+    # log timestamps are naive ISO strings with a "Z" suffix so they sort and compare as text
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat() + "Z"
+
+
+class EventLog:
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES, backups: int = DEFAULT_BACKUPS,
+                 flush_interval: float = FLUSH_INTERVAL, queue_size: int = QUEUE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue: "queue.Queue" = None
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+
+    # ------------------------------------------------------------- producer
+
+    def emit(self, event: str, **fields) -> bool:
+        """Queue one record; returns False (and counts a drop) if the queue is full."""
+        record = {"ts": utc_now(), "event": event}
+        record.update(fields)
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self) -> None:
+        """Block until everything queued so far is on disk."""
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def close(self) -> None:
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def stats(self) -> Dict[str, int]:
+        pending = self._queue.qsize() if self._queue is not None else 0
+        return {"written": self.written, "dropped": self.dropped, "rotations": self.rotations, "pending": pending}
+
+    def _ensure_writer(self) -> None:
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None:
+            return
+        with self._lock:
+            # (re)start after fork too: the parent's thread does not exist in the child
+            if self._pid != pid or self._thread is None:
+                self._pid = pid
+                self._queue = queue.Queue(self.queue_size)
+                self._file = None
+                self._thread = threading.Thread(target=self._run, name="eventlog", daemon=True)
+                self._thread.start()
+
+    # --------------------------------------------------------------- writer
+
+    def _run(self) -> None:
+        q = self._queue
+        while True:
+            batch = [q.get()]
+            try:
+                # give a burst a moment to accumulate, then take everything queued
+                while len(batch) < 1024:
+                    batch.append(q.get(timeout=self.flush_interval if len(batch) == 1 else 0))
+            except queue.Empty:
+                pass
+            stop = any(r is _STOP for r in batch)
+            records = [r for r in batch if r is not _STOP]
+            try:
+                if records:
+                    self._write(records)
+            except Exception:
+                self.dropped += len(records)
+            finally:
+                for _ in batch:
+                    q.task_done()
+            if stop:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                return
+
+    def _open(self):
+        if self._file is not None:
+            try:
+                # another process may have rotated the file from under us
+                if os.fstat(self._file.fileno()).st_ino == os.stat(self.path).st_ino:
+                    return self._file
+            except OSError:
+                pass
+            self._file.close()
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._file = open(self.path, "ab")
+        return self._file
+
+    def _write(self, records: List[dict]) -> None:
+        data = "".join(json.dumps(r, ensure_ascii=False, default=str, separators=(",", ":")) + "\n"
+                       for r in records).encode("utf-8")
+        f = self._open()
+        f.write(data)
+        f.flush()
+        self.written += len(records)
+        if self.max_bytes and f.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        self._file = None
+        rotating = f"{self.path}.rotating-{os.getpid()}"
+        try:
+            os.replace(self.path, rotating)
+        except OSError:
+            return
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}.gz"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}.gz")
+        if self.backups > 0:
+            with open(rotating, "rb") as src, gzip.open(f"{self.path}.1.gz.tmp", "wb") as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+            os.replace(f"{self.path}.1.gz.tmp", f"{self.path}.1.gz")
+        os.remove(rotating)
+        self.rotations += 1
+
+
+_LOGS: Dict[str, EventLog] = {}
+_LOGS_LOCK = threading.Lock()
+
+
+def get_log(path: str, **kwargs) -> EventLog:
+    """One EventLog per file per process, flushed at interpreter exit."""
+    key = os.path.abspath(path)
+    with _LOGS_LOCK:
+        log = _LOGS.get(key)
+        if log is None:
+            log = _LOGS[key] = EventLog(path, **kwargs)
+        return log
+
+
+@atexit.register
+def _close_all() -> None:
+    for log in list(_LOGS.values()):
+        log.close()
+
+
+# ------------------------------------------------------------------ query
+
+
+def parse_time(value: str, now: Optional[datetime] = None) -> str:
+    """Turn "15m", "2h", "7d" (ago) or an ISO date/time prefix into a comparable ts string."""
+    m = _RELATIVE.match(value.strip())
+    if m:
+        now = now or datetime.now(timezone.utc)
+        return _iso_z(now - timedelta(**{_UNITS[m.group(2)]: float(m.group(1))}))
+    return value.strip().replace(" ", "T")
+
+
+def log_files(path: str) -> List[str]:
+    """Rotated files oldest first, then the live log."""
+    d = os.path.dirname(path) or "."
+    base = os.path.basename(path)
+    rotated = []
+    if os.path.isdir(d):
+        for fn in os.listdir(d):
+            m = re.match(re.escape(base) + r"\.(\d+)\.gz$", fn)
+            if m:
+                rotated.append((int(m.group(1)), os.path.join(d, fn)))
+    files = [p for _, p in sorted(rotated, reverse=True)]
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def _parse_line(line: str) -> Optional[dict]:
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith("{"):
+        try:
+            return json.loads(line)
+        except ValueError:
+            pass
+    ts, _, message = line.partition(" ")
+    return {"ts": ts, "event": "text", "message": message}
+
+
+def _paths_of(record: dict) -> Iterable[str]:
+    if isinstance(record.get("path"), str):
+        yield record["path"]
+    paths = record.get("paths")
+    if isinstance(paths, list):
+        yield from (p for p in paths if isinstance(p, str))
+
+
+def iter_records(path: str, since: Optional[str] = None, until: Optional[str] = None,
+                 events: Optional[List[str]] = None, path_glob: Optional[str] = None) -> Iterator[dict]:
+    """Stream matching records oldest first. `until` is exclusive.
+
+    An event filter "watch" matches "watch" and "watch.*".
+    """
+    # cheap prefilter on the raw line before decoding JSON. Lines hold the path
+    # JSON-escaped (a Windows path's backslashes are doubled), so the needle is
+    # escaped the same way; non-ASCII needles skip it (escaped vs. written raw).
+    needle = None
+    if path_glob and not any(c in path_glob for c in "*?["):
+        escaped = json.dumps(path_glob)[1:-1]
+        if "\\u" not in escaped:
+            needle = escaped
+    for fn in log_files(path):
+        opener = gzip.open if fn.endswith(".gz") else open
+        with opener(fn, "rt", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if needle is not None and needle not in line:
+                    continue
+                record = _parse_line(line)
+                if record is None:
+                    continue
+                ts = str(record.get("ts", ""))
+                if since and ts < since:
+                    continue
+                if until and ts >= until:
+                    continue
+                if events:
+                    ev = str(record.get("event", ""))
+                    if not any(ev == e or ev.startswith(e + ".") for e in events):
+                        continue
+                if path_glob and not any(fnmatch.fnmatch(p, path_glob) or path_glob in p
+                                         for p in _paths_of(record)):
+                    continue
+                yield record
+
+
+def format_record(record: dict) -> str:
+    """One human-readable line: ts event key=value ..."""
+    rest = " ".join(f"{k}={v}" for k, v in record.items()
+                    if k not in ("ts", "event", "message") and v is not None)
+    parts = [str(record.get("ts", "")), str(record.get("event", ""))]
+    if record.get("message"):
+        parts.append(str(record["message"]))
+    if rest:
+        parts.append(rest)
+    return " ".join(parts)
@@ -0,0 +1,232 @@
+"""SQLite backend for the integrity manifest (`agent/core_manifest.db`).
+
+The JSON manifest has to be parsed and rewritten as one blob. The database
+instead keeps one row per protected file, indexed by normalized path (so a
+directory is a range scan) and by parent directory. Writes are batched upserts
+in a single transaction, and every verify run is kept in history tables:
+
+    files        path, norm, dir, sha256, size, mtime_ns, verified_at, status
+    runs         id, started_at, finished_at, kind, mode, subdir, checked, hashed, cached, missing, mismatched, status
+    run_results  run_id, path, status   (only files that were missing or mismatched)
+
+`import_json` / `export_json` convert to and from the flat core_manifest.json
+format, which stays the default unless the database exists and has `files`
+rows (`has_manifest`). Only `import_json` and `protect.py --db` create a
+database; everything that just reads one opens it with `readonly=True`.
+"""
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.request import pathname2url
+
+if __package__:
+    from . import merkle
+else:  # run as a script from agent/
+    import merkle
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    norm TEXT NOT NULL,
+    dir TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    verified_at TEXT,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS files_norm ON files(norm);
+CREATE INDEX IF NOT EXISTS files_dir ON files(dir);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    kind TEXT NOT NULL,
+    mode TEXT,
+    subdir TEXT,
+    checked INTEGER,
+    hashed INTEGER,
+    cached INTEGER,
+    missing INTEGER,
+    mismatched INTEGER,
+    status TEXT
+);
+CREATE TABLE IF NOT EXISTS run_results (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS run_results_run ON run_results(run_id);
+CREATE INDEX IF NOT EXISTS run_results_path ON run_results(path);
+"""
+
+Entry = Tuple[str, str, Optional[int], Optional[int]]  # path, sha256, size, mtime_ns
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + "Z"
+
+
+def normalize(path: str) -> str:
+    return merkle.join_path(merkle.split_path(path))
+
+
+def _prefix_range(subdir: str) -> Tuple[str, str]:
+    # every norm strictly under `prefix/` sorts in [prefix/, prefix0): "0" follows "/"
+    prefix = normalize(subdir).rstrip("/")
+    return prefix + "/", prefix + "0"
+
+
+def entries_for(manifest: Dict[str, str]) -> List[Entry]:
+    """Attach current size/mtime to a path -> sha256 map (None for missing files)."""
+    entries = []
+    for path, digest in manifest.items():
+        try:
+            st = os.stat(path)
+            entries.append((path, digest, st.st_size, st.st_mtime_ns))
+        except OSError:
+            entries.append((path, digest, None, None))
+    return entries
+
+
+def has_manifest(path: str) -> bool:
+    """True if `path` is a manifest database with at least one file row."""
+    if not os.path.exists(path):
+        return False
+    try:
+        with ManifestDB(path, readonly=True) as db:
+            return db.count() > 0
+    except sqlite3.Error:
+        return False
+
+
+class ManifestDB:
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        self.readonly = readonly
+        if readonly:
+            # mode=ro never creates the file: a missing database is an error, not an empty manifest
+            uri = "file:" + pathname2url(os.path.abspath(path)) + "?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True)
+            return
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------------------------------------------------------------- files
+
+    def _upsert(self, entries: Iterable[Entry]) -> int:
+        rows = []
+        for path, digest, size, mtime_ns in entries:
+            norm = normalize(path)
+            rows.append((path, norm, os.path.dirname(norm), digest, size, mtime_ns))
+        self.conn.executemany(
+            "INSERT INTO files (path, norm, dir, sha256, size, mtime_ns) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET sha256=excluded.sha256, size=excluded.size, "
+            "mtime_ns=excluded.mtime_ns, verified_at=NULL, status=NULL "
+            "WHERE files.sha256 IS NOT excluded.sha256 OR files.size IS NOT excluded.size "
+            "OR files.mtime_ns IS NOT excluded.mtime_ns",
+            rows,
+        )
+        return len(rows)
+
+    def upsert(self, entries: Iterable[Entry]) -> int:
+        """Insert or update rows in one transaction; returns the row count."""
+        with self.conn:
+            return self._upsert(entries)
+
+    def replace(self, entries: Iterable[Entry]) -> int:
+        """Make the table hold exactly `entries`, in one transaction."""
+        entries = list(entries)
+        with self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep (path TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM keep")
+            self.conn.executemany("INSERT OR IGNORE INTO keep VALUES (?)", ((e[0],) for e in entries))
+            self.conn.execute("DELETE FROM files WHERE path NOT IN (SELECT path FROM keep)")
+            return self._upsert(entries)
+
+    def manifest(self, subdir: Optional[str] = None) -> Dict[str, str]:
+        """path -> sha256, for everything or just the files under subdir."""
+        if not subdir:
+            cur = self.conn.execute("SELECT path, sha256 FROM files")
+        else:
+            lo, hi = _prefix_range(subdir)
+            cur = self.conn.execute(
+                "SELECT path, sha256 FROM files WHERE norm = ? OR (norm >= ? AND norm < ?)",
+                (normalize(subdir), lo, hi))
+        return dict(cur)
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    # ------------------------------------------------------------- history
+
+    def record_run(self, result: Dict[str, object], kind: str = "verify", mode: str = "fast",
+                   subdir: Optional[str] = None, started_at: Optional[str] = None) -> int:
+        """Store a verify_hashes result and stamp the files it covered; returns the run id."""
+        finished = _now()
+        missing: List[str] = result["missing"]
+        mismatched: List[str] = result["mismatched"]
+        status = "fail" if missing or mismatched else "ok"
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO runs (started_at, finished_at, kind, mode, subdir, checked, hashed, cached, "
+                "missing, mismatched, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (started_at or finished, finished, kind, mode, subdir, result["checked"], result.get("hashed"),
+                 result.get("cached"), len(missing), len(mismatched), status))
+            run_id = cur.lastrowid
+            self.conn.executemany(
+                "INSERT INTO run_results (run_id, path, status) VALUES (?, ?, ?)",
+                [(run_id, p, "missing") for p in missing] + [(run_id, p, "mismatched") for p in mismatched])
+            if subdir:
+                lo, hi = _prefix_range(subdir)
+                self.conn.execute(
+                    "UPDATE files SET verified_at = ?, status = 'ok' WHERE norm = ? OR (norm >= ? AND norm < ?)",
+                    (finished, normalize(subdir), lo, hi))
+            else:
+                self.conn.execute("UPDATE files SET verified_at = ?, status = 'ok'", (finished,))
+            self.conn.executemany("UPDATE files SET status = ? WHERE path = ?",
+                                  [("missing", p) for p in missing] + [("mismatched", p) for p in mismatched])
+        return run_id
+
+    def runs(self, limit: int = 20) -> List[sqlite3.Row]:
+        self.conn.row_factory = sqlite3.Row
+        try:
+            return self.conn.execute("SELECT * FROM runs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        finally:
+            self.conn.row_factory = None
+
+    def run_results(self, run_id: int) -> List[Tuple[str, str]]:
+        return self.conn.execute(
+            "SELECT path, status FROM run_results WHERE run_id = ? ORDER BY path", (run_id,)).fetchall()
+
+    # ---------------------------------------------------------- JSON compat
+
+    def import_json(self, json_path: str) -> int:
+        with open(json_path, "r", encoding="utf-8") as f:
+            return self.replace(entries_for(json.load(f)))
+
+    def export_json(self, json_path: str) -> int:
+        manifest = self.manifest()
+        d = os.path.dirname(json_path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        return len(manifest)
@@ -0,0 +1,157 @@
+"""Merkle-tree form of a path -> sha256 manifest.
+
+Every directory node carries a hash over its children's names, kinds and
+hashes, so two trees can be compared by descending only into subtrees whose
+hashes differ, and one directory can be pulled out of a large manifest
+without scanning every entry.
+
+File layout (written next to the flat manifest as `<name>.merkle.json`)::
+
+    {"version": 1, "root": {"hash": ..., "children": {name: node, ...}}}
+
+A file node is {"hash": sha256}; a directory node also has "children".
+"""
+import hashlib
+import json
+import os
+import posixpath
+from typing import Dict, Iterator, List, Optional, Tuple
+
+TREE_VERSION = 1
+
+Node = Dict[str, object]
+
+
+def tree_path(manifest_path: str) -> str:
+    return os.path.splitext(manifest_path)[0] + ".merkle.json"
+
+
+def split_path(path: str) -> List[str]:
+    """Manifest key -> tree components ("./agent/x.py" -> ["agent", "x.py"])."""
+    norm = posixpath.normpath(path.replace(os.sep, "/"))
+    if norm == ".":
+        return []
+    parts = norm.split("/")
+    # keep the leading "" of absolute paths so joining restores the root
+    return [p for i, p in enumerate(parts) if p or i == 0]
+
+
+def join_path(parts: List[str]) -> str:
+    if parts == [""]:
+        return "/"
+    return "/".join(parts)
+
+
+def _dir_hash(children: Dict[str, Node]) -> str:
+    h = hashlib.sha256()
+    for name in sorted(children):
+        child = children[name]
+        kind = "d" if "children" in child else "f"
+        h.update(f"{kind} {name}\0{child['hash']}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def build_tree(manifest: Dict[str, str]) -> Node:
+    root: Node = {"children": {}}
+    for path, digest in manifest.items():
+        parts = split_path(path)
+        if not parts:
+            continue
+        node = root
+        for name in parts[:-1]:
+            children = node["children"]
+            node = children.get(name)
+            if node is None or "children" not in node:
+                node = children[name] = {"children": {}}
+        node["children"][parts[-1]] = {"hash": digest}
+
+    def seal(node: Node) -> None:
+        children = node.get("children")
+        if children is None:
+            return
+        for child in children.values():
+            seal(child)
+        node["hash"] = _dir_hash(children)
+
+    seal(root)
+    return root
+
+
+def find(root: Node, subdir: str) -> Optional[Node]:
+    """Node for a directory (or file) path, or None if it is not in the tree."""
+    node = root
+    for name in split_path(subdir):
+        children = node.get("children")
+        if children is None or name not in children:
+            return None
+        node = children[name]
+    return node
+
+
+def iter_files(node: Node, prefix: List[str]) -> Iterator[Tuple[str, str]]:
+    """Yield (path, sha256) for every file under node."""
+    children = node.get("children")
+    if children is None:
+        yield join_path(prefix), node["hash"]
+        return
+    for name in sorted(children):
+        yield from iter_files(children[name], prefix + [name])
+
+
+def subtree_manifest(root: Node, subdir: str) -> Optional[Dict[str, str]]:
+    node = find(root, subdir)
+    if node is None:
+        return None
+    return dict(iter_files(node, split_path(subdir)))
+
+
+def diff(a: Node, b: Node, prefix: Optional[List[str]] = None,
+         stats: Optional[Dict[str, int]] = None) -> Iterator[Tuple[str, str]]:
+    """Yield (status, path) with status "+" added, "-" removed or "~" changed.
+
+    Subtrees with equal hashes are skipped without being visited; `stats`
+    (if given) counts the nodes that were compared.
+    """
+    prefix = prefix or []
+    if stats is not None:
+        stats["visited"] = stats.get("visited", 0) + 1
+    if a["hash"] == b["hash"]:
+        return
+    a_children, b_children = a.get("children"), b.get("children")
+    if a_children is None or b_children is None:
+        if a_children is None and b_children is None:
+            yield "~", join_path(prefix)
+        else:
+            # a file replaced by a directory, or the other way round
+            for path, _ in iter_files(a, prefix):
+                yield "-", path
+            for path, _ in iter_files(b, prefix):
+                yield "+", path
+        return
+    for name in sorted(set(a_children) | set(b_children)):
+        path = prefix + [name]
+        if name not in b_children:
+            for p, _ in iter_files(a_children[name], path):
+                yield "-", p
+        elif name not in a_children:
+            for p, _ in iter_files(b_children[name], path):
+                yield "+", p
+        else:
+            yield from diff(a_children[name], b_children[name], path, stats)
+
+
+def save_tree(root: Node, out_path: str) -> None:
+    d = os.path.dirname(out_path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump({"version": TREE_VERSION, "root": root}, f, separators=(",", ":"), sort_keys=True)
+
+
+def load(path: str) -> Node:
+    """Load a Merkle manifest, or build the tree from a flat manifest file."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict) and data.get("version") == TREE_VERSION and isinstance(data.get("root"), dict):
+        return data["root"]
+    return build_tree(data)
@@ -3,46 +3,327 @@
 Usage:
   python -m agent.protect --paths path1 path2 --out agent/core_manifest.json
 
+Hashing runs on a bounded thread pool (hashlib releases the GIL while it
+digests), files are read in large blocks or mmapped when big, and directories
+are walked with os.scandir. `agent.agent verify` and `agent/runtime_init.py`
+use the same engine.
+
+Verification can be backed by a VerifyCache: a file whose stat signature
+(size, mtime_ns, inode, ctime_ns) matches the one recorded when it was last
+hashed is trusted without re-reading it, so an unchanged tree verifies in
+milliseconds. Pass full=True to re-hash everything.
+
 This module is intentionally minimal and designed to be run locally by Jessie.
 """
+import fnmatch
 import hashlib
 import json
+import mmap
 import os
-from typing import Dict, List
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+if __package__:
+    from . import merkle
+else:  # run as a script: python agent/protect.py
+    import merkle
+
+Signature = Tuple[int, int, int, int]
+
+READ_BLOCK = 1 << 20  # 1 MiB
+MMAP_THRESHOLD = 64 << 20  # files at least this big are hashed through mmap
+DEFAULT_EXCLUDES = ("__pycache__", "*.pyc")
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 2)
+CACHE_VERSION = 1
+# files modified this close to the cache write could change again within the
+# same mtime tick without the signature moving; they are re-hashed next time
+RACY_WINDOW_NS = 2_000_000_000
+
+Progress = Callable[[int, int, float], None]
 
 
 def sha256_of_file(path: str) -> str:
     h = hashlib.sha256()
     with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                h.update(m)
+        else:
+            buf = bytearray(min(READ_BLOCK, max(size, 1)))
+            view = memoryview(buf)
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                h.update(view[:n])
     return h.hexdigest()
 
 
-def build_manifest(paths: List[str]) -> Dict[str, str]:
-    manifest: Dict[str, str] = {}
+def _matches(path: str, name: str, patterns: Sequence[str]) -> bool:
+    posix = path.replace(os.sep, "/")
+    return any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(posix, p) for p in patterns)
+
+
+def iter_files(paths: Iterable[str], include: Optional[Sequence[str]] = None,
+               exclude: Sequence[str] = DEFAULT_EXCLUDES) -> Iterator[Tuple[str, int]]:
+    """Yield (path, size) for files under `paths`, walking with os.scandir.
+
+    `exclude` globs prune files and whole directories (matched against the
+    entry name or its full path); `include` globs, when given, select files.
+    """
     for p in paths:
         if os.path.isfile(p):
-            manifest[p] = sha256_of_file(p)
-        elif os.path.isdir(p):
-            for root, _, files in os.walk(p):
-                for fn in files:
-                    full = os.path.join(root, fn)
-                    try:
-                        manifest[full] = sha256_of_file(full)
-                    except Exception:
-                        # skip unreadable files
-                        continue
-        else:
+            try:
+                yield p, os.stat(p).st_size
+            except OSError:
+                continue
+            continue
+        if not os.path.isdir(p):
             # path doesn't exist; skip
             continue
-    return manifest
+        stack = [p]
+        while stack:
+            d = stack.pop()
+            try:
+                with os.scandir(d) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError:
+                continue
+            subdirs = []
+            for e in entries:
+                if exclude and _matches(e.path, e.name, exclude):
+                    continue
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        subdirs.append(e.path)
+                    elif e.is_file():
+                        if include and not _matches(e.path, e.name, include):
+                            continue
+                        yield e.path, e.stat().st_size
+                except OSError:
+                    continue
+            stack.extend(reversed(subdirs))
+
+
+class HashStats:
+    """Running totals for a hashing pass; `mb_per_s` is read throughput."""
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    @property
+    def mb_per_s(self) -> float:
+        return (self.bytes / (1 << 20)) / self.seconds if self.seconds > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {"files": self.files, "bytes": self.bytes, "errors": self.errors,
+                "seconds": round(self.seconds, 3), "mb_per_s": round(self.mb_per_s, 1)}
+
+
+def hash_files(files: Iterable[Tuple[str, int]], workers: int = DEFAULT_WORKERS,
+               progress: Optional[Progress] = None) -> Tuple[Dict[str, Optional[str]], HashStats]:
+    """Hash (path, size) pairs in parallel; unreadable files map to None.
+
+    At most `workers * 4` files are queued at once, so huge trees stream
+    through without materializing every future up front.
+    """
+    stats = HashStats()
+    results: Dict[str, Optional[str]] = {}
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(max(1, workers) * 4)
+
+    def work(path: str, size: int) -> None:
+        try:
+            try:
+                digest = sha256_of_file(path)
+            except Exception:
+                digest = None
+            with lock:
+                results[path] = digest
+                stats.files += 1
+                if digest is None:
+                    stats.errors += 1
+                else:
+                    stats.bytes += size
+                stats.seconds = time.perf_counter() - stats.started
+                if progress:
+                    progress(stats.files, stats.bytes, stats.seconds)
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max(1, workers), thread_name_prefix="hash") as pool:
+        for path, size in files:
+            slots.acquire()
+            pool.submit(work, path, size)
+    stats.seconds = time.perf_counter() - stats.started
+    return results, stats
+
+
+def print_progress(stream=sys.stderr, every: float = 0.5) -> Progress:
+    """Progress callback that rewrites one status line at most every `every` s."""
+    last = [0.0]
+
+    def report(files: int, nbytes: int, seconds: float) -> None:
+        if seconds - last[0] < every:
+            return
+        last[0] = seconds
+        rate = (nbytes / (1 << 20)) / seconds if seconds > 0 else 0.0
+        stream.write(f"\r  hashed {files} files, {nbytes / (1 << 20):.1f} MiB at {rate:.1f} MB/s")
+        stream.flush()
 
+    return report
 
-def save_manifest(manifest: Dict[str, str], out_path: str) -> None:
+
+def hash_tree(paths: List[str], include: Optional[Sequence[str]] = None,
+              exclude: Sequence[str] = DEFAULT_EXCLUDES, workers: int = DEFAULT_WORKERS,
+              progress: Optional[Progress] = None) -> Tuple[Dict[str, str], HashStats]:
+    results, stats = hash_files(iter_files(paths, include, exclude), workers, progress)
+    # skip unreadable files
+    return {p: h for p, h in results.items() if h is not None}, stats
+
+
+def build_manifest(paths: List[str], include: Optional[Sequence[str]] = None,
+                   exclude: Sequence[str] = DEFAULT_EXCLUDES, workers: int = DEFAULT_WORKERS,
+                   progress: Optional[Progress] = None) -> Dict[str, str]:
+    return hash_tree(paths, include, exclude, workers, progress)[0]
+
+
+def stat_signature(st: os.stat_result) -> Signature:
+    return (st.st_size, st.st_mtime_ns, st.st_ino, st.st_ctime_ns)
+
+
+class VerifyCache:
+    """Persistent path -> (stat signature, sha256) map used by verify_hashes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Tuple[Signature, str]] = {}
+        self.dirty = False
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            return
+        for path, entry in data.get("entries", {}).items():
+            try:
+                size, mtime_ns, ino, ctime_ns, digest = entry
+            except (TypeError, ValueError):
+                continue
+            self.entries[path] = ((size, mtime_ns, ino, ctime_ns), digest)
+
+    def lookup(self, path: str, sig: Signature) -> Optional[str]:
+        """Cached hash for path if its signature is unchanged, else None."""
+        entry = self.entries.get(path)
+        if entry is None or entry[0] != sig:
+            return None
+        return entry[1]
+
+    def update(self, path: str, sig: Signature, digest: str) -> None:
+        if self.entries.get(path) != (sig, digest):
+            self.entries[path] = (sig, digest)
+            self.dirty = True
+
+    def discard(self, path: str) -> None:
+        if self.entries.pop(path, None) is not None:
+            self.dirty = True
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        now = time.time_ns()
+        entries = {p: [*sig, digest] for p, (sig, digest) in sorted(self.entries.items())
+                   if now - sig[1] > RACY_WINDOW_NS}
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "entries": entries}, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+def verify_hashes(manifest: Dict[str, str], workers: int = DEFAULT_WORKERS,
+                  progress: Optional[Progress] = None, cache: Optional[VerifyCache] = None,
+                  full: bool = False) -> Dict[str, object]:
+    """Verify manifest entries; returns missing/mismatched lists and stats.
+
+    With a cache, files whose stat signature is unchanged are trusted
+    (`cached` in the result) and only the rest are re-hashed; `full=True`
+    re-hashes every file and refreshes the cache.
+    """
+    missing: List[str] = []
+    mismatched: List[str] = []
+    stale: List[Tuple[str, int]] = []
+    sigs: Dict[str, Signature] = {}
+    cached = 0
+    for path, expected in manifest.items():
+        try:
+            sig = stat_signature(os.stat(path))
+        except OSError:
+            missing.append(path)
+            if cache is not None:
+                cache.discard(path)
+            continue
+        digest = cache.lookup(path, sig) if cache is not None and not full else None
+        if digest is None:
+            sigs[path] = sig
+            stale.append((path, sig[0]))
+            continue
+        cached += 1
+        if digest != expected:
+            mismatched.append(path)
+    results, stats = hash_files(stale, workers, progress)
+    for path, digest in results.items():
+        if digest != manifest[path]:
+            mismatched.append(path)
+        if cache is None:
+            continue
+        if digest is None:
+            cache.discard(path)
+            continue
+        try:
+            sig = stat_signature(os.stat(path))
+        except OSError:
+            continue
+        # only remember the hash if the file did not change while being read
+        if sig == sigs[path]:
+            cache.update(path, sig, digest)
+    if cache is not None:
+        try:
+            cache.save()
+        except OSError:
+            pass
+    return {
+        "checked": len(manifest),
+        "cached": cached,
+        "hashed": len(stale),
+        "missing": sorted(missing),
+        "mismatched": sorted(mismatched),
+        "stats": stats.as_dict(),
+    }
+
+
+def save_manifest(manifest: Dict[str, str], out_path: str, tree: bool = True) -> None:
+    """Write the flat manifest and, unless tree=False, its Merkle tree beside it."""
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
     with open(out_path, "w", encoding="utf-8") as f:
         json.dump(manifest, f, indent=2, sort_keys=True)
+    if tree:
+        merkle.save_tree(merkle.build_tree(manifest), merkle.tree_path(out_path))
 
 
 if __name__ == "__main__":
@@ -51,7 +332,30 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Compute checksums for paths and save manifest")
     parser.add_argument("--paths", nargs="+", help="Paths to include", required=True)
     parser.add_argument("--out", help="Output manifest JSON path", required=True)
+    parser.add_argument("--include", nargs="*", help="Only hash files matching these globs")
+    parser.add_argument("--exclude", nargs="*", default=list(DEFAULT_EXCLUDES),
+                        help="Skip files/directories matching these globs (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Hashing threads")
+    parser.add_argument("--progress", action="store_true", help="Show a live progress line")
+    parser.add_argument("--no-tree", action="store_true", help="Do not write the .merkle.json tree manifest")
+    parser.add_argument("--db", help="Also write the manifest to this SQLite database (default: the .db beside "
+                                     "--out, if one exists)")
     args = parser.parse_args()
-    m = build_manifest(args.paths)
-    save_manifest(m, args.out)
-    print(f"Wrote manifest with {len(m)} entries to {args.out}")
+    m, s = hash_tree(args.paths, args.include, args.exclude, args.workers,
+                     print_progress() if args.progress else None)
+    if args.progress:
+        sys.stderr.write("\n")
+    save_manifest(m, args.out, tree=not args.no_tree)
+    # an existing database takes precedence over the JSON, so it must not be left stale
+    sibling_db = os.path.splitext(args.out)[0] + ".db"
+    db_path = args.db or (sibling_db if os.path.exists(sibling_db) else None)
+    if db_path:
+        if __package__:
+            from .manifest_db import ManifestDB, entries_for
+        else:
+            from manifest_db import ManifestDB, entries_for
+        with ManifestDB(db_path) as db:
+            db.replace(entries_for(m))
+        print(f"Updated {db_path}")
+    print(f"Wrote manifest with {len(m)} entries to {args.out} "
+          f"({s.bytes / (1 << 20):.1f} MiB in {s.seconds:.2f}s, {s.mb_per_s:.1f} MB/s)")
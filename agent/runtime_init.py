@@ -10,56 +10,54 @@ This script performs a safe, offline 'initialization' step:
 Run this at startup manually to simulate system initialization. It does NOT
 change system-level protections by itself.
 """
-import hashlib
 import json
 import os
 import stat
 import sys
-from datetime import datetime
+
+if __package__:
+    from . import eventlog
+    from .manifest_db import ManifestDB, has_manifest
+    from .protect import VerifyCache, verify_hashes
+else:  # run as a script: python agent/runtime_init.py
+    import eventlog
+    from manifest_db import ManifestDB, has_manifest
+    from protect import VerifyCache, verify_hashes
 
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 LOG_PATH = os.path.join(ROOT, 'offline_logs', 'agent.log')
 MANIFEST_PATH = os.path.join(ROOT, 'agent', 'core_manifest.json')
+MANIFEST_DB_PATH = os.path.join(ROOT, 'agent', 'core_manifest.db')
 VERSION_META = os.path.join(ROOT, 'tools', 'version_metadata.json')
+VERIFY_CACHE_PATH = os.path.join(ROOT, 'runtime_cache', 'verify_cache.json')
 
 
-def log(line: str) -> None:
-    os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
-    ts = datetime.utcnow().isoformat() + 'Z'
-    with open(LOG_PATH, 'a', encoding='utf-8') as f:
-        f.write(f"{ts} {line}\n")
-
+def log(event: str, **fields) -> None:
+    eventlog.get_log(LOG_PATH).emit(event, **fields)
 
-def sha256_of_file(path: str) -> str:
-    h = hashlib.sha256()
-    with open(path, 'rb') as f:
-        for chunk in iter(lambda: f.read(8192), b''):
-            h.update(chunk)
-    return h.hexdigest()
 
-
-def verify_manifest() -> dict:
-    if not os.path.exists(MANIFEST_PATH):
-        log('runtime_init: manifest missing')
+def verify_manifest(full: bool = False) -> dict:
+    """Fast by default: files whose stat signature is unchanged are not re-hashed."""
+    started_at = eventlog.utc_now()
+    use_db = has_manifest(MANIFEST_DB_PATH)
+    if use_db:
+        with ManifestDB(MANIFEST_DB_PATH, readonly=True) as db:
+            manifest = db.manifest()
+    elif os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    else:
+        log('runtime_init.verify', status='no-manifest')
         return {'status': 'no-manifest', 'checked': 0}
-    with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
-        manifest = json.load(f)
-    mismatched = []
-    missing = []
-    checked = 0
-    for p, h in manifest.items():
-        checked += 1
-        if not os.path.exists(p):
-            missing.append(p)
-            continue
-        try:
-            cur = sha256_of_file(p)
-            if cur != h:
-                mismatched.append(p)
-        except Exception:
-            mismatched.append(p)
-    status = {'status': 'ok' if not (missing or mismatched) else 'fail', 'checked': checked, 'missing': missing, 'mismatched': mismatched}
-    log(f"runtime_init: verify manifest result: {status['status']} checked={checked} missing={len(missing)} mismatched={len(mismatched)}")
+    result = verify_hashes(manifest, cache=VerifyCache(VERIFY_CACHE_PATH), full=full)
+    if use_db:
+        with ManifestDB(MANIFEST_DB_PATH) as db:
+            db.record_run(result, 'runtime_init', 'full' if full else 'fast', started_at=started_at)
+    missing, mismatched, checked = result['missing'], result['mismatched'], result['checked']
+    status = {'status': 'ok' if not (missing or mismatched) else 'fail', 'checked': checked, 'missing': missing, 'mismatched': mismatched, 'stats': result['stats']}
+    log('runtime_init.verify', status=status['status'], mode='full' if full else 'fast', checked=checked,
+        hashed=result['hashed'], cached=result['cached'], missing=len(missing), mismatched=len(mismatched),
+        paths=sorted(missing + mismatched))
     return status
 
 
@@ -75,9 +73,9 @@ def set_readonly(path: str) -> None:
     try:
         current = os.stat(path)
         os.chmod(path, current.st_mode & ~stat.S_IWUSR & ~stat.S_IWGRP & ~stat.S_IWOTH)
-        log(f"runtime_init: set readonly {path}")
+        log('runtime_init.readonly', status='ok', path=path)
     except Exception as e:
-        log(f"runtime_init: failed set readonly {path} - {e}")
+        log('runtime_init.readonly', status='fail', path=path, error=str(e))
 
 
 def advisory_chattr_commands(paths):
@@ -91,7 +89,7 @@ def advisory_chattr_commands(paths):
 def main():
     # Activation message
     print('CriderGPT Core Activated — Offline Brain Online.')
-    log('runtime_init: activation')
+    log('runtime_init.activation')
 
     # Load and show version metadata
     meta = load_version_meta()
@@ -100,8 +98,8 @@ def main():
     else:
         print('Version metadata not found.')
 
-    # Verify manifest
-    v = verify_manifest()
+    # Verify manifest (`--full` re-hashes every file instead of trusting the cache)
+    v = verify_manifest(full='--full' in sys.argv[1:])
     if v.get('status') != 'ok':
         print('⚠️ SYSTEM ALERT: Protected Core File — Unauthorized Edit Rejected.')
         if v.get('missing'):
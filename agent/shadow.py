@@ -0,0 +1,189 @@
+"""Content-addressed snapshot store under shadow/.
+
+Objects are the compressed contents of protected files, named by the sha256
+of the uncompressed data (the same hash the manifest records)::
+
+    shadow/objects/ab/cdef....z     zlib
+    shadow/objects/ab/cdef....xz    lzma
+    shadow/snapshots/<id>.json      {"created", "note", "files": {path: {sha256, size, mode}}}
+
+A file is stored once no matter how many snapshots reference it, so a
+snapshot of an unchanged tree only writes its small metadata file, and the
+verification cache lets it skip re-hashing unchanged files too. Restores
+stream-decompress each object, checking its hash before replacing the target.
+"""
+import hashlib
+import json
+import lzma
+import os
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+if __package__:
+    from .protect import READ_BLOCK, VerifyCache, sha256_of_file, stat_signature
+else:  # run as a script from agent/
+    from protect import READ_BLOCK, VerifyCache, sha256_of_file, stat_signature
+
+CODECS = {"zlib": ".z", "lzma": ".xz"}
+DEFAULT_CODEC = "zlib"
+
+
+def _compressor(codec: str):
+    if codec == "zlib":
+        return zlib.compressobj(6)
+    if codec == "lzma":
+        return lzma.LZMACompressor(preset=6)
+    raise ValueError(f"unknown codec {codec}")
+
+
+def _decompressor(ext: str):
+    return zlib.decompressobj() if ext == ".z" else lzma.LZMADecompressor()
+
+
+class ShadowStore:
+    def __init__(self, root: str):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.snapshots_dir = os.path.join(root, "snapshots")
+
+    # ------------------------------------------------------------ objects
+
+    def _object_base(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def find_object(self, digest: str) -> Optional[str]:
+        base = self._object_base(digest)
+        for ext in CODECS.values():
+            if os.path.exists(base + ext):
+                return base + ext
+        return None
+
+    def put_file(self, path: str, codec: str = DEFAULT_CODEC) -> Tuple[str, int, bool]:
+        """Compress path into the store; returns (sha256, size, newly_written).
+
+        The file is hashed first and only compressed if no object has that hash.
+        """
+        size = os.stat(path).st_size
+        digest = sha256_of_file(path)
+        if self.find_object(digest):
+            return digest, size, False
+        os.makedirs(self.objects_dir, exist_ok=True)
+        tmp = os.path.join(self.objects_dir, f".tmp-{os.getpid()}-{os.urandom(4).hex()}")
+        h = hashlib.sha256()
+        comp = _compressor(codec)
+        size = 0
+        try:
+            with open(path, "rb") as src, open(tmp, "wb") as dst:
+                while True:
+                    chunk = src.read(READ_BLOCK)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    h.update(chunk)
+                    dst.write(comp.compress(chunk))
+                dst.write(comp.flush())
+            # name the object after what was actually compressed, in case the file changed
+            digest = h.hexdigest()
+            if self.find_object(digest):
+                return digest, size, False
+            target = self._object_base(digest) + CODECS[codec]
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp, target)
+            return digest, size, True
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def restore_file(self, digest: str, path: str, mode: Optional[int] = None) -> None:
+        """Stream an object back to path; the target is only replaced if the hash checks out."""
+        obj = self.find_object(digest)
+        if obj is None:
+            raise FileNotFoundError(f"no shadow object for {digest}")
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        tmp = f"{path}.restore-{os.getpid()}"
+        h = hashlib.sha256()
+        dec = _decompressor(os.path.splitext(obj)[1])
+        try:
+            with open(obj, "rb") as src, open(tmp, "wb") as dst:
+                while True:
+                    chunk = src.read(READ_BLOCK)
+                    if not chunk:
+                        break
+                    data = dec.decompress(chunk)
+                    h.update(data)
+                    dst.write(data)
+                if hasattr(dec, "flush"):  # zlib buffers a tail; lzma does not
+                    data = dec.flush()
+                    h.update(data)
+                    dst.write(data)
+            if h.hexdigest() != digest:
+                raise ValueError(f"shadow object {obj} is corrupt")
+            if mode is not None:
+                os.chmod(tmp, mode)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    # ---------------------------------------------------------- snapshots
+
+    def snapshot(self, paths: List[str], codec: str = DEFAULT_CODEC, note: str = "",
+                 cache: Optional[VerifyCache] = None) -> Dict[str, object]:
+        """Store every readable file in paths and write a snapshot record."""
+        files: Dict[str, Dict[str, int]] = {}
+        stats = {"files": 0, "stored": 0, "bytes_stored": 0, "skipped": 0, "unreadable": []}
+        for path in sorted(paths):
+            try:
+                st = os.stat(path)
+            except OSError:
+                stats["unreadable"].append(path)
+                continue
+            sig = stat_signature(st)
+            digest = cache.lookup(path, sig) if cache is not None else None
+            try:
+                if digest is not None and self.find_object(digest):
+                    # unchanged since last hashed and already stored: nothing to read
+                    stats["skipped"] += 1
+                else:
+                    digest, _, created = self.put_file(path, codec)
+                    if created:
+                        stats["stored"] += 1
+                        stats["bytes_stored"] += os.path.getsize(self.find_object(digest))
+                    if cache is not None and stat_signature(os.stat(path)) == sig:
+                        cache.update(path, sig, digest)
+            except OSError:
+                stats["unreadable"].append(path)
+                continue
+            files[path] = {"sha256": digest, "size": st.st_size, "mode": st.st_mode & 0o7777}
+            stats["files"] += 1
+        if cache is not None:
+            try:
+                cache.save()
+            except OSError:
+                pass
+        created = datetime.now(timezone.utc).replace(tzinfo=None)
+        snap_id = created.strftime("%Y%m%dT%H%M%S%fZ")
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        record = {"id": snap_id, "created": created.isoformat() + "Z", "note": note, "codec": codec, "files": files}
+        with open(os.path.join(self.snapshots_dir, snap_id + ".json"), "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=1, sort_keys=True)
+        stats["id"] = snap_id
+        return stats
+
+    def list_snapshots(self) -> List[str]:
+        if not os.path.isdir(self.snapshots_dir):
+            return []
+        return sorted(fn[:-5] for fn in os.listdir(self.snapshots_dir) if fn.endswith(".json"))
+
+    def load_snapshot(self, snap_id: Optional[str] = None) -> Dict[str, object]:
+        """Load a snapshot record; the newest one if snap_id is None."""
+        if snap_id is None:
+            ids = self.list_snapshots()
+            if not ids:
+                raise FileNotFoundError("no snapshots in " + self.snapshots_dir)
+            snap_id = ids[-1]
+        with open(os.path.join(self.snapshots_dir, snap_id + ".json"), "r", encoding="utf-8") as f:
+            return json.load(f)
@@ -0,0 +1,208 @@
+"""Continuous integrity watch for the files listed in core_manifest.json.
+
+`python -m agent.agent watch` verifies the manifest once (through the
+verification cache), then waits for changes and re-hashes only the files that
+were touched. Linux uses inotify (through ctypes, no extra packages) on the
+directories holding protected files, so atomic replaces and deletes are seen
+too; elsewhere a stat-only poll compares signatures every few seconds. Bursts
+of writes are debounced into one check, and every result goes to the agent log.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Set
+
+if __package__:
+    from .protect import DEFAULT_WORKERS, VerifyCache, stat_signature, verify_hashes
+else:  # run as a script from agent/
+    from protect import DEFAULT_WORKERS, VerifyCache, stat_signature, verify_hashes
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+_EVENT = struct.Struct("iIII")
+
+DEFAULT_DEBOUNCE = 0.5
+DEFAULT_POLL_INTERVAL = 2.0
+
+
+class InotifyWatcher:
+    """Watches the parent directories of a set of files; poll() returns changed files."""
+
+    def __init__(self, paths: Iterable[str]):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths: Set[str] = set()
+        self._dirs: Dict[int, str] = {}
+        self.set_paths(paths)
+
+    def set_paths(self, paths: Iterable[str]) -> None:
+        self.paths = {os.path.abspath(p) for p in paths}
+        watched = set(self._dirs.values())
+        for d in {os.path.dirname(p) for p in self.paths} - watched:
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(d), WATCH_MASK)
+            if wd >= 0:
+                self._dirs[wd] = d
+
+    def poll(self, timeout: Optional[float]) -> Set[str]:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed: Set[str] = set()
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos + _EVENT.size <= len(buf):
+                wd, mask, _, length = _EVENT.unpack_from(buf, pos)
+                name = buf[pos + _EVENT.size:pos + _EVENT.size + length].rstrip(b"\0")
+                pos += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    # events were dropped: treat everything as changed
+                    changed |= self.paths
+                    continue
+                d = self._dirs.get(wd)
+                if d is None:
+                    continue
+                if mask & IN_IGNORED:
+                    del self._dirs[wd]
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    changed |= {p for p in self.paths if os.path.dirname(p) == d}
+                    continue
+                path = os.path.join(d, os.fsdecode(name))
+                if path in self.paths:
+                    changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback: stat every file each `interval` seconds and report signature changes."""
+
+    def __init__(self, paths: Iterable[str], interval: float = DEFAULT_POLL_INTERVAL):
+        self.interval = interval
+        self._sigs: Dict[str, Optional[tuple]] = {}
+        self._next = time.monotonic() + interval
+        self.set_paths(paths)
+
+    def _sig(self, path: str) -> Optional[tuple]:
+        try:
+            return stat_signature(os.stat(path))
+        except OSError:
+            return None
+
+    def set_paths(self, paths: Iterable[str]) -> None:
+        self._sigs = {p: self._sigs.get(p) or self._sig(p) for p in (os.path.abspath(p) for p in paths)}
+
+    def poll(self, timeout: Optional[float]) -> Set[str]:
+        wait = self._next - time.monotonic()
+        if timeout is not None and timeout < wait:
+            time.sleep(max(0.0, timeout))
+            return set()
+        time.sleep(max(0.0, wait))
+        self._next = time.monotonic() + self.interval
+        changed = set()
+        for path, old in self._sigs.items():
+            new = self._sig(path)
+            if new != old:
+                self._sigs[path] = new
+                changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+def make_watcher(paths: Iterable[str], poll: bool = False, interval: float = DEFAULT_POLL_INTERVAL):
+    paths = list(paths)
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(paths, interval)
+
+
+def watch(load_manifest: Callable[[], Dict[str, str]], manifest_path: str, log: Callable[..., None],
+          cache: Optional[VerifyCache] = None, debounce: float = DEFAULT_DEBOUNCE, poll: bool = False,
+          interval: float = DEFAULT_POLL_INTERVAL, workers: int = DEFAULT_WORKERS,
+          stop: Optional[threading.Event] = None) -> None:
+    """Run until `stop` is set (or KeyboardInterrupt); `log(event, **fields)` gets every result."""
+    stop = stop or threading.Event()
+    manifest = load_manifest()
+    manifest_abs = os.path.abspath(manifest_path)
+
+    def keys_by_abs() -> Dict[str, str]:
+        return {os.path.abspath(k): k for k in manifest}
+
+    by_abs = keys_by_abs()
+    state: Dict[str, str] = {}
+
+    def check(keys: Iterable[str], reason: str) -> None:
+        sub = {k: manifest[k] for k in keys}
+        result = verify_hashes(sub, workers, cache=cache)
+        bad = {p: "MISSING" for p in result["missing"]}
+        bad.update({p: "TAMPERED" for p in result["mismatched"]})
+        for k in sorted(sub):
+            status = bad.get(k, "ok")
+            if reason != "startup" or status != "ok":
+                log("watch.file", path=k, status=status, restored=status == "ok" and state.get(k, "ok") != "ok")
+            state[k] = status
+        log("watch.check", reason=reason, files=len(sub), hashed=result["hashed"],
+            missing=len(result["missing"]), mismatched=len(result["mismatched"]))
+
+    check(list(manifest), "startup")
+    watcher = make_watcher(list(by_abs) + [manifest_abs], poll, interval)
+    log("watch.started", backend=type(watcher).__name__, files=len(manifest), debounce=debounce)
+    pending: Set[str] = set()
+    first = last = 0.0
+    try:
+        while not stop.is_set():
+            got = watcher.poll(debounce if pending else 1.0)
+            now = time.monotonic()
+            if got:
+                if not pending:
+                    first = now
+                pending |= got
+                last = now
+            # flush once writes go quiet, or after 10x debounce under constant churn
+            if pending and (now - last >= debounce or now - first >= debounce * 10):
+                if manifest_abs in pending:
+                    pending.discard(manifest_abs)
+                    manifest = load_manifest()
+                    by_abs = keys_by_abs()
+                    watcher.set_paths(list(by_abs) + [manifest_abs])
+                    log("watch.manifest_reloaded", files=len(manifest))
+                    pending |= set(by_abs)
+                keys = [by_abs[p] for p in pending if p in by_abs]
+                pending.clear()
+                if keys:
+                    check(keys, "change")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        log("watch.stopped")
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""Load and latency benchmark for the backend (`main.app`).
+
+Replays prompts from a JSONL corpus against `POST /api/respond` and reports,
+per scenario, req/s, p50/p95/p99 latency and allocations per request. The
+scenarios cover:
+
+- transport: `inproc` (Flask test client) or `http` (the pooled WSGI server
+  on a loopback port, driven by N concurrent keep-alive clients);
+- knowledge: `small` (knowledge/knowledge.json) or `synthetic` (a generated
+  knowledge base of --synthetic-mb MB, 10 by default, cached in
+  benchmarks/.cache/);
+- payload: with or without an uploaded `brain` in every request.
+
+Each knowledge base runs in a fresh interpreter, so imports, caches and the
+loaded snapshot never leak between scenarios. The response cache is off
+unless --cache is given, so repeated prompts still exercise retrieval.
+
+Results are written as JSON. With --baseline, every scenario is compared
+against the saved run. Lower req/s, or higher latency or allocations beyond
+--tolerance, is a regression: it is printed and the exit code is 1.
+
+Usage:
+  python benchmarks/bench_backend.py                        # everything, write results
+  python benchmarks/bench_backend.py --transport inproc --knowledge small
+  python benchmarks/bench_backend.py --save-baseline        # results become the baseline
+  python benchmarks/bench_backend.py --baseline benchmarks/results/baseline.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HERE = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(HERE, '.cache')
+RESULTS_DIR = os.path.join(HERE, 'results')
+DEFAULT_OUT = os.path.join(RESULTS_DIR, 'latest.json')
+DEFAULT_BASELINE = os.path.join(RESULTS_DIR, 'baseline.json')
+DEFAULT_CORPUS = os.path.join(HERE, 'prompts.jsonl')
+DEFAULT_KNOWLEDGE = os.path.join(ROOT, 'knowledge', 'knowledge.json')
+
+# corpus fields tried in order; the first string found is the prompt
+PROMPT_FIELDS = ('prompt', 'text', 'title', 'body')
+# metric -> +1 if higher is better, -1 if lower is better
+COMPARED = {'rps': 1, 'p50_ms': -1, 'p95_ms': -1, 'p99_ms': -1, 'alloc_kb_per_req': -1}
+
+WORDS = ('soil', 'tractor', 'harvest', 'corn', 'wheat', 'cattle', 'barn', 'irrigation', 'fertilizer',
+         'planting', 'yield', 'orchard', 'livestock', 'pasture', 'seed', 'rotation', 'compost', 'silo',
+         'drone', 'sensor', 'market', 'weather', 'frost', 'rain', 'engine', 'hydraulic', 'mod', 'map',
+         'county', 'leadership', 'chapter', 'student', 'career', 'record', 'budget', 'loan', 'grain')
+
+
+# ---------------------------------------------------------------- corpus
+
+
+def load_corpus(path: str, limit: int = 0) -> List[str]:
+    prompts = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, str):
+                prompts.append(record)
+                continue
+            for field in PROMPT_FIELDS:
+                value = record.get(field) if isinstance(record, dict) else None
+                if isinstance(value, str) and value.strip():
+                    # long bodies are not realistic chat prompts
+                    prompts.append(value.strip()[:500])
+                    break
+            if limit and len(prompts) >= limit:
+                break
+    if not prompts:
+        raise SystemExit(f'no prompts found in {path}')
+    return prompts
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(n)).capitalize() + '.'
+
+
+def synthetic_knowledge(megabytes: float, seed: int = 1) -> str:
+    """Path to a deterministic knowledge base of about `megabytes` MB (generated once)."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f'synthetic_{megabytes:g}mb_seed{seed}.json')
+    if os.path.exists(path):
+        return path
+    rng = random.Random(seed)
+    target = int(megabytes * (1 << 20))
+    with open(DEFAULT_KNOWLEDGE, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    size = len(json.dumps(data))
+    section = 0
+    while size < target:
+        topics = {}
+        for t in range(50):
+            topic = {'description': _sentence(rng, 14),
+                     'facts': [_sentence(rng, rng.randint(6, 18)) for _ in range(8)]}
+            topics[f'{rng.choice(WORDS)}_{section}_{t}'] = topic
+            size += len(json.dumps(topic)) + 16
+        data[f'synthetic_{section}'] = topics
+        section += 1
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return path
+
+
+def sample_brain(seed: int = 2, facts: int = 40) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    return {'personality': {'tone': 'benchmark'},
+            'bench': {'facts': [_sentence(rng, rng.randint(6, 14)) for _ in range(facts)]}}
+
+
+# ----------------------------------------------------------------- stats
+
+
+def percentile(sorted_ms: List[float], q: float) -> Optional[float]:
+    if not sorted_ms:
+        return None
+    k = (len(sorted_ms) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_ms) - 1)
+    return sorted_ms[lo] + (sorted_ms[hi] - sorted_ms[lo]) * (k - lo)
+
+
+def summarize(latencies_ms: List[float], wall_s: float, errors: int) -> Dict[str, Any]:
+    lat = sorted(latencies_ms)
+    out = {'requests': len(lat), 'errors': errors, 'wall_s': round(wall_s, 3),
+           'rps': round(len(lat) / wall_s, 1) if wall_s > 0 else None,
+           'mean_ms': round(sum(lat) / len(lat), 3) if lat else None}
+    for q in (0.5, 0.95, 0.99):
+        v = percentile(lat, q)
+        out[f'p{int(q * 100)}_ms'] = round(v, 3) if v is not None else None
+    return out
+
+
+# ------------------------------------------------------------ scenario run
+
+
+def _payloads(prompts: List[str], brain: Optional[Dict[str, Any]], n: int) -> List[bytes]:
+    out = []
+    for i in range(n):
+        payload = {'prompt': prompts[i % len(prompts)]}
+        if brain is not None:
+            payload['brain'] = brain
+        out.append(json.dumps(payload).encode('utf-8'))
+    return out
+
+
+def measure_allocations(client, bodies: List[bytes]) -> Dict[str, Any]:
+    """Peak traced KiB and net retained blocks per request, measured sequentially."""
+    tracemalloc.start()
+    try:
+        peaks = []
+        for body in bodies:
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            client.post('/api/respond', data=body, content_type='application/json')
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - base)
+        before = tracemalloc.take_snapshot()
+        for body in bodies:
+            client.post('/api/respond', data=body, content_type='application/json')
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    retained = sum(s.count_diff for s in after.compare_to(before, 'filename'))
+    return {'alloc_kb_per_req': round(sum(peaks) / len(peaks) / 1024, 2),
+            'retained_blocks_per_req': round(retained / len(bodies), 2)}
+
+
+def run_inproc(app, bodies: List[bytes], warmup: int) -> Dict[str, Any]:
+    client = app.test_client()
+    for body in bodies[:warmup]:
+        client.post('/api/respond', data=body, content_type='application/json')
+    latencies, errors = [], 0
+    t0 = time.perf_counter()
+    for body in bodies:
+        s = time.perf_counter()
+        r = client.post('/api/respond', data=body, content_type='application/json')
+        latencies.append((time.perf_counter() - s) * 1000.0)
+        if r.status_code != 200:
+            errors += 1
+    result = summarize(latencies, time.perf_counter() - t0, errors)
+    result.update(measure_allocations(client, bodies[:min(len(bodies), 200)]))
+    return result
+
+
+def run_http(app, bodies: List[bytes], clients: int, warmup: int, threads: int) -> Dict[str, Any]:
+    import server
+
+    httpd = server.PooledWSGIServer('127.0.0.1', 0, app, threads=threads)
+    serving = threading.Thread(target=httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    serving.start()
+    port = httpd.port
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def client_loop(mine: List[bytes], record: bool) -> None:
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        local, bad = [], 0
+        try:
+            for body in mine:
+                s = time.perf_counter()
+                try:
+                    conn.request('POST', '/api/respond', body=body, headers={'Content-Type': 'application/json'})
+                    resp = conn.getresponse()
+                    resp.read()
+                    ok = resp.status == 200
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                    ok = False
+                local.append((time.perf_counter() - s) * 1000.0)
+                bad += not ok
+        finally:
+            conn.close()
+        if record:
+            with lock:
+                latencies.extend(local)
+                errors[0] += bad
+
+    def run_clients(all_bodies: List[bytes], record: bool) -> float:
+        workers = [threading.Thread(target=client_loop, args=(all_bodies[i::clients], record))
+                   for i in range(clients)]
+        t0 = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        return time.perf_counter() - t0
+
+    try:
+        run_clients(bodies[:warmup], record=False)
+        wall = run_clients(bodies, record=True)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+    result = summarize(latencies, wall, errors[0])
+    result['clients'] = clients
+    return result
+
+
+def run_worker(args) -> Dict[str, Any]:
+    """Runs inside a fresh interpreter with CRIDERGPT_KNOWLEDGE already set."""
+    sys.path.insert(0, ROOT)
+    t0 = time.perf_counter()
+    import main
+    import_ms = (time.perf_counter() - t0) * 1000.0
+    snap = main.KNOWLEDGE.current()
+    prompts = load_corpus(args.corpus, args.corpus_limit)
+    rng = random.Random(args.seed)
+    rng.shuffle(prompts)
+    results = {}
+    for with_brain in args.brain_modes:
+        bodies = _payloads(prompts, sample_brain() if with_brain else None, args.requests)
+        payload = 'brain' if with_brain else 'plain'
+        for transport in args.transport:
+            name = f'{transport}/{args.knowledge_label}/{payload}'
+            print(f'  {name} ...', file=sys.stderr, flush=True)
+            if transport == 'inproc':
+                result = run_inproc(main.app, bodies, args.warmup)
+            else:
+                result = run_http(main.app, bodies, args.clients, args.warmup, args.threads)
+            results[name] = result
+    return {'knowledge': {'label': args.knowledge_label, 'path': os.path.relpath(main.KNOWLEDGE_PATH, ROOT),
+                          'bytes': os.path.getsize(main.KNOWLEDGE_PATH),
+                          'format': snap.format if snap is not None else None,
+                          'load_ms': round(snap.load_ms, 3) if snap is not None else None,
+                          'import_ms': round(import_ms, 3)},
+            'scenarios': results}
+
+
+# ------------------------------------------------------------ orchestrate
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Human-readable regressions of `current` against `baseline` (empty when none)."""
+    problems = []
+    for name, base in baseline.get('scenarios', {}).items():
+        cur = current['scenarios'].get(name)
+        if cur is None:
+            continue
+        for metric, direction in COMPARED.items():
+            old, new = base.get(metric), cur.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change * direction < -tolerance:
+                problems.append(f'{name}: {metric} {old} -> {new} ({change:+.0%})')
+        if cur.get('errors') and not base.get('errors'):
+            problems.append(f'{name}: {cur["errors"]} failed requests')
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='JSONL prompts (default: benchmarks/prompts.jsonl)')
+    parser.add_argument('--corpus-limit', type=int, default=0, help='use at most N prompts')
+    parser.add_argument('--requests', type=int, default=500, help='timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients for --transport http')
+    parser.add_argument('--threads', type=int, default=8, help='server threads for --transport http')
+    parser.add_argument('--transport', nargs='+', choices=('inproc', 'http'), default=['inproc', 'http'])
+    parser.add_argument('--knowledge', nargs='+', choices=('small', 'synthetic'), default=['small', 'synthetic'])
+    parser.add_argument('--synthetic-mb', type=float, default=10.0)
+    parser.add_argument('--payload', nargs='+', choices=('plain', 'brain'), default=['plain', 'brain'])
+    parser.add_argument('--cache', action='store_true', help='keep the response cache on')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', default=DEFAULT_OUT)
+    parser.add_argument('--baseline', help='compare against this results file; exit 1 on regression')
+    parser.add_argument('--save-baseline', action='store_true', help=f'also write results to {DEFAULT_BASELINE}')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative change (default 0.25)')
+    # internal: one knowledge base, run in a child interpreter
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--knowledge-label', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.brain_modes = [p == 'brain' for p in args.payload]
+
+    if args.worker:
+        json.dump(run_worker(args), sys.stdout)
+        return 0
+
+    results: Dict[str, Any] = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'config': {k: getattr(args, k) for k in ('corpus', 'requests', 'warmup', 'clients', 'threads',
+                                                 'synthetic_mb', 'cache', 'seed')},
+        'knowledge': {},
+        'scenarios': {},
+    }
+    results['config']['corpus'] = os.path.relpath(args.corpus, ROOT)
+    for label in args.knowledge:
+        path = DEFAULT_KNOWLEDGE if label == 'small' else synthetic_knowledge(args.synthetic_mb, args.seed)
+        env = dict(os.environ, CRIDERGPT_KNOWLEDGE=path, CRIDERGPT_REQUEST_EVENTS='0',
+                   CRIDERGPT_EVENT_LOG=os.path.join(CACHE_DIR, 'bench_events.log'))
+        # a stale compiled snapshot for another file must not be picked up
+        env['CRIDERGPT_KNOWLEDGE_SNAPSHOT'] = os.path.splitext(path)[0] + '.snap'
+        if not args.cache:
+            env['CRIDERGPT_RESPONSE_CACHE'] = '0'
+        cmd = [sys.executable, os.path.abspath(__file__), '--worker', '--knowledge-label', label]
+        for flag in ('corpus', 'corpus_limit', 'requests', 'warmup', 'clients', 'threads', 'seed'):
+            cmd += ['--' + flag.replace('_', '-'), str(getattr(args, flag))]
+        cmd += ['--transport', *args.transport, '--payload', *args.payload]
+        print(f'knowledge={label} ({os.path.getsize(path) / (1 << 20):.1f} MB)', file=sys.stderr, flush=True)
+        proc = subprocess.run(cmd, env=env, cwd=ROOT, stdout=subprocess.PIPE, text=True)
+        if proc.returncode != 0:
+            print(f'benchmark worker for {label} failed (exit {proc.returncode})', file=sys.stderr)
+            return 2
+        part = json.loads(proc.stdout)
+        results['knowledge'][label] = part['knowledge']
+        results['scenarios'].update(part['scenarios'])
+
+    header = f'{"scenario":32} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"KiB/req":>9} {"err":>5}'
+    print(header)
+    for name, r in results['scenarios'].items():
+        alloc = r.get('alloc_kb_per_req')
+        print(f'{name:32} {r["rps"]:>9} {r["p50_ms"]:>9} {r["p95_ms"]:>9} {r["p99_ms"]:>9} '
+              f'{alloc if alloc is not None else "-":>9} {r["errors"]:>5}')
+
+    targets = [args.out] + ([DEFAULT_BASELINE] if args.save_baseline else [])
+    for target in targets:
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        with open(target, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f'wrote {os.path.relpath(target)}')
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        if problems:
+            print(f'\nREGRESSION against {args.baseline} (tolerance {args.tolerance:.0%}):')
+            for p in problems:
+                print('  ' + p)
+            return 1
+        print(f'no regressions against {args.baseline}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
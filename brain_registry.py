@@ -0,0 +1,58 @@
+"""Content-addressed registry of brains uploaded by the UI.
+
+The frontend registers its frozen brain once via `PUT /api/brain` and then
+refers to it by `brain_id` (the SHA-256 of its canonical JSON). Each brain is
+frozen into a KnowledgeSnapshot exactly once; a bounded LRU keeps memory flat.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from knowledge_store import KnowledgeSnapshot, Warmer, run_warmers
+
+
+class BrainRegistry:
+    def __init__(self, capacity: int = 8, warmers: Iterable[Warmer] = ()):
+        self.capacity = max(1, capacity)
+        self._warmers = list(warmers)
+        self._lock = threading.Lock()
+        self._brains: "OrderedDict[str, KnowledgeSnapshot]" = OrderedDict()
+        self._stats = {"registered": 0, "hits": 0, "misses": 0, "evictions": 0}
+
+    def put(self, brain: Any) -> Tuple[str, KnowledgeSnapshot, bool]:
+        """Register a brain; returns (brain_id, snapshot, created)."""
+        snap = KnowledgeSnapshot.from_data(brain, source="upload")
+        with self._lock:
+            existing = self._brains.get(snap.sha256)
+            if existing is not None:
+                self._brains.move_to_end(snap.sha256)
+                return snap.sha256, existing, False
+        # pre-process outside the lock so lookups of other brains are not blocked
+        run_warmers(snap, self._warmers)
+        with self._lock:
+            existing = self._brains.get(snap.sha256)
+            if existing is not None:
+                return snap.sha256, existing, False
+            self._brains[snap.sha256] = snap
+            self._stats["registered"] += 1
+            while len(self._brains) > self.capacity:
+                self._brains.popitem(last=False)
+                self._stats["evictions"] += 1
+        return snap.sha256, snap, True
+
+    def get(self, brain_id: str) -> Optional[KnowledgeSnapshot]:
+        with self._lock:
+            snap = self._brains.get(brain_id)
+            if snap is None:
+                self._stats["misses"] += 1
+                return None
+            self._brains.move_to_end(brain_id)
+            self._stats["hits"] += 1
+            return snap
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["size"] = len(self._brains)
+        out["capacity"] = self.capacity
+        return out
@@ -0,0 +1,178 @@
+"""Entity router: send prompts that name a knowledge entry straight to it.
+
+Entity keys in the knowledge base ("7.3L_Powerstroke", "FS22_modding",
+"Wythe_County", "flux_welding", "FFA") are compiled, together with generated
+aliases, into one Aho-Corasick automaton per KnowledgeSnapshot. A prompt is
+normalized with `response_cache.normalize_prompt` and scanned once, left to
+right, so the cost depends on the prompt length and the number of matches,
+not on how many entities exist.
+
+Aliases are derived from the key alone:
+
+- the key as normalize_prompt folds it: "7.3L_Powerstroke" -> "7.3l powerstroke";
+- CamelCase and letter/digit boundaries split: "WytheBland" -> "wythe bland",
+  "FS22" -> "fs 22";
+- a unit letter dropped from a leading number: "7.3 powerstroke";
+- a leading model code or acronym on its own: "7.3l", "fs22".
+
+Matches must start and end on word boundaries. Overlapping matches keep the
+longest one.
+"""
+import re
+from typing import Dict, Iterable, List, NamedTuple, Set, Tuple
+
+import retrieval
+from response_cache import normalize_prompt
+
+_CAMEL_RE = re.compile(r"(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])")
+_LETTER_DIGIT_RE = re.compile(r"(?<=[a-z])(?=\d)|(?<=\d)(?=[a-z])")
+_UNIT_RE = re.compile(r"^(\d+(?:\.\d+)?)[a-z]+$")
+# shortest alias that may stand alone, so "a" or "3" never route anything
+MIN_ALIAS = 3
+
+
+class Entity(NamedTuple):
+    name: str      # the key as written, e.g. "7.3L_Powerstroke"
+    section: str   # top-level section, e.g. "mechanical"
+    start: int     # fact ids [start, end) in the snapshot's FactTable
+    end: int
+
+
+class Match(NamedTuple):
+    entity: int    # index into EntityRouter.entities
+    start: int     # character span in the normalized prompt
+    end: int
+
+
+def aliases(key: str) -> Set[str]:
+    """Normalized phrases that refer to an entity key."""
+    out = set()
+    base = normalize_prompt(key)
+    split = normalize_prompt(_CAMEL_RE.sub(" ", key))
+    for phrase in {base, split}:
+        out.add(phrase)
+        words = phrase.split()
+        m = _UNIT_RE.match(words[0]) if words else None
+        if m and len(words) > 1:
+            out.add(" ".join([m.group(1)] + words[1:]))
+        # a model code or acronym ("7.3l", "fs22", "ffa") names the entity by itself
+        if words and len(words[0]) >= MIN_ALIAS and (any(c.isdigit() for c in words[0])
+                                                      or key.split("_")[0].isupper()):
+            out.add(words[0])
+    out |= {_LETTER_DIGIT_RE.sub(" ", a) for a in out}
+    return {a for a in out if len(a) >= MIN_ALIAS}
+
+
+class EntityRouter:
+    """Aho-Corasick automaton over every entity alias of one snapshot."""
+
+    def __init__(self, entities: List[Entity], phrases: Iterable[Tuple[str, int]]):
+        self.entities = entities
+        # goto[state][char] -> state; out[state] -> (entity, length) pairs ending here
+        self._goto: List[Dict[str, int]] = [{}]
+        self._out: List[List[Tuple[int, int]]] = [[]]
+        n = 0
+        for phrase, entity in phrases:
+            # padded so a match has to sit between word boundaries
+            state = 0
+            for ch in f" {phrase} ":
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._out.append([])
+                state = nxt
+            if (entity, len(phrase) + 2) not in self._out[state]:
+                self._out[state].append((entity, len(phrase) + 2))
+                n += 1
+        self.aliases = n
+        self._fail = [0] * len(self._goto)
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def scan(self, text: str) -> List[Match]:
+        """All alias matches in an already-normalized text, in one pass."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = []
+        state = 0
+        padded = f" {text} "
+        for pos, ch in enumerate(padded):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for entity, length in out[state]:
+                # spans exclude the padding spaces; -1 maps back into `text`
+                found.append(Match(entity, pos - length + 1, pos - 1))
+        return found
+
+    def route(self, prompt: str) -> List[int]:
+        """Entities named in the prompt, in order of appearance, longest match first on overlap."""
+        matches = sorted(self.scan(normalize_prompt(prompt)), key=lambda m: (m.start, -(m.end - m.start)))
+        chosen: List[int] = []
+        covered = -1
+        for m in matches:
+            if m.start < covered:
+                continue
+            covered = m.end
+            if m.entity not in chosen:
+                chosen.append(m.entity)
+        return chosen
+
+
+def build_router(snapshot) -> EntityRouter:
+    facts = retrieval.facts_for(snapshot)
+    entities: List[Entity] = []
+    current = None
+    for i, path in enumerate(facts.paths):
+        parts = path.split("/", 2)
+        if len(parts) < 2:
+            continue
+        # an entity's facts are contiguous: flatten_facts walks depth-first
+        if current is not None and (current.section, current.name) == (parts[0], parts[1]):
+            current = current._replace(end=i + 1)
+            entities[-1] = current
+        else:
+            current = Entity(parts[1], parts[0], i, i + 1)
+            entities.append(current)
+    phrases = [(a, n) for n, e in enumerate(entities) for a in aliases(e.name)]
+    return EntityRouter(entities, phrases)
+
+
+def router_for(snapshot) -> EntityRouter:
+    return snapshot.derived("entities", build_router)
+
+
+def warm(snapshot) -> None:
+    """Knowledge warmer: compile the automaton before the snapshot serves traffic."""
+    router_for(snapshot)
+
+
+def route(snapshot, prompt: str, k: int = 3) -> List[retrieval.Hit]:
+    """Up to k facts from the entities the prompt names; facts sharing its words first."""
+    router = router_for(snapshot)
+    named = router.route(prompt)
+    if not named:
+        return []
+    facts = retrieval.facts_for(snapshot)
+    terms = set(retrieval.tokenize(prompt))
+    ranked = []
+    for order, n in enumerate(named):
+        e = router.entities[n]
+        for i in range(e.start, e.end):
+            overlap = len(terms.intersection(retrieval.fact_terms(facts.paths[i], facts.texts[i])))
+            ranked.append((-overlap, order, i))
+    ranked.sort()
+    return [retrieval.Hit(i, float(-neg), facts.section(i), facts.paths[i], facts.texts[i])
+            for neg, _, i in ranked[:k]]
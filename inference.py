@@ -0,0 +1,472 @@
+"""Reply generation backends: inline, or a pool of long-lived worker processes.
+
+Both backends run a *model* over the facts picked by retrieval. Two models
+ship: ``responder`` (the current template reply) and ``stub``, which returns
+the same text but spends a fixed amount of CPU per token. That gives a
+deterministic stand-in for a local LLM when testing throughput and queueing on
+a CPU-only box.
+
+- ``InlineBackend`` generates in the request thread, as before.
+- ``PoolBackend`` keeps ``workers`` processes alive. Each loads the knowledge
+  and the model once. One parent thread per worker feeds it jobs from a bounded
+  queue. A full queue raises ``Overloaded`` (mapped to ``503`` + ``Retry-After``).
+  A job that runs past its deadline is cancelled: the worker's cancel flag is
+  set, and a worker that does not answer within the grace period is killed
+  and respawned. Both models check the flag while they produce text (the
+  responder between reply segments, the stub per token); retrieval itself is
+  not interruptible, so a job stuck there is only stopped by the kill.
+
+Uploaded brains are sent to a worker only the first time it sees them; each
+worker keeps its own small BrainRegistry.
+
+The pool does not use the caller's ``cache``: every worker retrieves through
+its own ResponseCache, drops a reloaded knowledge base's entries itself, and
+reports its counters with each reply (``PoolBackend.cache_stats``).
+
+``queries``, when given, replace the prompts for retrieval only; session
+prompts are searched together with the previous turn (see sessions.py).
+"""
+import math
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence
+
+import responder
+from knowledge_store import thaw
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE = 16
+DEFAULT_TIMEOUT = 30.0
+CANCEL_GRACE = 1.0
+# how many brains each worker keeps (mirrors CRIDERGPT_BRAIN_CACHE)
+WORKER_BRAINS = 8
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"inference queue full; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class GenerationTimeout(Exception):
+    pass
+
+
+class Cancelled(Exception):
+    pass
+
+
+# ------------------------------------------------------------------ models
+
+
+class ResponderModel:
+    """The template reply built by responder.py."""
+
+    name = "responder"
+
+    def generate(self, prompt: str, snapshot, hits, should_stop: Callable[[], bool] = lambda: False) -> str:
+        out = []
+        for segment in responder.iter_reply(prompt, snapshot, hits=hits):
+            if should_stop():
+                raise Cancelled()
+            out.append(segment)
+        return "".join(out)
+
+
+class StubModel(ResponderModel):
+    """Same text as ResponderModel, plus a fixed CPU cost per token."""
+
+    name = "stub"
+
+    def __init__(self, ms_per_token: float = 5.0):
+        self.ms_per_token = ms_per_token
+
+    def generate(self, prompt: str, snapshot, hits, should_stop: Callable[[], bool] = lambda: False) -> str:
+        out = []
+        for token in responder.iter_tokens(responder.iter_reply(prompt, snapshot, hits=hits)):
+            if should_stop():
+                raise Cancelled()
+            # busy-wait rather than sleep: a real model holds a core while decoding
+            end = time.perf_counter() + self.ms_per_token / 1000.0
+            while time.perf_counter() < end:
+                pass
+            out.append(token)
+        return "".join(out)
+
+
+def make_model(name: str, stub_ms: float = 5.0) -> ResponderModel:
+    if name == "stub":
+        return StubModel(stub_ms)
+    if name == "responder":
+        return ResponderModel()
+    raise ValueError(f"unknown model {name!r}; choose responder or stub")
+
+
+# ---------------------------------------------------------------- backends
+
+
+class InlineBackend:
+    """Generate in the calling thread."""
+
+    name = "inline"
+
+    def __init__(self, model: ResponderModel, stage=None):
+        self.model = model
+        self._stage = stage
+
+    def _timed(self, name: str):
+        from contextlib import nullcontext
+
+        return self._stage(name) if self._stage else nullcontext()
+
+    def generate(self, prompt: str, snapshot, brain_id: Optional[str] = None, strategy: Optional[str] = None,
+                 cache=None, query: Optional[str] = None) -> str:
+        return self.generate_batch([prompt], snapshot, brain_id, strategy, cache, [query] if query else None)[0]
+
+    def generate_batch(self, prompts: Sequence[str], snapshot, brain_id: Optional[str] = None,
+                       strategy: Optional[str] = None, cache=None,
+                       queries: Optional[Sequence[str]] = None) -> List[str]:
+        with self._timed("retrieval"):
+            all_hits = responder.find_facts_batch(queries or prompts, snapshot, strategy=strategy, cache=cache)
+        with self._timed("reply"):
+            return [self.model.generate(p, snapshot, h) for p, h in zip(prompts, all_hits)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "model": self.model.name}
+
+    def close(self) -> None:
+        pass
+
+
+def _worker_main(conn, cancel, config: Dict[str, Any]) -> None:
+    """Worker process: load knowledge and model once, then serve jobs until None."""
+    from brain_registry import BrainRegistry
+    from knowledge_store import KnowledgeStore
+    from response_cache import ResponseCache
+
+    store = KnowledgeStore(config["knowledge_path"], warmers=[responder.warm],
+                           snapshot_path=config.get("snapshot_path"))
+    store.load()
+    brains = BrainRegistry(WORKER_BRAINS, warmers=[responder.warm])
+    cache = ResponseCache(config.get("cache_size", 256), ttl=config.get("cache_ttl"))
+
+    def drop_stale_answers(old, new):
+        if old is not None and old.sha256 != new.sha256:
+            cache.invalidate(old.sha256)
+
+    store.add_listener(drop_stale_answers)
+    model = make_model(config["model"], config.get("stub_ms", 5.0))
+    conn.send(("ready", os.getpid()))
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        if job is None:
+            return
+        job_id = job["id"]
+        try:
+            snapshot = store.current()
+            if job.get("brain_id"):
+                snapshot = brains.get(job["brain_id"])
+                if snapshot is None:
+                    if job.get("brain") is None:
+                        conn.send((job_id, "need-brain", None, cache.stats()))
+                        continue
+                    _, snapshot, _ = brains.put(job["brain"])
+            prompts = job["prompts"]
+            all_hits = responder.find_facts_batch(job.get("queries") or prompts, snapshot,
+                                                  strategy=job.get("strategy"), cache=cache)
+            replies = [model.generate(p, snapshot, h, lambda: cancel.value == job_id)
+                       for p, h in zip(prompts, all_hits)]
+            conn.send((job_id, "ok", replies, cache.stats()))
+        except Cancelled:
+            conn.send((job_id, "cancelled", None, cache.stats()))
+        except Exception as e:
+            conn.send((job_id, "error", f"{type(e).__name__}: {e}", cache.stats()))
+
+
+class _Job:
+    __slots__ = ("id", "prompts", "queries", "brain_id", "brain", "strategy", "deadline", "future", "enqueued_at")
+
+    def __init__(self, job_id, prompts, brain_id, brain, strategy, deadline, queries=None):
+        from concurrent.futures import Future
+
+        self.id = job_id
+        self.prompts = prompts
+        self.queries = queries
+        self.brain_id = brain_id
+        self.brain = brain
+        self.strategy = strategy
+        self.deadline = deadline
+        self.future: "Future" = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class _Slot:
+    """One worker process plus the parent thread that talks to it."""
+
+    def __init__(self, pool: "PoolBackend", index: int):
+        self.pool = pool
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.cancel = None
+        self.pid = None
+        self.brains: "OrderedDict[str, None]" = OrderedDict()
+        self.busy = False
+        self.cache_stats: Optional[Dict[str, Any]] = None  # the worker's, as of its last reply
+        self.thread = threading.Thread(target=self.run, name=f"inference-{index}", daemon=True)
+
+    def spawn(self) -> None:
+        ctx = self.pool.ctx
+        parent, child = ctx.Pipe()
+        self.cancel = ctx.Value("q", 0, lock=False)
+        self.process = ctx.Process(target=_worker_main, args=(child, self.cancel, self.pool.config),
+                                   name=f"cridergpt-inference-{self.index}", daemon=True)
+        self.process.start()
+        child.close()
+        self.conn = parent
+        self.brains.clear()
+        tag, self.pid = self.conn.recv()
+
+    def kill(self) -> None:
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+            self.process.join(5)
+        if self.conn is not None:
+            self.conn.close()
+        self.process = self.conn = None
+        self.pool._count("restarts")
+
+    def run(self) -> None:
+        while True:
+            job = self.pool._jobs.get()
+            if job is None:
+                break
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            self.busy = True
+            try:
+                self.pool._observe_wait(time.monotonic() - job.enqueued_at)
+                job.future.set_result(self.execute(job))
+                self.pool._count("completed")
+            except Exception as e:
+                job.future.set_exception(e)
+                self.pool._count("timeouts" if isinstance(e, GenerationTimeout) else "failed")
+            finally:
+                self.busy = False
+        if self.conn is not None:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(5)
+
+    def execute(self, job: _Job) -> List[str]:
+        if time.monotonic() >= job.deadline:
+            raise GenerationTimeout("timed out waiting in the queue")
+        if self.process is None or not self.process.is_alive():
+            self.spawn()
+        started = time.monotonic()
+        send_brain = bool(job.brain_id) and job.brain_id not in self.brains
+        while True:
+            self.conn.send({"id": job.id, "prompts": job.prompts, "queries": job.queries, "strategy": job.strategy,
+                            "brain_id": job.brain_id, "brain": job.brain() if send_brain else None})
+            status, payload = self._wait(job)
+            if status == "need-brain" and not send_brain:
+                send_brain = True
+                continue
+            break
+        if job.brain_id:
+            self.brains[job.brain_id] = None
+            self.brains.move_to_end(job.brain_id)
+            while len(self.brains) > WORKER_BRAINS:
+                self.brains.popitem(last=False)
+        if status == "ok":
+            self.pool._observe_service(time.monotonic() - started)
+            return payload
+        raise RuntimeError(payload or status)
+
+    def _wait(self, job: _Job):
+        while True:
+            remaining = job.deadline - time.monotonic()
+            if remaining > 0 and self.conn.poll(min(remaining, 0.5)):
+                try:
+                    reply_id, status, payload, self.cache_stats = self.conn.recv()
+                except (EOFError, OSError):
+                    self.kill()
+                    raise RuntimeError("inference worker died")
+                if reply_id == job.id:
+                    return status, payload
+                continue  # late answer to an earlier, cancelled job
+            if remaining > 0 and self.process.is_alive():
+                continue
+            if not self.process.is_alive():
+                self.kill()
+                raise RuntimeError("inference worker died")
+            # deadline passed: ask the model to stop, then kill it if it will not
+            self.cancel.value = job.id
+            if self.conn.poll(CANCEL_GRACE):
+                try:
+                    self.conn.recv()
+                except (EOFError, OSError):
+                    self.kill()
+            else:
+                self.kill()
+            raise GenerationTimeout(f"generation exceeded {self.pool.timeout:g}s")
+
+
+class PoolBackend:
+    """Long-lived worker processes fed from a bounded queue."""
+
+    name = "pool"
+
+    def __init__(self, config: Dict[str, Any], workers: int = DEFAULT_WORKERS, queue_size: int = DEFAULT_QUEUE,
+                 timeout: float = DEFAULT_TIMEOUT):
+        self.config = config
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.timeout = timeout
+        # imported here: multiprocessing is slow to import and the inline backend never needs it
+        import multiprocessing
+
+        # spawn, not fork: the parent is multi-threaded, and Windows has no fork anyway
+        self.ctx = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._jobs: "queue.Queue[Optional[_Job]]" = queue.Queue(self.queue_size)
+        self._next_id = 0
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "timeouts": 0, "rejected": 0, "restarts": 0}
+        self._service = deque(maxlen=256)
+        self._wait = deque(maxlen=256)
+        self._slots = [_Slot(self, i) for i in range(self.workers)]
+        self._started_pid = None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            # fresh slots and queue: after a fork the parent's threads do not exist here
+            self._jobs = queue.Queue(self.queue_size)
+            self._slots = [_Slot(self, i) for i in range(self.workers)]
+        for slot in self._slots:
+            slot.spawn()
+            slot.thread.start()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _observe_service(self, seconds: float) -> None:
+        with self._lock:
+            self._service.append(seconds)
+
+    def _observe_wait(self, seconds: float) -> None:
+        with self._lock:
+            self._wait.append(seconds)
+
+    def retry_after(self) -> int:
+        with self._lock:
+            avg = sum(self._service) / len(self._service) if self._service else 1.0
+        return max(1, math.ceil(avg * self.queue_size / self.workers))
+
+    def submit(self, prompts: Sequence[str], snapshot, brain_id: Optional[str], strategy: Optional[str],
+               queries: Optional[Sequence[str]] = None) -> "Future":
+        if self._started_pid != os.getpid():
+            self.start()
+        with self._lock:
+            self._next_id += 1
+            job_id = self._next_id
+        # brains are thawed lazily, only for a worker that has not seen this one
+        brain = (lambda: thaw(snapshot.data)) if brain_id else None
+        job = _Job(job_id, list(prompts), brain_id, brain, strategy, time.monotonic() + self.timeout,
+                   list(queries) if queries else None)
+        try:
+            self._jobs.put_nowait(job)
+        except queue.Full:
+            self._count("rejected")
+            raise Overloaded(self.retry_after())
+        self._count("submitted")
+        return job.future
+
+    def generate_batch(self, prompts: Sequence[str], snapshot, brain_id: Optional[str] = None,
+                       strategy: Optional[str] = None, cache=None,
+                       queries: Optional[Sequence[str]] = None) -> List[str]:
+        """`cache` is accepted for symmetry with InlineBackend; workers use their own."""
+        from concurrent.futures import TimeoutError as FutureTimeout
+
+        future = self.submit(prompts, snapshot, brain_id, strategy, queries)
+        # the slot enforces the deadline; this is only a backstop
+        try:
+            return future.result(self.timeout + CANCEL_GRACE + 5)
+        except FutureTimeout:
+            future.cancel()
+            raise GenerationTimeout(f"no answer from the inference pool within {self.timeout:g}s") from None
+
+    def generate(self, prompt: str, snapshot, brain_id: Optional[str] = None, strategy: Optional[str] = None,
+                 cache=None, query: Optional[str] = None) -> str:
+        return self.generate_batch([prompt], snapshot, brain_id, strategy, cache, [query] if query else None)[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            service = list(self._service)
+            wait = list(self._wait)
+        out.update({
+            "backend": self.name,
+            "model": self.config["model"],
+            "workers": self.workers,
+            "busy": sum(1 for s in self._slots if s.busy),
+            "queued": self._jobs.qsize(),
+            "queue_size": self.queue_size,
+            "timeout": self.timeout,
+            "avg_service_ms": round(sum(service) / len(service) * 1000, 3) if service else None,
+            "avg_queue_wait_ms": round(sum(wait) / len(wait) * 1000, 3) if wait else None,
+            "pids": [s.pid for s in self._slots],
+            "cache": self.cache_stats(),
+        })
+        return out
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """The workers' response caches, summed over the last report from each."""
+        reports = [s.cache_stats for s in self._slots if s.cache_stats]
+        out: Dict[str, Any] = {"workers": len(reports)}
+        for name in ("hits", "misses", "evictions", "expirations", "invalidations", "size"):
+            out[name] = sum(r[name] for r in reports)
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else None
+        out["capacity_per_worker"] = self.config.get("cache_size")
+        return out
+
+    def close(self) -> None:
+        if self._started_pid != os.getpid():
+            return
+        for _ in self._slots:
+            self._jobs.put(None)
+        for slot in self._slots:
+            slot.thread.join(10)
+
+
+def from_env(knowledge_path: str, snapshot_path: Optional[str] = None, stage=None):
+    """Backend configured by CRIDERGPT_INFERENCE (inline|pool) and friends."""
+    model = os.environ.get("CRIDERGPT_MODEL", "responder")
+    stub_ms = float(os.environ.get("CRIDERGPT_STUB_MS_PER_TOKEN", "5"))
+    if os.environ.get("CRIDERGPT_INFERENCE", "inline") != "pool":
+        return InlineBackend(make_model(model, stub_ms), stage)
+    make_model(model)  # validate before any worker starts
+    config = {"knowledge_path": knowledge_path, "snapshot_path": snapshot_path, "model": model, "stub_ms": stub_ms,
+              "cache_size": int(os.environ.get("CRIDERGPT_RESPONSE_CACHE", "1024")),
+              "cache_ttl": float(os.environ.get("CRIDERGPT_RESPONSE_CACHE_TTL", "0"))}
+    return PoolBackend(
+        config,
+        workers=int(os.environ.get("CRIDERGPT_INFERENCE_WORKERS", str(DEFAULT_WORKERS))),
+        queue_size=int(os.environ.get("CRIDERGPT_INFERENCE_QUEUE", str(DEFAULT_QUEUE))),
+        timeout=float(os.environ.get("CRIDERGPT_INFERENCE_TIMEOUT", str(DEFAULT_TIMEOUT))),
+    )
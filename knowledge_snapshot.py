@@ -0,0 +1,287 @@
+"""Compiled, memory-mapped knowledge snapshots.
+
+`tools/compile_knowledge.py` turns `knowledge.json` into a single binary file
+holding a string table, the fact table and the prebuilt BM25 index, stamped
+with the SHA-256 of the source JSON. The backend `mmap`s that file read-only
+instead of parsing JSON: nothing is decoded until a query touches it, and
+every worker process maps the same page-cache pages.
+
+Layout (little-endian, blocks 8-byte aligned)::
+
+    header     HEADER struct (magic, versions, source sha256/size/mtime, counts, BM25 params)
+    directory  (offset, length) u64 pairs, one per name in BLOCKS
+    blocks     see BLOCKS; strings are referenced by id into the string table
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+from typing import Dict, List, Optional, Tuple
+
+import retrieval
+from knowledge_store import KnowledgeSnapshot, freeze
+
+MAGIC = b"CGKS"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sIII32sQqIIIIddd")
+
+# (block name, array typecode or None for raw bytes)
+BLOCKS: Tuple[Tuple[str, Optional[str]], ...] = (
+    ("string_offsets", "Q"),
+    ("string_data", None),
+    ("section_names", "I"),
+    ("fact_text", "I"),
+    ("fact_path", "I"),
+    ("fact_section", "I"),
+    ("doc_len", "I"),
+    ("term_ids", "I"),
+    ("term_idf", "d"),
+    ("postings_offsets", "Q"),
+    ("postings_docs", "I"),
+    ("postings_tfs", "H"),
+    ("meta", None),
+)
+DIRECTORY = struct.Struct("<" + "QQ" * len(BLOCKS))
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# ---------------------------------------------------------------- writer
+
+
+def write_snapshot(raw: bytes, out_path: str, source_stat: Optional[os.stat_result] = None) -> Dict[str, int]:
+    """Compile raw knowledge JSON bytes into a snapshot file (atomic replace)."""
+    if sys.byteorder != "little":
+        raise SnapshotError("snapshots are only written on little-endian hosts")
+    data = json.loads(raw.decode("utf-8"))
+    facts = retrieval.flatten_facts(data)
+    index = retrieval.Bm25Index(facts)
+
+    strings: List[bytes] = []
+    ids: Dict[str, int] = {}
+
+    def sid(s: str) -> int:
+        i = ids.get(s)
+        if i is None:
+            i = ids[s] = len(strings)
+            strings.append(s.encode("utf-8"))
+        return i
+
+    section_names = array("I", (sid(s) for s in facts.sections))
+    fact_text = array("I", (sid(t) for t in facts.texts))
+    fact_path = array("I", (sid(p) for p in facts.paths))
+    fact_section = array("I", facts.section_ids)
+
+    # terms are sorted by their utf-8 bytes so readers can binary-search them
+    terms = sorted(index.postings, key=lambda t: t.encode("utf-8"))
+    term_ids = array("I", (sid(t) for t in terms))
+    term_idf = array("d", (index.idf[t] for t in terms))
+    postings_offsets = array("Q", [0])
+    postings_docs = array("I")
+    postings_tfs = array("H")
+    for t in terms:
+        docs, tfs = index.postings[t]
+        postings_docs.extend(docs)
+        postings_tfs.extend(tfs)
+        postings_offsets.append(len(postings_docs))
+
+    string_offsets = array("Q", [0])
+    for b in strings:
+        string_offsets.append(string_offsets[-1] + len(b))
+    meta = {k: v for k, v in data.items() if k in retrieval.META_SECTIONS}
+
+    payload = {
+        "string_offsets": string_offsets.tobytes(),
+        "string_data": b"".join(strings),
+        "section_names": section_names.tobytes(),
+        "fact_text": fact_text.tobytes(),
+        "fact_path": fact_path.tobytes(),
+        "fact_section": fact_section.tobytes(),
+        "doc_len": array("I", index.doc_len).tobytes(),
+        "term_ids": term_ids.tobytes(),
+        "term_idf": term_idf.tobytes(),
+        "postings_offsets": postings_offsets.tobytes(),
+        "postings_docs": postings_docs.tobytes(),
+        "postings_tfs": postings_tfs.tobytes(),
+        "meta": json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+    }
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, retrieval.INDEX_VERSION, 0,
+        hashlib.sha256(raw).digest(),
+        source_stat.st_size if source_stat else len(raw),
+        source_stat.st_mtime_ns if source_stat else 0,
+        len(strings), len(facts), len(terms), len(facts.sections),
+        index.avgdl, index.k1, index.b,
+    )
+    offset = HEADER.size + DIRECTORY.size
+    directory: List[int] = []
+    layout: List[Tuple[int, bytes]] = []
+    for name, _ in BLOCKS:
+        offset += -offset % 8
+        block = payload[name]
+        directory += [offset, len(block)]
+        layout.append((offset, block))
+        offset += len(block)
+
+    tmp = out_path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(DIRECTORY.pack(*directory))
+        for off, block in layout:
+            f.write(b"\0" * (off - f.tell()))
+            f.write(block)
+    os.replace(tmp, out_path)
+    return {"facts": len(facts), "terms": len(terms), "strings": len(strings), "bytes": offset}
+
+
+# ---------------------------------------------------------------- reader
+
+
+class MappedKnowledge:
+    """Read-only view over a snapshot file; blocks are memoryviews into the map."""
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            raise SnapshotError("snapshots are only readable on little-endian hosts")
+        self.path = path
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self.signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+            if st.st_size < HEADER.size + DIRECTORY.size:
+                raise SnapshotError(f"{path}: truncated snapshot")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, fmt, index_version, _, sha, self.source_size, self.source_mtime_ns,
+         self.n_strings, self.n_facts, self.n_terms, self.n_sections,
+         self.avgdl, self.k1, self.b) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path}: not a knowledge snapshot")
+        if fmt != FORMAT_VERSION or index_version != retrieval.INDEX_VERSION:
+            raise SnapshotError(f"{path}: built by another version (format {fmt}, index {index_version})")
+        self.source_sha256 = sha.hex()
+        directory = DIRECTORY.unpack_from(self._map, HEADER.size)
+        view = memoryview(self._map)
+        self.blocks: Dict[str, memoryview] = {}
+        for i, (name, code) in enumerate(BLOCKS):
+            off, length = directory[2 * i], directory[2 * i + 1]
+            if off + length > len(self._map):
+                raise SnapshotError(f"{path}: block {name} out of range")
+            block = view[off:off + length]
+            self.blocks[name] = block.cast(code) if code else block
+
+    def string_bytes(self, i: int) -> memoryview:
+        offs = self.blocks["string_offsets"]
+        return self.blocks["string_data"][offs[i]:offs[i + 1]]
+
+    def string(self, i: int) -> str:
+        return str(self.string_bytes(i), "utf-8")
+
+    def meta(self):
+        return json.loads(str(self.blocks["meta"], "utf-8"))
+
+    def matches_source(self, json_path: str) -> bool:
+        """True if the snapshot was compiled from the current contents of json_path."""
+        try:
+            st = os.stat(json_path)
+        except OSError:
+            return False
+        if st.st_size != self.source_size:
+            return False
+        if st.st_mtime_ns == self.source_mtime_ns:
+            return True
+        # copied or touched without an edit: fall back to the content hash
+        return _sha256_file(json_path) == self.source_sha256
+
+
+class _StringColumn(Sequence):
+    def __init__(self, mk: MappedKnowledge, ids: memoryview):
+        self._mk = mk
+        self._ids = ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._mk.string(j) for j in self._ids[i]]
+        return self._mk.string(self._ids[i])
+
+
+class MappedFactTable:
+    """FactTable interface backed by the snapshot's fact blocks."""
+
+    def __init__(self, mk: MappedKnowledge):
+        self.sections = [mk.string(i) for i in mk.blocks["section_names"]]
+        self.section_ids = mk.blocks["fact_section"]
+        self.paths = _StringColumn(mk, mk.blocks["fact_path"])
+        self.texts = _StringColumn(mk, mk.blocks["fact_text"])
+
+    def __len__(self) -> int:
+        return len(self.section_ids)
+
+    def section(self, fact_id: int) -> str:
+        return self.sections[self.section_ids[fact_id]]
+
+
+class MappedBm25Index(retrieval.Bm25Index):
+    """Bm25Index whose vocabulary and postings are binary-searched in the map."""
+
+    def __init__(self, mk: MappedKnowledge, facts: MappedFactTable):
+        self.facts = facts
+        self.k1 = mk.k1
+        self.b = mk.b
+        self.avgdl = mk.avgdl
+        self.doc_len = mk.blocks["doc_len"]
+        self._mk = mk
+        self._term_ids = mk.blocks["term_ids"]
+        self._idf = mk.blocks["term_idf"]
+        self._offsets = mk.blocks["postings_offsets"]
+        self._docs = mk.blocks["postings_docs"]
+        self._tfs = mk.blocks["postings_tfs"]
+
+    def lookup(self, term: str):
+        key = term.encode("utf-8")
+        lo, hi = 0, len(self._term_ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = bytes(self._mk.string_bytes(self._term_ids[mid]))
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                a, b = self._offsets[mid], self._offsets[mid + 1]
+                return self._idf[mid], self._docs[a:b], self._tfs[a:b]
+        return None
+
+
+def load(snapshot_path: str, json_path: Optional[str] = None) -> Optional[KnowledgeSnapshot]:
+    """Map a snapshot; None if it is missing or stale relative to json_path."""
+    if not os.path.exists(snapshot_path):
+        return None
+    mk = MappedKnowledge(snapshot_path)
+    if json_path and os.path.exists(json_path) and not mk.matches_source(json_path):
+        return None
+    snap = KnowledgeSnapshot(freeze(mk.meta()), mk.source_sha256, source=snapshot_path)
+    facts = MappedFactTable(mk)
+    snap.derived("facts", lambda s: facts)
+    snap.derived("bm25", lambda s: MappedBm25Index(mk, facts))
+    snap.format = "snapshot"
+    return snap
+
+
+def default_path(json_path: str) -> str:
+    return os.path.splitext(json_path)[0] + ".snap"
@@ -0,0 +1,284 @@
+"""Process-resident knowledge store for the offline backend.
+
+`knowledge/knowledge.json` is loaded once, frozen, and shared by every request.
+The store re-checks the file's stat signature (size, mtime_ns, inode) at most
+once per `check_interval` seconds and swaps in a freshly parsed snapshot only
+when that signature changes, so the request path normally never touches disk.
+
+Derived artifacts (search indexes and the like) hang off each snapshot via
+`KnowledgeSnapshot.derived` and are built once per snapshot. Registered warmers
+run on a new snapshot before it is swapped in; with `background_reload` the
+rebuild happens on a worker thread while requests keep using the old snapshot.
+
+If a compiled snapshot (see `knowledge_snapshot.py`) sits next to the JSON and
+was built from its current contents, it is memory-mapped instead of parsed.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_KNOWLEDGE_PATH = os.path.join(ROOT, "knowledge", "knowledge.json")
+
+Signature = Tuple[int, int, int]
+
+
+def freeze(value: Any) -> Any:
+    """Return a read-only deep copy: dicts become mappingproxies, lists tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Inverse of freeze: plain dicts and lists again (e.g. to pickle a snapshot's data)."""
+    if isinstance(value, (dict, MappingProxyType)):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(v) for v in value]
+    return value
+
+
+def canonical_json(value: Any) -> bytes:
+    """Stable encoding used to content-address uploaded brains."""
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def stat_signature(path: str) -> Optional[Signature]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+class KnowledgeSnapshot:
+    """One immutable, parsed version of the knowledge base."""
+
+    def __init__(self, data, sha256: str, signature: Optional[Signature] = None,
+                 load_ms: float = 0.0, source: str = ""):
+        self.data = data
+        self.sha256 = sha256
+        self.signature = signature
+        self.load_ms = load_ms
+        self.source = source
+        self.format = "json"
+        self.loaded_at = time.time()
+        self._derived: Dict[str, Any] = {}
+        self._derived_lock = threading.RLock()
+
+    @classmethod
+    def from_bytes(cls, raw: bytes, signature: Optional[Signature] = None, source: str = ""):
+        t0 = time.perf_counter()
+        data = freeze(json.loads(raw.decode("utf-8")))
+        sha = hashlib.sha256(raw).hexdigest()
+        return cls(data, sha, signature, (time.perf_counter() - t0) * 1000.0, source)
+
+    @classmethod
+    def from_data(cls, data: Any, source: str = ""):
+        """Freeze an already-decoded brain; sha256 is taken over its canonical JSON."""
+        t0 = time.perf_counter()
+        sha = hashlib.sha256(canonical_json(data)).hexdigest()
+        frozen = freeze(data)
+        return cls(frozen, sha, None, (time.perf_counter() - t0) * 1000.0, source)
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def derived(self, name: str, builder: Callable[["KnowledgeSnapshot"], Any]) -> Any:
+        """Return the artifact `name`, building it with `builder(self)` on first use."""
+        try:
+            return self._derived[name]
+        except KeyError:
+            pass
+        with self._derived_lock:
+            if name not in self._derived:
+                self._derived[name] = builder(self)
+            return self._derived[name]
+
+
+Warmer = Callable[[KnowledgeSnapshot], Any]
+Listener = Callable[[Optional[KnowledgeSnapshot], KnowledgeSnapshot], Any]
+
+
+def run_warmers(snap: KnowledgeSnapshot, warmers: Iterable[Warmer]) -> None:
+    for warm in warmers:
+        try:
+            warm(snap)
+        except Exception as e:
+            logger.warning("knowledge warmer %r failed: %s", warm, e)
+
+
+class KnowledgeStore:
+    """Holds the current KnowledgeSnapshot and reloads it when the file changes."""
+
+    def __init__(self, path: str = DEFAULT_KNOWLEDGE_PATH, check_interval: float = 2.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 warmers: Iterable[Warmer] = (), background_reload: bool = False,
+                 snapshot_path: Optional[str] = None):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.check_interval = check_interval
+        self.background_reload = background_reload
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._snapshot: Optional[KnowledgeSnapshot] = None
+        self._next_check = 0.0
+        self._warmers: List[Warmer] = list(warmers)
+        self._listeners: List[Listener] = []
+        self._reloading = False
+        # signature of a file that failed to load: not retried (or logged) until it changes
+        self._failed_sig = None
+        self._stats: Dict[str, Any] = {
+            "loads": 0,
+            "reloads": 0,
+            "load_errors": 0,
+            "checks": 0,
+            "initial_load_ms": None,
+            "last_load_ms": None,
+            "last_loaded_at": None,
+            "last_error": None,
+            "last_warm_ms": None,
+        }
+
+    def add_warmer(self, warm: Warmer) -> None:
+        """Run `warm(snapshot)` on every future snapshot before it goes live."""
+        self._warmers.append(warm)
+
+    def add_listener(self, listener: Listener) -> None:
+        """Call `listener(old, new)` after each new snapshot goes live."""
+        self._listeners.append(listener)
+
+    def load(self) -> Optional[KnowledgeSnapshot]:
+        """Force a (re)load from disk; keeps the previous snapshot on failure."""
+        with self._lock:
+            self._next_check = self._clock() + self.check_interval
+            snap = self._build()
+            if snap is not None:
+                self._install(snap)
+            return self._snapshot
+
+    def current(self) -> Optional[KnowledgeSnapshot]:
+        """Return the active snapshot, checking the file at most once per interval."""
+        snap = self._snapshot
+        now = self._clock()
+        if snap is not None and now < self._next_check:
+            return snap
+        with self._lock:
+            if self._snapshot is not None and now < self._next_check:
+                return self._snapshot
+            self._next_check = now + self.check_interval
+            self._stats["checks"] += 1
+            sig = self._signature()
+            # a vanished file keeps the last good snapshot in service
+            if sig is not None and sig != self._failed_sig and (self._snapshot is None
+                                                                or sig != self._snapshot.signature):
+                if self.background_reload and self._snapshot is not None:
+                    if not self._reloading:
+                        self._reloading = True
+                        threading.Thread(target=self._background_reload, name="knowledge-reload",
+                                         daemon=True).start()
+                else:
+                    snap = self._build()
+                    if snap is not None:
+                        self._install(snap)
+            return self._snapshot
+
+    def _background_reload(self) -> None:
+        try:
+            snap = self._build()
+            if snap is not None:
+                with self._lock:
+                    self._install(snap)
+        finally:
+            self._reloading = False
+
+    def _signature(self):
+        sig = stat_signature(self.path)
+        if not self.snapshot_path:
+            return sig
+        snap_sig = stat_signature(self.snapshot_path)
+        return None if sig is None and snap_sig is None else (sig, snap_sig)
+
+    def _build(self) -> Optional[KnowledgeSnapshot]:
+        """Read, parse and warm a new snapshot without touching the live one."""
+        t0 = time.perf_counter()
+        attempted = self._signature()
+        snap = self._build_mapped() if self.snapshot_path else None
+        if snap is None:
+            try:
+                with open(self.path, "rb") as f:
+                    # stamp the signature of the file we actually read, not the one stat()ed
+                    st = os.fstat(f.fileno())
+                    sig = (st.st_size, st.st_mtime_ns, st.st_ino)
+                    raw = f.read()
+                if self.snapshot_path:
+                    sig = (sig, stat_signature(self.snapshot_path))
+                snap = KnowledgeSnapshot.from_bytes(raw, sig, self.path)
+            except Exception as e:
+                self._stats["load_errors"] += 1
+                self._stats["last_error"] = str(e)
+                if attempted is None or attempted != self._failed_sig:
+                    logger.warning("knowledge load failed for %s: %s", self.path, e)
+                self._failed_sig = attempted
+                return None
+        snap.load_ms = (time.perf_counter() - t0) * 1000.0
+        t1 = time.perf_counter()
+        run_warmers(snap, self._warmers)
+        self._stats["last_warm_ms"] = round((time.perf_counter() - t1) * 1000.0, 3)
+        return snap
+
+    def _build_mapped(self) -> Optional[KnowledgeSnapshot]:
+        import knowledge_snapshot
+
+        sig = self._signature()
+        try:
+            snap = knowledge_snapshot.load(self.snapshot_path, self.path)
+        except Exception as e:
+            logger.warning("ignoring knowledge snapshot %s: %s", self.snapshot_path, e)
+            return None
+        if snap is None:
+            if os.path.exists(self.snapshot_path):
+                logger.warning("knowledge snapshot %s is stale; parsing %s instead", self.snapshot_path, self.path)
+            return None
+        snap.signature = sig
+        return snap
+
+    def _install(self, snap: KnowledgeSnapshot) -> None:
+        old = self._snapshot
+        first = old is None
+        self._snapshot = snap
+        self._stats["loads"] += 1
+        if first:
+            self._stats["initial_load_ms"] = round(snap.load_ms, 3)
+        else:
+            self._stats["reloads"] += 1
+        self._stats["last_load_ms"] = round(snap.load_ms, 3)
+        self._stats["last_loaded_at"] = snap.loaded_at
+        self._stats["last_error"] = None
+        self._failed_sig = None
+        logger.info("knowledge %s %s in %.2f ms (sha256=%s)",
+                    "loaded" if first else "reloaded", self.path, snap.load_ms, snap.sha256[:12])
+        for listener in self._listeners:
+            try:
+                listener(old, snap)
+            except Exception as e:
+                logger.warning("knowledge listener %r failed: %s", listener, e)
+
+    def stats(self) -> Dict[str, Any]:
+        out = dict(self._stats)
+        snap = self._snapshot
+        out["path"] = self.path
+        out["check_interval"] = self.check_interval
+        out["sha256"] = snap.sha256 if snap else None
+        out["format"] = snap.format if snap else None
+        return out
@@ -1,51 +1,573 @@
-from flask import Flask, jsonify, request, send_from_directory
+import time
+
+# start of the import, for the startup timing breakdown (see readiness.py)
+_IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, Response, abort, g, jsonify, request
+import json
+import logging
 import os
+from typing import Optional
+
+import inference
+import metrics
+import readiness
+import responder
+import sessions
+import static_assets
+import streaming
+from agent.eventlog import get_log
+from brain_registry import BrainRegistry
+from response_cache import ResponseCache
+from knowledge_snapshot import default_path as default_snapshot_path
+from knowledge_store import DEFAULT_KNOWLEDGE_PATH, KnowledgeStore
+
+logger = logging.getLogger("cridergpt")
+
+# The built UI is served from an in-memory table (static_assets.py) rather than
+# Flask's static handler, so the default static route is disabled. It is filled
+# in by the startup steps below.
+app = Flask(__name__, static_folder=None)
+STATIC = static_assets.AssetTable(os.environ.get(
+    "CRIDERGPT_STATIC_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "offline_ui", "dist")),
+    load=False)
+
+# Structured JSONL events (agent/eventlog.py). emit() only enqueues, so request
+# threads never wait on the disk; per-request records are opt-in.
+EVENTS = get_log(os.environ.get(
+    "CRIDERGPT_EVENT_LOG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "offline_logs", "backend.log")))
+REQUEST_EVENTS = os.environ.get("CRIDERGPT_REQUEST_EVENTS", "0") == "1"
+
+# Per-endpoint counts, payload sizes and latency histograms, plus stage timers
+# (GET /api/metrics). CRIDERGPT_PROFILE_SLOWEST=N keeps cProfile dumps of the
+# N slowest sampled requests in offline_logs/profiles/.
+METRICS = metrics.Metrics(
+    profile_slowest=int(os.environ.get("CRIDERGPT_PROFILE_SLOWEST", "0")),
+    profile_sample=float(os.environ.get("CRIDERGPT_PROFILE_SAMPLE", "0.1")),
+    profile_dir=os.path.join(os.path.dirname(os.path.abspath(__file__)), "offline_logs", "profiles"),
+)
+METRICS.install(app)
+
+# Knowledge is loaded once per process and re-checked at most every
+# CRIDERGPT_KNOWLEDGE_CHECK_INTERVAL seconds; requests never parse the file.
+# A compiled snapshot (tools/compile_knowledge.py) is mmapped when current.
+KNOWLEDGE_PATH = os.environ.get("CRIDERGPT_KNOWLEDGE", DEFAULT_KNOWLEDGE_PATH)
+KNOWLEDGE_SNAPSHOT_PATH = os.environ.get("CRIDERGPT_KNOWLEDGE_SNAPSHOT", default_snapshot_path(KNOWLEDGE_PATH))
+KNOWLEDGE = KnowledgeStore(
+    KNOWLEDGE_PATH,
+    check_interval=float(os.environ.get("CRIDERGPT_KNOWLEDGE_CHECK_INTERVAL", "2.0")),
+    warmers=[responder.warm],
+    background_reload=True,
+    snapshot_path=KNOWLEDGE_SNAPSHOT_PATH,
+)
+
+# Retrieval results keyed by normalized prompt + knowledge sha256 (0 disables).
+RESPONSE_CACHE = ResponseCache(
+    int(os.environ.get("CRIDERGPT_RESPONSE_CACHE", "1024")),
+    ttl=float(os.environ.get("CRIDERGPT_RESPONSE_CACHE_TTL", "0")),
+)
+
+
+def _drop_stale_answers(old, new):
+    # keys carry the knowledge hash already; this just frees the memory early
+    if old is not None and old.sha256 != new.sha256:
+        RESPONSE_CACHE.invalidate(old.sha256)
+
+
+def _time_knowledge_load(old, new):
+    METRICS.observe_stage("knowledge_load", new.load_ms)
+
+
+def _log_knowledge_swap(old, new):
+    EVENTS.emit("knowledge.loaded", sha256=new.sha256, format=new.format,
+                previous=old.sha256 if old is not None else None)
+
+
+KNOWLEDGE.add_listener(_drop_stale_answers)
+KNOWLEDGE.add_listener(_log_knowledge_swap)
+KNOWLEDGE.add_listener(_time_knowledge_load)
+
+STREAM_STATS = streaming.StreamStats()
+
+# Conversation sessions (sessions.py): the client sends session_id instead of
+# its history. Evicted sessions spill to runtime_cache/sessions.log unless
+# CRIDERGPT_SESSION_SPILL is empty.
+SESSIONS = sessions.SessionStore(
+    capacity=int(os.environ.get("CRIDERGPT_SESSIONS", str(sessions.DEFAULT_CAPACITY))),
+    max_turns=int(os.environ.get("CRIDERGPT_SESSION_TURNS", str(sessions.DEFAULT_MAX_TURNS))),
+    max_bytes=int(os.environ.get("CRIDERGPT_SESSION_BYTES", str(sessions.DEFAULT_MAX_BYTES))),
+    idle_ttl=float(os.environ.get("CRIDERGPT_SESSION_IDLE", str(sessions.DEFAULT_IDLE_TTL))),
+    spill_path=os.environ.get("CRIDERGPT_SESSION_SPILL", os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "runtime_cache", "sessions.log")) or None,
+)
+# set by main() when sessions cannot work: several worker processes and no
+# spill log for them to share
+SESSIONS_UNAVAILABLE: Optional[str] = None
+# earlier user turns searched along with a session prompt, so follow-ups
+# ("what are its common issues?") keep their subject
+SESSION_CONTEXT_TURNS = int(os.environ.get("CRIDERGPT_SESSION_CONTEXT", "1"))
+
+# Reply generation: inline in the request thread (default) or a pool of worker
+# processes with a bounded queue (CRIDERGPT_INFERENCE=pool; see inference.py).
+INFERENCE = inference.from_env(KNOWLEDGE_PATH, KNOWLEDGE_SNAPSHOT_PATH, stage=METRICS.stage)
+
+# Brains uploaded by the UI, addressed by content hash (see PUT /api/brain).
+# With the pool, each worker warms its own copy; here a brain is only searched
+# by streamed replies, which build its index on first use.
+BRAINS = BrainRegistry(int(os.environ.get("CRIDERGPT_BRAIN_CACHE", "8")),
+                       warmers=[] if isinstance(INFERENCE, inference.PoolBackend) else [responder.warm])
+
+# Streams render in the request thread rather than the pool, so they get their
+# own cap: over CRIDERGPT_MAX_STREAMS concurrent streams (0 = no limit) is a 503.
+STREAM_SLOTS = streaming.StreamLimiter(int(os.environ.get("CRIDERGPT_MAX_STREAMS", "16")))
+STREAM_RETRY_AFTER = 1
+
+# Heavy startup work runs as timed steps on a background thread (readiness.py);
+# /api/ready turns 200 once they are done. CRIDERGPT_STARTUP_VERIFY=0 skips the
+# integrity check.
+READINESS = readiness.Readiness(_IMPORT_STARTED)
+STARTUP_VERIFY = os.environ.get("CRIDERGPT_STARTUP_VERIFY", "1") != "0"
+# how long a UI request made during startup waits for the assets to be read
+STATIC_WAIT = 10.0
+
+
+def _load_knowledge():
+    # current() loads on first use; a request that got here first has done the work
+    snap = KNOWLEDGE.current()
+    if snap is None:
+        raise RuntimeError(KNOWLEDGE.stats().get("last_error") or "knowledge failed to load")
+    return {"format": snap.format, "load_ms": round(snap.load_ms, 3)}
+
+
+def _load_static():
+    STATIC.load()
+    return STATIC.stats()
+
+
+def _verify_integrity():
+    # imported here: the hashing code is only needed for this one step
+    from agent import runtime_init
+
+    result = runtime_init.verify_manifest()
+    if result["status"] == "fail":
+        # a failed check fails the step, so /api/ready reports it
+        raise RuntimeError(f"{len(result['missing'])} missing and {len(result['mismatched'])} modified "
+                           f"of {result['checked']} protected files")
+    return {"result": result["status"], "checked": result["checked"]}
+
+
+def _log_startup(r: readiness.Readiness):
+    timings = r.timings()
+    EVENTS.emit("startup", failed=r.failed or None, **timings)
+    logger.info("startup: %s", " ".join(f"{k}={v:.0f}" for k, v in timings.items() if v is not None))
+
+
+def start_background_work(background: bool = True, prestart_inference: bool = True) -> None:
+    """Kick off the startup steps once per process (no-op when already started)."""
+    steps = [("knowledge", _load_knowledge), ("static", _load_static)]
+    if prestart_inference and isinstance(INFERENCE, inference.PoolBackend):
+        steps.append(("inference", lambda: INFERENCE.start()))
+    if STARTUP_VERIFY:
+        steps.append(("integrity", _verify_integrity))
+    READINESS.start(steps, on_ready=_log_startup, background=background)
+
+
+# Upper bound on prompts per /api/respond/batch call, to bound memory.
+MAX_BATCH = int(os.environ.get("CRIDERGPT_MAX_BATCH", "256"))
+# NDJSON batches are scored in chunks of this size so results start flowing early.
+BATCH_STREAM_CHUNK = 32
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, payload: dict, headers: Optional[dict] = None):
+        super().__init__(payload.get("error"))
+        self.status = status
+        self.payload = payload
+        self.headers = headers or {}
+
+
+@app.errorhandler(ApiError)
+def handle_api_error(e):
+    return jsonify(e.payload), e.status, e.headers
+
+
+def generate(prompts, snapshot, brain_id, strategy, queries=None):
+    """Run the inference backend, mapping overload and timeouts to 503/504."""
+    try:
+        with METRICS.stage("inference"):
+            return INFERENCE.generate_batch(prompts, snapshot, brain_id, strategy, cache=RESPONSE_CACHE,
+                                            queries=queries)
+    except inference.Overloaded as e:
+        raise ApiError(503, {"error": "busy", "retry_after": e.retry_after},
+                       {"Retry-After": str(e.retry_after)})
+    except inference.GenerationTimeout as e:
+        raise ApiError(504, {"error": str(e)})
+
+
+STRING_FIELDS = ("prompt", "brain_id", "session_id", "strategy")
+
+
+def request_fields(data):
+    """The request's fields; 400 unless they form an object with the expected types."""
+    if not isinstance(data, dict):
+        raise ApiError(400, {"error": "request body must be a JSON object"})
+    for name in STRING_FIELDS:
+        if data.get(name) is not None and not isinstance(data[name], str):
+            raise ApiError(400, {"error": f"{name} must be a string"})
+    if data.get("brain") is not None and not isinstance(data["brain"], dict):
+        raise ApiError(400, {"error": "brain must be a JSON object"})
+    return data
+
+
+def require_sessions():
+    if SESSIONS_UNAVAILABLE:
+        raise ApiError(501, {"error": SESSIONS_UNAVAILABLE})
+
+
+def resolve_session(data):
+    """The request's session_id, or None; 400 for a malformed one."""
+    session_id = data.get("session_id")
+    if session_id is None:
+        return None
+    require_sessions()
+    if not sessions.valid_session_id(session_id):
+        raise ApiError(400, {"error": "session_id must be 8-64 characters of [A-Za-z0-9_-]"})
+    return session_id
+
+
+def session_query(session_id, prompt):
+    """Retrieval query for a session prompt: the prompt, then the latest earlier user turns."""
+    if not session_id or SESSION_CONTEXT_TURNS <= 0:
+        return prompt
+    earlier = [text for role, text in SESSIONS.history(session_id) if role == "user"]
+    return " ".join([prompt] + earlier[::-1][:SESSION_CONTEXT_TURNS])
+
+
+def resolve_context(data):
+    """Pick the knowledge for a request: (brain_id, snapshot, strategy).
+
+    Prefers a registered brain, then an inline brain, then the resident knowledge.
+    """
+    with METRICS.stage("knowledge"):
+        return _resolve_context(data)
+
+
+def _resolve_context(data):
+    brain_id = data.get("brain_id")
+    snapshot = BRAINS.get(brain_id) if brain_id else None
+    if snapshot is None and data.get("brain"):
+        brain_id, snapshot, _ = BRAINS.put(data["brain"])
+    elif snapshot is None and brain_id:
+        # let the client fall back to re-sending the full brain
+        raise ApiError(404, {"error": "unknown brain_id", "brain_id": brain_id})
+    if snapshot is None:
+        snapshot = KNOWLEDGE.current()
+    try:
+        strategy = responder.resolve_strategy(data.get("strategy"))
+    except ValueError as e:
+        raise ApiError(400, {"error": str(e)})
+    return brain_id, snapshot, strategy
+
+
+@app.before_request
+def _start_timer():
+    g.started_at = time.perf_counter()
+    if not READINESS.started:
+        # imported without main() (tests, benchmarks, a WSGI host): start on first use
+        start_background_work()
+
+
+@app.after_request
+def _log_request(response):
+    # a 503 from /api/ready is the launcher polling during startup, not a failure
+    if REQUEST_EVENTS or (response.status_code >= 500 and request.endpoint != "ready"):
+        EVENTS.emit("http.request", method=request.method, path=request.path, status=response.status_code,
+                    ms=round((time.perf_counter() - g.get("started_at", time.perf_counter())) * 1000, 2))
+    return response
 
-app = Flask(__name__, static_folder="offline_ui/dist")
 
 @app.route("/")
 def serve_index():
     # serve the built frontend index
-    return send_from_directory("offline_ui/dist", "index.html")
+    return serve_static("index.html")
+
+
+@app.route("/<path:filename>", methods=["GET", "HEAD"])
+def serve_static(filename):
+    if not READINESS.done:
+        READINESS.wait_for("static", STATIC_WAIT)
+    found = STATIC.lookup(filename, request.headers.get("Accept-Encoding", ""),
+                          request.headers.get("If-None-Match", ""))
+    if found is None:
+        abort(404)
+    status, body, headers = found
+    return Response(body, status=status, headers=headers)
+
+
+@app.route("/api/health", methods=["GET"])
+def health():
+    # liveness only: answers as soon as the server accepts connections
+    return jsonify({"status": "ok", "pid": os.getpid(),
+                    "uptime_s": round(time.perf_counter() - _IMPORT_STARTED, 3)})
+
+
+@app.route("/api/ready", methods=["GET"])
+def ready():
+    state = READINESS.snapshot()
+    return jsonify(state), 200 if state["ready"] else 503
+
+
+@app.route("/api/knowledge", methods=["GET"])
+def knowledge_stats():
+    return jsonify(KNOWLEDGE.stats())
+
+
+def response_cache_stats():
+    out = RESPONSE_CACHE.stats()
+    if isinstance(INFERENCE, inference.PoolBackend):
+        # only streamed replies retrieve in this process; the pool's workers cache their own
+        out["scope"] = "stream"
+        out["pool"] = INFERENCE.cache_stats()
+    return out
+
+
+@app.route("/api/cache", methods=["GET"])
+def cache_stats():
+    return jsonify(response_cache_stats())
+
+
+@app.route("/api/brain", methods=["PUT"])
+def register_brain():
+    brain = request.get_json(silent=True)
+    if not isinstance(brain, dict) or not brain:
+        return jsonify({"error": "brain must be a non-empty JSON object"}), 400
+    brain_id, _, created = BRAINS.put(brain)
+    return jsonify({"brain_id": brain_id, "created": created}), (201 if created else 200)
 
 
 @app.route("/api/respond", methods=["POST"])
 def respond():
-    data = request.get_json()
-    prompt = data.get("prompt", "")
-    # If frontend provided a brain, prefer it; otherwise try to load knowledge.json
-    brain = data.get("brain")
-    if not brain:
-        try:
-            import json
-            with open(os.path.join('knowledge', 'knowledge.json'), 'r', encoding='utf-8') as f:
-                brain = json.load(f)
-        except Exception:
-            brain = None
-
-    # Simple local response that uses the brain if available
-    if brain:
-        tone = brain.get('personality', {}).get('tone', '')
-        ag_first = None
-        ag = brain.get('agriculture')
-        if isinstance(ag, dict):
-            # pick a short agriculture fact to include
-            for k, v in ag.items():
-                if isinstance(v, dict):
-                    if 'overview' in v:
-                        ag_first = v.get('overview')
-                        break
-                    if 'description' in v:
-                        ag_first = v.get('description')
-                        break
-        reply = f"🤖 CriderGPT (Offline) [{tone}]: {prompt}"
-        if ag_first:
-            reply += f"\n\nLocal knowledge (agriculture): {ag_first}"
+    data = request_fields(request.get_json(silent=True))
+    prompt = data.get("prompt") or ""
+    session_id = resolve_session(data)
+    brain_id, snapshot, strategy = resolve_context(data)
+    reply = generate([prompt], snapshot, brain_id, strategy, [session_query(session_id, prompt)])[0]
+    out = {"response": reply}
+    if brain_id:
+        out["brain_id"] = brain_id
+    if session_id:
+        SESSIONS.append(session_id, "user", prompt)
+        SESSIONS.append(session_id, "assistant", reply)
+        out["session_id"] = session_id
+    return jsonify(out)
+
+
+@app.route("/api/respond/stream", methods=["GET", "POST"])
+def respond_stream():
+    """Stream the reply as Server-Sent Events: `token` events, then `done`."""
+    started_at = time.perf_counter()
+    # EventSource can only GET, so accept the same fields as query parameters
+    data = request.get_json(silent=True) if request.method == "POST" else request.args
+    data = request_fields({} if data is None else data)
+    if not STREAM_SLOTS.acquire():
+        raise ApiError(503, {"error": "busy", "retry_after": STREAM_RETRY_AFTER},
+                       {"Retry-After": str(STREAM_RETRY_AFTER)})
+    try:
+        body = _stream_body(data, started_at)
+    except BaseException:
+        STREAM_SLOTS.release()
+        raise
+    return Response(
+        STREAM_SLOTS.hold(body),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _stream_body(data, started_at):
+    prompt = data.get("prompt") or ""
+    session_id = resolve_session(data)
+    brain_id, snapshot, strategy = resolve_context(data)
+    hits = None
+    if session_id:
+        hits = responder.find_facts(session_query(session_id, prompt), snapshot, strategy=strategy,
+                                    cache=RESPONSE_CACHE)
+    segments = responder.iter_reply(prompt, snapshot, hits=hits, strategy=strategy, cache=RESPONSE_CACHE)
+    if session_id:
+        segments = _recorded(session_id, prompt, segments)
+    tokens = responder.iter_tokens(segments)
+    done = {"brain_id": brain_id} if brain_id else {}
+    if session_id:
+        done["session_id"] = session_id
+    return streaming.stream_events(tokens, started_at, STREAM_STATS, done)
+
+
+def _recorded(session_id, prompt, segments):
+    # the turn is stored only once the whole reply has been sent
+    sent = []
+    for segment in segments:
+        sent.append(segment)
+        yield segment
+    SESSIONS.append(session_id, "user", prompt)
+    SESSIONS.append(session_id, "assistant", "".join(sent))
+
+
+@app.route("/api/session", methods=["POST"])
+def create_session():
+    require_sessions()
+    return jsonify({"session_id": SESSIONS.create()}), 201
+
+
+@app.route("/api/session/<session_id>", methods=["GET", "DELETE"])
+def session_detail(session_id):
+    require_sessions()
+    if not sessions.valid_session_id(session_id):
+        abort(404)
+    if request.method == "DELETE":
+        if not SESSIONS.delete(session_id):
+            abort(404)
+        return "", 204
+    found = SESSIONS.get(session_id)
+    if found is None:
+        abort(404)
+    return jsonify(found)
+
+
+@app.route("/api/sessions", methods=["GET"])
+def session_stats():
+    return jsonify(SESSIONS.stats())
+
+
+@app.route("/api/respond/batch", methods=["POST"])
+def respond_batch():
+    """Answer many prompts against one knowledge context, in input order.
+
+    Body: {"prompts": [...], "brain_id"/"brain", "strategy", "stream"}. With
+    "stream": true (or Accept: application/x-ndjson) each result is written as
+    one NDJSON line as soon as its chunk has been scored.
+    """
+    data = request.get_json(silent=True)
+    data = request_fields({} if data is None else data)
+    prompts = data.get("prompts")
+    if not isinstance(prompts, list) or not all(isinstance(p, str) for p in prompts):
+        raise ApiError(400, {"error": "prompts must be a list of strings"})
+    if len(prompts) > MAX_BATCH:
+        raise ApiError(413, {"error": f"batch too large: {len(prompts)} prompts (max {MAX_BATCH})",
+                             "max_batch": MAX_BATCH})
+    brain_id, snapshot, strategy = resolve_context(data)
+    stream = bool(data.get("stream")) or request.accept_mimetypes.best == "application/x-ndjson"
+    if not stream:
+        replies = generate(prompts, snapshot, brain_id, strategy)
+        out = {"responses": replies, "count": len(replies)}
+        if brain_id:
+            out["brain_id"] = brain_id
+        return jsonify(out)
+
+    def lines():
+        for start in range(0, len(prompts), BATCH_STREAM_CHUNK):
+            chunk = prompts[start:start + BATCH_STREAM_CHUNK]
+            try:
+                replies = INFERENCE.generate_batch(chunk, snapshot, brain_id, strategy, cache=RESPONSE_CACHE)
+            except (inference.Overloaded, inference.GenerationTimeout) as e:
+                # headers are already sent: report the failure in-band and stop
+                yield json.dumps({"index": start, "error": str(e)}) + "\n"
+                return
+            for i, reply in enumerate(replies, start):
+                yield json.dumps({"index": i, "response": reply}, ensure_ascii=False) + "\n"
+
+    return Response(lines(), mimetype="application/x-ndjson")
+
+
+@app.route("/api/metrics", methods=["GET"])
+def metrics_endpoint():
+    """JSON by default; Prometheus text with ?format=prometheus or Accept: text/plain."""
+    fmt = request.args.get("format")
+    if fmt == "prometheus" or (fmt is None and request.accept_mimetypes.best == "text/plain"):
+        return Response(METRICS.render_prometheus(), mimetype="text/plain; version=0.0.4")
+    out = METRICS.snapshot()
+    out["streams"] = stream_stats()
+    out["cache"] = response_cache_stats()
+    out["inference"] = INFERENCE.stats()
+    return jsonify(out)
+
+
+@app.route("/api/inference", methods=["GET"])
+def inference_stats():
+    return jsonify(INFERENCE.stats())
+
+
+def stream_stats():
+    out = STREAM_STATS.snapshot()
+    out["slots"] = STREAM_SLOTS.snapshot()
+    return out
+
+
+@app.route("/api/respond/stream/stats", methods=["GET"])
+def respond_stream_stats():
+    return jsonify(stream_stats())
+
+
+def _shutdown():
+    # runs in each worker once it has drained: spill open conversations, then
+    # stop the inference processes this worker started
+    SESSIONS.flush()
+    INFERENCE.close()
+
+
+READINESS.record("import", (time.perf_counter() - _IMPORT_STARTED) * 1000.0)
+
+
+def main():
+    global SESSIONS_UNAVAILABLE
+    import argparse
+    import multiprocessing
+    import sys
+
+    # inference workers are spawned; a frozen build must dispatch to them here
+    multiprocessing.freeze_support()
+
+    parser = argparse.ArgumentParser(description="CriderGPT Offline backend")
+    parser.add_argument("--serve", action="store_true",
+                        help="production mode: pooled WSGI server, debug off, graceful SIGTERM")
+    parser.add_argument("--host", default=os.environ.get("CRIDERGPT_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("CRIDERGPT_PORT", "5000")))
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("CRIDERGPT_THREADS", "8")),
+                        help="request threads per worker process (--serve)")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("CRIDERGPT_WORKERS", "1")),
+                        help="pre-forked worker processes, POSIX only (--serve)")
+    parser.add_argument("--keepalive", type=float, default=15.0, help="idle keep-alive timeout in seconds")
+    parser.add_argument("--backlog", type=int, default=int(os.environ.get("CRIDERGPT_BACKLOG", "64")),
+                        help="connections allowed to wait for a request thread before new ones get 503 (--serve)")
+    parser.add_argument("--drain-timeout", type=float, default=10.0,
+                        help="seconds to let in-flight requests finish on shutdown")
+    parser.add_argument("--access-log", action="store_true", help="log every request (--serve)")
+    args = parser.parse_args()
+
+    # a frozen (PyInstaller) build is always production
+    if args.serve or getattr(sys, "frozen", False):
+        import server
+
+        if args.workers > 1:
+            # workers share no memory: keep every session in the spill log instead
+            if SESSIONS.spill_path:
+                SESSIONS.share()
+            else:
+                SESSIONS_UNAVAILABLE = "sessions need CRIDERGPT_SESSION_SPILL when serving with --workers > 1"
+
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+        # one process serves while startup runs; pre-forked workers inherit it finished
+        # (and start their own inference pools on first use)
+        start_background_work(background=args.workers <= 1, prestart_inference=args.workers <= 1)
+        server.serve(app, args.host, args.port, threads=args.threads, workers=args.workers,
+                     keepalive_timeout=args.keepalive, drain_timeout=args.drain_timeout,
+                     access_log=args.access_log, backlog=args.backlog, on_shutdown=_shutdown)
     else:
-        reply = f"🤖 CriderGPT (Offline): '{prompt}' processed locally."
-    return jsonify({"response": reply})
+        # Run the Flask dev server on 127.0.0.1:5000; with the reloader, only the
+        # serving child does the startup work
+        if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            start_background_work()
+        app.run(host=args.host, port=args.port, debug=True)
 
 
 if __name__ == "__main__":
-    # Run the Flask dev server on 127.0.0.1:5000
-    app.run(host="127.0.0.1", port=5000, debug=True)
+    main()
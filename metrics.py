@@ -0,0 +1,276 @@
+"""Request and stage metrics for the backend (`GET /api/metrics`).
+
+`Metrics.install(app)` adds Flask hooks that record, per endpoint (the URL
+rule, so `/<path:filename>` is one series), request counts by status, request
+and response payload bytes, and a latency histogram. Latency is measured until
+the response body has been fully sent, so streamed replies count their whole
+duration. `Metrics.stage(name)` times the responder's stages (knowledge
+resolution, retrieval, reply build) the same way.
+
+Histograms use fixed buckets, so recording is O(1) and memory stays constant;
+p50/p95/p99 are interpolated within buckets. `render_prometheus` emits the
+text exposition format.
+
+With `profile_slowest > 0`, a sample of requests runs under cProfile (one at a
+time, as only one profiler can be active), and the profiles of the N slowest
+requests seen are kept as `.prof` files in `profile_dir`.
+"""
+import bisect
+import cProfile
+import heapq
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# milliseconds
+BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _le_labels(bounds) -> List[str]:
+    # the exposition format uses seconds
+    return [f"{b / 1000.0:g}" for b in bounds] + ["+Inf"]
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lo = self.bounds[i - 1] if i > 0 else 0.0
+                hi = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(lo + (hi - lo) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    def as_dict(self) -> Dict[str, Any]:
+        out = {"count": self.count, "sum_ms": round(self.sum, 3), "max_ms": round(self.max, 3),
+               "avg_ms": round(self.sum / self.count, 3) if self.count else None}
+        for q in QUANTILES:
+            v = self.quantile(q)
+            out[f"p{int(q * 100)}_ms"] = round(v, 3) if v is not None else None
+        return out
+
+
+class _EndpointStats:
+    def __init__(self):
+        self.statuses: Dict[int, int] = {}
+        self.latency = Histogram()
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.latency.count,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "latency": self.latency.as_dict(),
+        }
+
+
+class _CountingBody:
+    """Wraps a streamed response body to count bytes and fire `done` on close."""
+
+    def __init__(self, body, done):
+        self._body = body
+        self._done = done
+        self.bytes = 0
+
+    def __iter__(self):
+        for chunk in self._body:
+            self.bytes += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            close = getattr(self._body, "close", None)
+            if close:
+                close()
+        finally:
+            self._done(self.bytes)
+
+
+class Metrics:
+    def __init__(self, profile_slowest: int = 0, profile_sample: float = 0.1,
+                 profile_dir: Optional[str] = None):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.endpoints: Dict[Tuple[str, str], _EndpointStats] = {}
+        self.stages: Dict[str, Histogram] = {}
+        self.in_flight = 0
+        self.profile_slowest = profile_slowest
+        self.profile_sample = profile_sample
+        self.profile_dir = profile_dir
+        self._profiling = threading.Lock()
+        self._slowest: List[Tuple[float, str]] = []  # min-heap of (ms, file)
+
+    # ------------------------------------------------------------ recording
+
+    def observe(self, endpoint: str, method: str, status: int, ms: float,
+                request_bytes: int = 0, response_bytes: int = 0) -> None:
+        with self._lock:
+            stats = self.endpoints.get((endpoint, method))
+            if stats is None:
+                stats = self.endpoints[(endpoint, method)] = _EndpointStats()
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.latency.observe(ms)
+            stats.request_bytes += request_bytes
+            stats.response_bytes += response_bytes
+
+    def observe_stage(self, name: str, ms: float) -> None:
+        with self._lock:
+            hist = self.stages.get(name)
+            if hist is None:
+                hist = self.stages[name] = Histogram()
+            hist.observe(ms)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(name, (time.perf_counter() - t0) * 1000.0)
+
+    # ------------------------------------------------------------ profiling
+
+    def _start_profile(self) -> Optional[cProfile.Profile]:
+        if self.profile_slowest <= 0 or not self.profile_dir or random.random() >= self.profile_sample:
+            return None
+        if not self._profiling.acquire(blocking=False):
+            return None
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:  # another profiler is active
+            self._profiling.release()
+            return None
+        return prof
+
+    def _finish_profile(self, prof: cProfile.Profile, endpoint: str, ms: float) -> None:
+        prof.disable()
+        self._profiling.release()
+        with self._lock:
+            if len(self._slowest) >= self.profile_slowest and ms <= self._slowest[0][0]:
+                return
+            os.makedirs(self.profile_dir, exist_ok=True)
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", endpoint).strip("_") or "root"
+            path = os.path.join(self.profile_dir, f"{slug}-{ms:.1f}ms-{int(time.time() * 1000)}.prof")
+            prof.dump_stats(path)
+            heapq.heappush(self._slowest, (ms, path))
+            while len(self._slowest) > self.profile_slowest:
+                _, evicted = heapq.heappop(self._slowest)
+                try:
+                    os.remove(evicted)
+                except OSError:
+                    pass
+
+    # ---------------------------------------------------------------- flask
+
+    def install(self, app) -> None:
+        from flask import g, request
+
+        @app.before_request
+        def _metrics_start():
+            with self._lock:
+                self.in_flight += 1
+            g.metrics_t0 = time.perf_counter()
+            g.metrics_profile = self._start_profile()
+
+        @app.after_request
+        def _metrics_finish(response):
+            t0 = g.pop("metrics_t0", None)
+            if t0 is None:
+                return response
+            endpoint = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+            method = request.method
+            status = response.status_code
+            request_bytes = request.content_length or 0
+            prof = g.pop("metrics_profile", None)
+
+            def done(response_bytes: int) -> None:
+                ms = (time.perf_counter() - t0) * 1000.0
+                with self._lock:
+                    self.in_flight -= 1
+                self.observe(endpoint, method, status, ms, request_bytes, response_bytes)
+
+            if prof is not None:
+                # the profile covers the handler; streamed bodies run after this point
+                self._finish_profile(prof, endpoint, (time.perf_counter() - t0) * 1000.0)
+            if response.is_streamed:
+                response.response = _CountingBody(response.response, done)
+            else:
+                done(response.calculate_content_length() or 0)
+            return response
+
+    # ------------------------------------------------------------ reporting
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "uptime_s": round(time.time() - self.started_at, 3),
+                "in_flight": self.in_flight,
+                "endpoints": {f"{m} {e}": s.as_dict() for (e, m), s in sorted(self.endpoints.items())},
+                "stages": {name: h.as_dict() for name, h in sorted(self.stages.items())},
+                "profiles": sorted((p for _, p in self._slowest), reverse=True),
+            }
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+
+        def histogram(name: str, hist: Histogram, labels: str) -> None:
+            cumulative = 0
+            for le, n in zip(_le_labels(hist.bounds), hist.counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {hist.sum / 1000.0:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {hist.count}")
+
+        with self._lock:
+            lines.append("# HELP cridergpt_requests_total Requests by endpoint, method and status.")
+            lines.append("# TYPE cridergpt_requests_total counter")
+            for (endpoint, method), s in sorted(self.endpoints.items()):
+                for status, n in sorted(s.statuses.items()):
+                    lines.append(f'cridergpt_requests_total{{endpoint="{endpoint}",method="{method}",'
+                                 f'status="{status}"}} {n}')
+            for kind in ("request", "response"):
+                lines.append(f"# HELP cridergpt_{kind}_bytes_total {kind.capitalize()} payload bytes.")
+                lines.append(f"# TYPE cridergpt_{kind}_bytes_total counter")
+                for (endpoint, method), s in sorted(self.endpoints.items()):
+                    n = s.request_bytes if kind == "request" else s.response_bytes
+                    lines.append(f'cridergpt_{kind}_bytes_total{{endpoint="{endpoint}",method="{method}"}} {n}')
+            lines.append("# HELP cridergpt_request_duration_seconds Request latency until the body is sent.")
+            lines.append("# TYPE cridergpt_request_duration_seconds histogram")
+            for (endpoint, method), s in sorted(self.endpoints.items()):
+                histogram("cridergpt_request_duration_seconds", s.latency,
+                          f'endpoint="{endpoint}",method="{method}"')
+            lines.append("# HELP cridergpt_stage_duration_seconds Time spent in responder stages.")
+            lines.append("# TYPE cridergpt_stage_duration_seconds histogram")
+            for name, hist in sorted(self.stages.items()):
+                histogram("cridergpt_stage_duration_seconds", hist, f'stage="{name}"')
+            lines.append("# HELP cridergpt_requests_in_flight Requests currently being handled.")
+            lines.append("# TYPE cridergpt_requests_in_flight gauge")
+            lines.append(f"cridergpt_requests_in_flight {self.in_flight}")
+        return "\n".join(lines) + "\n"
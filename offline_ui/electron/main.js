@@ -1,6 +1,14 @@
 const { app, BrowserWindow } = require('electron');
 const path = require('path');
 const { spawn } = require('child_process');
+const http = require('http');
+
+// The backend answers /api/ready with 200 once knowledge, UI assets and the
+// integrity check are done; poll it instead of guessing how long startup takes.
+const BACKEND_PORT = Number(process.env.CRIDERGPT_PORT || 5000);
+const READY_POLL_MS = 50;
+// show the window anyway after this long (the UI reports an offline backend)
+const READY_TIMEOUT_MS = 15000;
 
 let mainWindow;
 let backendProcess = null;
@@ -46,26 +54,60 @@ function startBackendIfNeeded() {
   // prefer a bundled backend executable if present
   const exePath = path.join(__dirname, '..', '..', 'dist-backend', 'CriderGPT_Backend.exe');
   if (require('fs').existsSync(exePath)) {
-    backendProcess = spawn(exePath, [], { detached: true, stdio: 'ignore' });
+    backendProcess = spawn(exePath, ['--serve'], { detached: true, stdio: 'ignore' });
     backendProcess.unref();
   } else {
     // fallback to launching python script if Python is available
     const py = process.platform === 'win32' ? 'python' : 'python3';
     const script = path.join(__dirname, '..', '..', 'main.py');
     if (require('fs').existsSync(script)) {
-      backendProcess = spawn(py, [script], { stdio: 'ignore', detached: true });
+      // run from the repo root: the integrity manifest lists paths relative to it
+      backendProcess = spawn(py, [script, '--serve'], {
+        stdio: 'ignore', detached: true, cwd: path.dirname(script),
+      });
       backendProcess.unref();
     }
   }
 }
 
+function checkReady(callback) {
+  const req = http.get({ host: '127.0.0.1', port: BACKEND_PORT, path: '/api/ready', timeout: 1000 }, (res) => {
+    let body = '';
+    res.setEncoding('utf8');
+    res.on('data', (chunk) => { body += chunk; });
+    res.on('end', () => {
+      let state = {};
+      try { state = JSON.parse(body); } catch (e) {}
+      // `done` without `ready` means a startup step failed: stop waiting for it
+      callback(res.statusCode === 200 || state.done === true);
+    });
+  });
+  req.on('timeout', () => req.destroy());
+  req.on('error', () => callback(false));
+}
+
+function whenBackendReady(callback) {
+  const started = Date.now();
+  const poll = () => {
+    checkReady((ready) => {
+      if (ready || Date.now() - started >= READY_TIMEOUT_MS) {
+        callback(ready, Date.now() - started);
+      } else {
+        setTimeout(poll, READY_POLL_MS);
+      }
+    });
+  };
+  poll();
+}
+
 app.on('ready', () => {
   createSplash();
   startBackendIfNeeded();
-  setTimeout(() => {
+  whenBackendReady((ready, waitedMs) => {
+    console.log(`backend ${ready ? 'ready' : 'not ready'} after ${waitedMs} ms`);
     createWindow();
     if (splash) splash.close();
-  }, 1200);
+  });
 });
 
 app.on('window-all-closed', () => {
@@ -74,6 +116,36 @@ app.on('window-all-closed', () => {
   }
 });
 
+// Give the backend a chance to drain in-flight requests (it handles SIGTERM)
+// before the app exits; force-kill it if it takes longer than this.
+const BACKEND_DRAIN_MS = 10000;
+let backendStopping = false;
+
+app.on('before-quit', (event) => {
+  if (!backendProcess || backendProcess.exitCode !== null || backendStopping) return;
+  event.preventDefault();
+  backendStopping = true;
+  const proc = backendProcess;
+  const finish = () => {
+    backendProcess = null;
+    app.quit();
+  };
+  const timer = setTimeout(() => {
+    try { process.kill(-proc.pid, 'SIGKILL'); } catch (e) {}
+    finish();
+  }, BACKEND_DRAIN_MS);
+  proc.once('exit', () => {
+    clearTimeout(timer);
+    finish();
+  });
+  try {
+    process.kill(-proc.pid, 'SIGTERM');
+  } catch (e) {
+    // no process group (e.g. Windows): signal the process itself
+    try { proc.kill('SIGTERM'); } catch (e2) { clearTimeout(timer); finish(); }
+  }
+});
+
 app.on('quit', () => {
   if (backendProcess) {
     try { process.kill(-backendProcess.pid); } catch(e){}
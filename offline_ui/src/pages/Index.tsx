@@ -2,7 +2,7 @@ import React, { useState, useEffect } from "react";
 import { NavigationMenu } from "../components/navigation-menu";
 import ChatInterface, { Message } from "../components/ChatInterface";
 import AIAssistant from "../components/AIAssistant";
-import { getOfflineResponse } from "../utils/localAI";
+import { streamOfflineResponse } from "../utils/localAI";
 import { loadKnowledge } from "../system/loadKnowledge";
 
 export default function Index() {
@@ -18,13 +18,17 @@ export default function Index() {
     setMessages((s) => [...s, userMsg]);
     setValue("");
     setLoading(true);
+    // append an empty AI message and grow it as tokens stream in
+    setMessages((s) => [...s, { who: "ai", text: "" }]);
+    const setLast = (update: (text: string) => string) =>
+      setMessages((s) => {
+        const last = s[s.length - 1];
+        return [...s.slice(0, -1), { ...last, text: update(last.text) }];
+      });
     try {
-      const r = await getOfflineResponse(txt, brain ?? undefined);
-      const aiMsg: Message = { who: "ai", text: r };
-      setMessages((s) => [...s, aiMsg]);
+      await streamOfflineResponse(txt, brain ?? undefined, (tok) => setLast((t) => t + tok));
     } catch (e) {
-      const aiMsg: Message = { who: "ai", text: "(error contacting local backend)" };
-      setMessages((s) => [...s, aiMsg]);
+      setLast(() => "(error contacting local backend)");
     } finally {
       setLoading(false);
     }
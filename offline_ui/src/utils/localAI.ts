@@ -1,11 +1,110 @@
-export async function getOfflineResponse(prompt: string, brain?: any): Promise<string> {
-  const payload: any = { prompt };
-  if (brain) payload.brain = brain;
-  const res = await fetch("http://127.0.0.1:5000/api/respond", {
+const API = "http://127.0.0.1:5000";
+
+// brain object -> brain_id returned by PUT /api/brain
+const brainIds = new WeakMap<object, string>();
+
+export async function registerBrain(brain: any): Promise<string> {
+  const res = await fetch(`${API}/api/brain`, {
+    method: "PUT",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(brain),
+  });
+  if (!res.ok) throw new Error(`brain registration failed (${res.status})`);
+  const data = await res.json();
+  brainIds.set(brain, data.brain_id);
+  return data.brain_id;
+}
+
+// the conversation's id on the backend, which keeps its recent turns so
+// follow-up questions ("what about its injectors?") keep their subject
+let sessionId: string = crypto.randomUUID();
+
+export function resetSession(): void {
+  sessionId = crypto.randomUUID();
+}
+
+async function postRespond(payload: any): Promise<Response> {
+  return fetch(`${API}/api/respond`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify(payload),
   });
+}
+
+export async function getOfflineResponse(prompt: string, brain?: any): Promise<string> {
+  const payload: any = { prompt, session_id: sessionId };
+  if (brain && Object.keys(brain).length) {
+    try {
+      payload.brain_id = brainIds.get(brain) ?? (await registerBrain(brain));
+    } catch (e) {
+      payload.brain = brain;
+    }
+  }
+  let res = await postRespond(payload);
+  if (res.status === 404 && payload.brain_id && brain) {
+    // backend restarted or evicted the brain: send it in full once (it re-registers)
+    brainIds.delete(brain);
+    res = await postRespond({ prompt, session_id: payload.session_id, brain_id: payload.brain_id, brain });
+  }
   const data = await res.json();
+  if (data.brain_id && brain) brainIds.set(brain, data.brain_id);
   return data.response;
 }
+
+// Streams the reply from /api/respond/stream (Server-Sent Events over a POST body);
+// onToken receives each piece as it arrives. Resolves with the full text.
+export async function streamOfflineResponse(
+  prompt: string,
+  brain: any | undefined,
+  onToken: (text: string) => void,
+  signal?: AbortSignal
+): Promise<string> {
+  const payload: any = { prompt, session_id: sessionId };
+  if (brain && Object.keys(brain).length) {
+    payload.brain_id = brainIds.get(brain);
+    if (!payload.brain_id) payload.brain = brain;
+  }
+  const res = await fetch(`${API}/api/respond/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(payload),
+    signal,
+  });
+  if (!res.ok || !res.body) {
+    // unknown brain_id or an old backend: fall back to the one-shot endpoint
+    const text = await getOfflineResponse(prompt, brain);
+    onToken(text);
+    return text;
+  }
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buf = "";
+  let full = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buf += decoder.decode(value, { stream: true });
+    let sep: number;
+    while ((sep = buf.indexOf("\n\n")) >= 0) {
+      const raw = buf.slice(0, sep);
+      buf = buf.slice(sep + 2);
+      let event = "message";
+      let data = "";
+      for (const line of raw.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      if (!data) continue;
+      const msg = JSON.parse(data);
+      if (event === "token") {
+        full += msg.text;
+        onToken(msg.text);
+      } else if (event === "done" && msg.brain_id && brain) {
+        brainIds.set(brain, msg.brain_id);
+      } else if (event === "error") {
+        throw new Error(msg.error);
+      }
+    }
+  }
+  return full;
+}
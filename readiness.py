@@ -0,0 +1,127 @@
+"""Startup steps and readiness for the backend (`/api/health`, `/api/ready`).
+
+The backend answers `/api/health` as soon as it can accept connections. The
+heavy startup work (loading the knowledge and building its index, reading the
+UI assets, the integrity check) runs as named steps on a background thread.
+`/api/ready` returns 200 only once every step has finished without error, so
+the launcher can poll it instead of sleeping for a fixed time (`done` tells it
+to stop polling when a step failed). Each step records its duration;
+`Readiness.timings()` is the breakdown logged once per launch.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Step = Tuple[str, Callable[[], Any]]
+
+
+class Readiness:
+    def __init__(self, started_at: Optional[float] = None):
+        # perf_counter() when the process began importing the app
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self._lock = threading.Lock()
+        # notified whenever a step finishes, for wait_for()
+        self._changed = threading.Condition(self._lock)
+        self._done = threading.Event()
+        self._steps: Dict[str, Dict[str, Any]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.ready_ms: Optional[float] = None
+
+    def _ms(self) -> float:
+        return (time.perf_counter() - self.started_at) * 1000.0
+
+    def record(self, name: str, ms: float, status: str = "ok", **info) -> None:
+        """Record a step that already happened (e.g. the import itself)."""
+        with self._lock:
+            self._steps[name] = dict(info, status=status, ms=round(ms, 3))
+            self._changed.notify_all()
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[Dict[str, Any]]:
+        """Time a step; fields put in the yielded dict are reported with it."""
+        info: Dict[str, Any] = {}
+        with self._lock:
+            self._steps[name] = {"status": "running", "ms": None}
+        t0 = time.perf_counter()
+        status = "ok"
+        try:
+            yield info
+        except Exception as e:
+            status = "failed"
+            info["error"] = f"{type(e).__name__}: {e}"
+            logger.exception("startup step %s failed", name)
+        finally:
+            self.record(name, (time.perf_counter() - t0) * 1000.0, status, **info)
+
+    def run(self, steps: List[Step], on_ready: Optional[Callable[["Readiness"], Any]] = None) -> None:
+        """Run steps in order; a failing step is recorded and the rest still run."""
+        for name, fn in steps:
+            with self.step(name) as info:
+                result = fn()
+                if isinstance(result, dict):
+                    info.update(result)
+        self.ready_ms = round(self._ms(), 3)
+        with self._lock:
+            self._done.set()
+            self._changed.notify_all()
+        if on_ready is not None:
+            on_ready(self)
+
+    def start(self, steps: List[Step], on_ready: Optional[Callable[["Readiness"], Any]] = None,
+              background: bool = True) -> None:
+        """Run the steps once per process, on a daemon thread unless background=False."""
+        with self._lock:
+            if self._thread is not None or self._done.is_set():
+                return
+            for name, _ in steps:
+                self._steps.setdefault(name, {"status": "pending", "ms": None})
+            self._thread = threading.Thread(target=self.run, args=(steps, on_ready), name="startup", daemon=True)
+        if background:
+            self._thread.start()
+        else:
+            self._thread.run()
+
+    @property
+    def started(self) -> bool:
+        return self._thread is not None
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def failed(self) -> List[str]:
+        with self._lock:
+            return [name for name, s in self._steps.items() if s["status"] == "failed"]
+
+    @property
+    def ready(self) -> bool:
+        return self.done and not self.failed
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def wait_for(self, name: str, timeout: Optional[float] = None) -> bool:
+        """Wait until one step has finished (ok or failed); False on timeout."""
+        def finished() -> bool:
+            step = self._steps.get(name)
+            return (step is not None and step["status"] in ("ok", "failed")) or self._done.is_set()
+
+        with self._lock:
+            return self._changed.wait_for(finished, timeout)
+
+    def timings(self) -> Dict[str, Optional[float]]:
+        with self._lock:
+            out = {f"{name}_ms": s["ms"] for name, s in self._steps.items()}
+        out["ready_ms"] = self.ready_ms
+        return out
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            steps = {name: dict(s) for name, s in self._steps.items()}
+        return {"ready": self.ready, "done": self.done, "since_start_ms": round(self._ms(), 3),
+                "ready_ms": self.ready_ms, "steps": steps}
@@ -0,0 +1,178 @@
+"""Reply construction shared by the /api/respond endpoints.
+
+Facts are picked by a named retrieval strategy:
+
+- ``bm25`` — keyword search over the inverted index (default).
+- ``tfidf`` — dense NumPy TF-IDF scoring; needs numpy.
+- ``agriculture`` — the original lookup: first agriculture overview/description.
+
+Before the strategy runs, prompts that name a knowledge entity ("7.3
+powerstroke", "FFA", "Wythe County") are routed straight to its facts by the
+entity router (entities.py); the strategy only fills the remaining slots.
+``CRIDERGPT_ENTITY_ROUTER=0`` turns routing off.
+"""
+import os
+import re
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import entities
+import retrieval
+
+REPLY_FACTS = 3
+DEFAULT_STRATEGY = os.environ.get("CRIDERGPT_RETRIEVAL", "bm25")
+ENTITY_ROUTING = os.environ.get("CRIDERGPT_ENTITY_ROUTER", "1") != "0"
+# the legacy lookup always answers the same way
+UNROUTED_STRATEGIES = frozenset({"agriculture"})
+
+BatchSearch = Callable[[object, Sequence[str], int], List[List[retrieval.Hit]]]
+
+
+def _bm25(snapshot, prompts: Sequence[str], k: int) -> List[List[retrieval.Hit]]:
+    return retrieval.search_batch(snapshot, prompts, k)
+
+
+def _tfidf(snapshot, prompts: Sequence[str], k: int) -> List[List[retrieval.Hit]]:
+    import tfidf
+
+    return tfidf.matrix_for(snapshot).search_batch(prompts, k)
+
+
+def _agriculture(snapshot, prompts: Sequence[str], k: int) -> List[List[retrieval.Hit]]:
+    hit = snapshot.derived("agriculture_first", _first_agriculture_fact)
+    return [[hit] if hit else [] for _ in prompts]
+
+
+def _first_agriculture_fact(snapshot) -> Optional[retrieval.Hit]:
+    # first agriculture entry with an overview (preferred) or description
+    facts = retrieval.facts_for(snapshot)
+    entity = None
+    found: Dict[str, int] = {}
+    for i, path in enumerate(facts.paths):
+        parts = path.split("/")
+        if parts[0] != "agriculture" or len(parts) != 3:
+            continue
+        if entity is not None and parts[1] != entity:
+            break
+        if parts[2] in ("overview", "description"):
+            entity = parts[1]
+            found.setdefault(parts[2], i)
+    i = found.get("overview", found.get("description"))
+    if i is None:
+        return None
+    return retrieval.Hit(i, 1.0, facts.section(i), facts.paths[i], facts.texts[i])
+
+
+STRATEGIES: Dict[str, BatchSearch] = {
+    "bm25": _bm25,
+    "tfidf": _tfidf,
+    "agriculture": _agriculture,
+}
+
+
+def resolve_strategy(name: Optional[str]) -> str:
+    """Validate a strategy name (None means the configured default)."""
+    name = name or DEFAULT_STRATEGY
+    if name not in STRATEGIES:
+        raise ValueError(f"unknown strategy {name!r}; choose one of {', '.join(sorted(STRATEGIES))}")
+    if name == "tfidf":
+        import tfidf
+
+        if not tfidf.available():
+            raise ValueError("strategy 'tfidf' requires numpy")
+    return name
+
+
+def warm(snapshot) -> None:
+    """Knowledge warmer: prebuild the entity router and whatever the default strategy searches."""
+    if ENTITY_ROUTING:
+        entities.warm(snapshot)
+    if DEFAULT_STRATEGY == "tfidf":
+        import tfidf
+
+        if tfidf.available():
+            tfidf.warm(snapshot)
+            return
+    retrieval.warm(snapshot)
+
+
+def tone_of(snapshot) -> str:
+    personality = snapshot.get("personality", {}) if snapshot else {}
+    return personality.get("tone", "") if isinstance(personality, Mapping) else ""
+
+
+def find_facts_batch(prompts: Sequence[str], snapshot, k: int = REPLY_FACTS,
+                     strategy: Optional[str] = None, cache=None) -> List[List[retrieval.Hit]]:
+    """Retrieve facts for each prompt; `cache` is an optional ResponseCache."""
+    if snapshot is None:
+        return [[] for _ in prompts]
+    strategy = resolve_strategy(strategy)
+    search = STRATEGIES[strategy]
+    out: List[List[retrieval.Hit]] = [[] for _ in prompts]
+    keys: Dict[int, tuple] = {}
+    # blank prompts get no facts but keep their slot in the output
+    live = [i for i, p in enumerate(prompts) if p.strip()]
+    if cache is not None and cache.enabled:
+        pending = []
+        for i in live:
+            keys[i] = cache.key(prompts[i], snapshot.sha256, strategy, k)
+            hits = cache.get(keys[i])
+            if hits is None:
+                pending.append(i)
+            else:
+                out[i] = list(hits)
+        live = pending
+    if live:
+        routed: Dict[int, List[retrieval.Hit]] = {}
+        if ENTITY_ROUTING and strategy not in UNROUTED_STRATEGIES:
+            routed = {i: entities.route(snapshot, prompts[i], k) for i in live}
+        # only prompts the router could not fill go on to the wider search
+        wide = [i for i in live if len(routed.get(i, ())) < k]
+        found = dict(zip(wide, search(snapshot, [prompts[i] for i in wide], k))) if wide else {}
+        for i in live:
+            hits = _merge(routed.get(i, []), found.get(i, []), k)
+            out[i] = hits
+            if i in keys:
+                cache.put(keys[i], tuple(hits))
+    return out
+
+
+def _merge(first: List[retrieval.Hit], rest: List[retrieval.Hit], k: int) -> List[retrieval.Hit]:
+    if not first:
+        return rest
+    seen = {h.fact_id for h in first}
+    return (first + [h for h in rest if h.fact_id not in seen])[:k]
+
+
+def find_facts(prompt: str, snapshot, k: int = REPLY_FACTS, strategy: Optional[str] = None,
+               cache=None) -> List[retrieval.Hit]:
+    return find_facts_batch([prompt], snapshot, k, strategy, cache)[0]
+
+
+def iter_reply(prompt: str, snapshot, k: int = REPLY_FACTS, hits: Optional[List[retrieval.Hit]] = None,
+               strategy: Optional[str] = None, cache=None) -> Iterator[str]:
+    """Yield the reply in display order, one segment at a time."""
+    if snapshot is None or not (snapshot.data or len(retrieval.facts_for(snapshot))):
+        yield f"🤖 CriderGPT (Offline): '{prompt}' processed locally."
+        return
+    yield f"🤖 CriderGPT (Offline) [{tone_of(snapshot)}]: {prompt}"
+    if hits is None:
+        hits = find_facts(prompt, snapshot, k, strategy, cache)
+    if hits:
+        yield "\n"
+        for hit in hits:
+            yield f"\nLocal knowledge ({hit.section}): {hit.text}"
+
+
+_TOKEN_RE = re.compile(r"\s*\S+|\s+")
+
+
+def iter_tokens(segments: Iterable[str]) -> Iterator[str]:
+    """Split reply segments into word tokens (leading whitespace kept) for streaming."""
+    for segment in segments:
+        yield from _TOKEN_RE.findall(segment)
+
+
+def build_reply(prompt: str, snapshot, k: int = REPLY_FACTS, hits: Optional[List[retrieval.Hit]] = None,
+                strategy: Optional[str] = None, cache=None) -> str:
+    return "".join(iter_reply(prompt, snapshot, k, hits, strategy, cache))
@@ -0,0 +1,97 @@
+"""LRU + TTL cache in front of retrieval.
+
+Entries are keyed on (normalized prompt, knowledge sha256, strategy, k). The
+normalized prompt folds case, whitespace and punctuation the same way the
+tokenizer does, so equal keys always retrieve the same facts. What is cached is
+the list of hits; the reply text is rebuilt around the caller's own prompt.
+
+Keys carry the knowledge hash, so a changed knowledge.json can never be served
+stale answers; `invalidate` additionally drops the old entries right away.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# punctuation and whitespace runs -> one space; dots inside words ("7.3l") survive
+_FOLD_RE = re.compile(r"(?:[^\w.]|_|(?<!\w)\.|\.(?!\w))+")
+
+_MISSING = object()
+
+
+def normalize_prompt(prompt: str) -> str:
+    return _FOLD_RE.sub(" ", prompt.lower()).strip()
+
+
+class ResponseCache:
+    def __init__(self, capacity: int = 1024, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, str, Any]]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    @staticmethod
+    def key(prompt: str, knowledge_sha: str, *extra: Hashable) -> Tuple:
+        return (normalize_prompt(prompt), knowledge_sha) + extra
+
+    def get(self, key: Tuple) -> Any:
+        """Return the cached value or None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self._stats["misses"] += 1
+                return None
+            expires, _, value = entry
+            if expires and expires <= self._clock():
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def put(self, key: Tuple, value: Any) -> None:
+        if not self.enabled:
+            return
+        expires = self._clock() + self.ttl if self.ttl else 0.0
+        with self._lock:
+            self._entries[key] = (expires, key[1], value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, knowledge_sha: Optional[str] = None) -> int:
+        """Drop entries for one knowledge hash (or everything); returns the count."""
+        with self._lock:
+            if knowledge_sha is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                stale = [k for k, (_, sha, _) in self._entries.items() if sha == knowledge_sha]
+                for k in stale:
+                    del self._entries[k]
+                dropped = len(stale)
+            self._stats["invalidations"] += dropped
+            return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["size"] = len(self._entries)
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else None
+        out["capacity"] = self.capacity
+        out["ttl"] = self.ttl
+        return out
@@ -0,0 +1,183 @@
+"""Keyword retrieval over the knowledge base.
+
+Every leaf value under the content sections of a brain (agriculture,
+mechanical, local_history, and any section added later) becomes one row of a
+compact fact table. A tokenized inverted index with BM25 scoring is built once
+per KnowledgeSnapshot, so a query only touches the postings of its own terms.
+"""
+import heapq
+import math
+import re
+from array import array
+from collections import Counter
+from collections.abc import Mapping
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+# Bumped whenever tokenization or index layout changes; compiled snapshots
+# built with another version are ignored.
+INDEX_VERSION = 1
+
+# Top-level keys that describe the assistant rather than hold facts.
+META_SECTIONS = frozenset({"personality", "permissions"})
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from how i in is it me of on or so that the this to "
+    "was what when where which who why with you your do does can my about tell".split()
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; keeps '7.3l', drops stopwords, folds plural 's'."""
+    out = []
+    for tok in _TOKEN_RE.findall(text.lower()):
+        if tok in STOPWORDS:
+            continue
+        if len(tok) > 3 and tok.endswith("s") and not tok.endswith("ss"):
+            tok = tok[:-1]
+        out.append(tok)
+    return out
+
+
+class Hit(NamedTuple):
+    fact_id: int
+    score: float
+    section: str
+    path: str
+    text: str
+
+
+class FactTable:
+    """Flat, column-oriented table of leaf facts."""
+
+    def __init__(self):
+        self.sections: List[str] = []
+        self.section_ids = array("H")
+        self.paths: List[str] = []
+        self.texts: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def add(self, section: str, path: str, text: str) -> None:
+        try:
+            sid = self.sections.index(section)
+        except ValueError:
+            sid = len(self.sections)
+            self.sections.append(section)
+        self.section_ids.append(sid)
+        self.paths.append(path)
+        self.texts.append(text)
+
+    def section(self, fact_id: int) -> str:
+        return self.sections[self.section_ids[fact_id]]
+
+
+def flatten_facts(brain: Mapping) -> FactTable:
+    table = FactTable()
+    for section, body in brain.items():
+        if section in META_SECTIONS:
+            continue
+        _walk(table, section, section, body)
+    return table
+
+
+def _walk(table: FactTable, section: str, path: str, value) -> None:
+    if isinstance(value, Mapping):
+        for k, v in value.items():
+            _walk(table, section, f"{path}/{k}", v)
+    elif isinstance(value, (list, tuple)):
+        for i, v in enumerate(value):
+            _walk(table, section, f"{path}/{i}", v)
+    elif isinstance(value, str):
+        if value.strip():
+            table.add(section, path, value)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        table.add(section, path, str(value))
+
+
+def fact_terms(path: str, text: str) -> List[str]:
+    # path keys ("7.3L_Powerstroke", "common_issues") are indexed with the text
+    return tokenize(path.replace("/", " ")) + tokenize(text)
+
+
+class Bm25Index:
+    """Inverted index: term -> (doc ids, term frequencies), scored with BM25."""
+
+    def __init__(self, facts: FactTable, k1: float = 1.5, b: float = 0.75):
+        self.facts = facts
+        self.k1 = k1
+        self.b = b
+        self.doc_len = array("I")
+        postings: Dict[str, Tuple[array, array]] = {}
+        for doc_id in range(len(facts)):
+            counts = Counter(fact_terms(facts.paths[doc_id], facts.texts[doc_id]))
+            self.doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                entry = postings.get(term)
+                if entry is None:
+                    entry = postings[term] = (array("I"), array("H"))
+                entry[0].append(doc_id)
+                entry[1].append(min(tf, 0xFFFF))
+        self.postings = postings
+        n = len(facts)
+        self.avgdl = (sum(self.doc_len) / n) if n else 0.0
+        self.idf = {t: math.log(1.0 + (n - len(d) + 0.5) / (len(d) + 0.5)) for t, (d, _) in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.facts)
+
+    def lookup(self, term: str) -> Optional[Tuple[float, Sequence[int], Sequence[int]]]:
+        """Return (idf, doc ids, term frequencies) for a term, or None."""
+        entry = self.postings.get(term)
+        if entry is None:
+            return None
+        return self.idf[term], entry[0], entry[1]
+
+    def scores(self, terms: Sequence[str]) -> Dict[int, float]:
+        acc: Dict[int, float] = {}
+        if not self.avgdl:
+            return acc
+        k1, b, avgdl, doc_len = self.k1, self.b, self.avgdl, self.doc_len
+        for term in set(terms):
+            entry = self.lookup(term)
+            if entry is None:
+                continue
+            idf, docs, tfs = entry
+            for doc_id, tf in zip(docs, tfs):
+                norm = k1 * (1.0 - b + b * doc_len[doc_id] / avgdl)
+                acc[doc_id] = acc.get(doc_id, 0.0) + idf * tf * (k1 + 1.0) / (tf + norm)
+        return acc
+
+    def search(self, query: str, k: int = 3) -> List[Hit]:
+        acc = self.scores(tokenize(query))
+        best = heapq.nlargest(k, acc.items(), key=lambda kv: (kv[1], -kv[0]))
+        facts = self.facts
+        return [Hit(i, s, facts.section(i), facts.paths[i], facts.texts[i]) for i, s in best]
+
+
+def facts_for(snapshot) -> FactTable:
+    return snapshot.derived("facts", lambda s: flatten_facts(s.data))
+
+
+def build_index(snapshot) -> Bm25Index:
+    return Bm25Index(facts_for(snapshot))
+
+
+def index_for(snapshot) -> Bm25Index:
+    return snapshot.derived("bm25", build_index)
+
+
+def warm(snapshot) -> None:
+    """Knowledge warmer: build the index before the snapshot serves traffic."""
+    index_for(snapshot)
+
+
+def search(snapshot, query: str, k: int = 3) -> List[Hit]:
+    return index_for(snapshot).search(query, k)
+
+
+def search_batch(snapshot, queries: Sequence[str], k: int = 3) -> List[List[Hit]]:
+    index = index_for(snapshot)
+    return [index.search(q, k) for q in queries]
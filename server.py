@@ -0,0 +1,392 @@
+"""Production WSGI server for the offline backend (`python main.py --serve`).
+
+Built only on the standard library, so it runs unchanged inside the
+PyInstaller bundle:
+
+- a bounded thread pool per process handles connections, with HTTP/1.1
+  keep-alive and chunked responses for streamed bodies. At most `backlog`
+  accepted connections wait for a thread; beyond that a connection gets a
+  `503` with `Retry-After` and is closed;
+- on POSIX, `workers > 1` pre-forks processes that share the listening socket
+  (and the page cache behind a memory-mapped knowledge snapshot);
+- SIGTERM/SIGINT stop accepting, let in-flight requests finish (up to
+  `drain_timeout` seconds), then exit. Connections waiting for their next
+  request (idle keep-alive, or not yet sent anything) are shut down at once,
+  so a browser's pooled sockets do not hold the process open.
+"""
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from typing import Callable, List, Optional
+from urllib.parse import unquote
+
+logger = logging.getLogger(__name__)
+
+# statuses that never carry a body, so no chunked framing either
+_NO_BODY = {204, 304}
+
+
+class _BodyReader:
+    """wsgi.input limited to Content-Length; `drain` discards what the app left."""
+
+    def __init__(self, rfile, length: int):
+        self._rfile = rfile
+        self._left = length
+
+    def read(self, size: int = -1) -> bytes:
+        if self._left <= 0:
+            return b""
+        if size is None or size < 0 or size > self._left:
+            size = self._left
+        data = self._rfile.read(size)
+        self._left -= len(data)
+        if not data:
+            self._left = 0
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        if self._left <= 0:
+            return b""
+        if size is None or size < 0 or size > self._left:
+            size = self._left
+        data = self._rfile.readline(size)
+        self._left -= len(data)
+        return data
+
+    def readlines(self, hint: int = -1) -> List[bytes]:
+        return list(iter(self.readline, b""))
+
+    def __iter__(self):
+        return iter(self.readline, b"")
+
+    def drain(self) -> None:
+        while self._left > 0 and self.read(min(self._left, 65536)):
+            pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "CriderGPT"
+    # idle keep-alive connections are dropped after this many seconds
+    timeout = 15
+    access_log = False
+    # headers and body are separate writes; with Nagle on, delayed ACKs stall each reply ~40 ms
+    disable_nagle_algorithm = True
+
+    def handle_one_request(self):
+        self.raw_requestline = b""
+        # between requests the connection is idle: a drain may shut it down
+        if not self.server._idle_begin(self.connection):
+            self.close_connection = True
+            return
+        try:
+            self.raw_requestline = self.rfile.readline(65537)
+        except OSError:
+            pass
+        if not self.server._idle_end(self.connection, bool(self.raw_requestline)):
+            self.close_connection = True
+            return
+        try:
+            if len(self.raw_requestline) > 65536:
+                self.send_error(414)
+                self.close_connection = True
+                return
+            if not self.parse_request():
+                return
+            self.run_wsgi()
+        finally:
+            self.server._request_done()
+        if self.server.draining:
+            self.close_connection = True
+
+    def run_wsgi(self):
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            # request bodies must carry a Content-Length
+            self.send_error(411)
+            self.close_connection = True
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self.send_error(400, "bad Content-Length")
+            self.close_connection = True
+            return
+        body = _BodyReader(self.rfile, length)
+        environ = self.make_environ(body)
+        state = {"status": None, "headers": None, "sent": False, "chunked": False}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info:
+                try:
+                    if state["sent"]:
+                        raise exc_info[1].with_traceback(exc_info[2])
+                finally:
+                    exc_info = None
+            state["status"], state["headers"] = status, headers
+            return write
+
+        def send_headers():
+            code = int(state["status"].split(" ", 1)[0])
+            self.send_response(code, state["status"].partition(" ")[2])
+            keys = set()
+            for key, value in state["headers"]:
+                self.send_header(key, value)
+                keys.add(key.lower())
+            if ("content-length" not in keys and code not in _NO_BODY and code >= 200
+                    and environ["REQUEST_METHOD"] != "HEAD"):
+                state["chunked"] = True
+                self.send_header("Transfer-Encoding", "chunked")
+            if self.server.draining:
+                self.close_connection = True
+            self.send_header("Connection", "close" if self.close_connection else "keep-alive")
+            self.end_headers()
+            state["sent"] = True
+
+        def write(data: bytes):
+            if not state["sent"]:
+                send_headers()
+            if data:
+                if state["chunked"]:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                else:
+                    self.wfile.write(data)
+
+        result = None
+        try:
+            result = self.server.app(environ, start_response)
+            for data in result:
+                write(data)
+            if not state["sent"]:
+                send_headers()
+            if state["chunked"]:
+                self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (ConnectionError, socket.timeout):
+            # client went away; closing `result` below stops any generator
+            self.close_connection = True
+        except Exception:
+            logger.exception("error handling %s %s", self.command, self.path)
+            self.close_connection = True
+            if not state["sent"]:
+                self.send_error(500)
+        finally:
+            close = getattr(result, "close", None)
+            if close:
+                close()
+        if not self.close_connection:
+            try:
+                body.drain()
+            except (ConnectionError, socket.timeout):
+                self.close_connection = True
+
+    def make_environ(self, body: _BodyReader) -> dict:
+        path, _, query = self.path.partition("?")
+        environ = {
+            "REQUEST_METHOD": self.command,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": unquote(path, "latin-1"),
+            "QUERY_STRING": query,
+            "CONTENT_TYPE": self.headers.get("Content-Type", ""),
+            "CONTENT_LENGTH": self.headers.get("Content-Length", ""),
+            "SERVER_NAME": self.server.server_address[0],
+            "SERVER_PORT": str(self.server.server_address[1]),
+            "SERVER_PROTOCOL": self.request_version,
+            "REMOTE_ADDR": self.client_address[0],
+            "REMOTE_PORT": self.client_address[1],
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": body,
+            "wsgi.input_terminated": True,
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": self.server.multiprocess,
+            "wsgi.run_once": False,
+        }
+        for key, value in self.headers.items():
+            key = key.upper().replace("-", "_")
+            if key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                continue
+            key = "HTTP_" + key
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def log_request(self, code="-", size="-"):
+        if self.access_log:
+            super().log_request(code, size)
+
+
+_BUSY_RESPONSE = (b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 1\r\nContent-Length: 0\r\n"
+                  b"Connection: close\r\n\r\n")
+
+
+class PooledWSGIServer(socketserver.TCPServer):
+    """TCP server that hands each connection to a fixed-size thread pool."""
+
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, host: str, port: int, app, threads: int = 8, keepalive_timeout: float = 15.0,
+                 access_log: bool = False, backlog: int = 64):
+        handler = type("Handler", (_Handler,), {"timeout": keepalive_timeout, "access_log": access_log})
+        super().__init__((host, port), handler)
+        self.app = app
+        self.threads = max(1, threads)
+        self.backlog = max(0, backlog)
+        self.multiprocess = False
+        self.draining = False
+        self._pool = ThreadPoolExecutor(self.threads, thread_name_prefix="cridergpt-http")
+        # connections held by a thread or queued for one
+        self._slots = threading.BoundedSemaphore(self.threads + self.backlog)
+        self._lock = threading.Lock()
+        self._idle = set()  # sockets waiting for their next request line
+        self._requests = 0  # requests being handled
+        self.rejected = 0
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            try:
+                request.sendall(_BUSY_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self._pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def _idle_begin(self, conn) -> bool:
+        """Register a connection waiting for a request; False if the server is draining."""
+        with self._lock:
+            if self.draining:
+                return False
+            self._idle.add(conn)
+            return True
+
+    def _idle_end(self, conn, got_request: bool) -> bool:
+        """True if a request arrived and the drain did not shut the connection down meanwhile."""
+        with self._lock:
+            if conn not in self._idle:
+                return False
+            self._idle.discard(conn)
+            if got_request:
+                self._requests += 1
+            return got_request
+
+    def _request_done(self) -> None:
+        with self._lock:
+            self._requests -= 1
+
+    @property
+    def inflight(self) -> int:
+        return self._requests
+
+    def drain(self, timeout: float) -> bool:
+        """Close idle connections and wait for in-flight requests; True if fully drained."""
+        with self._lock:
+            self.draining = True
+            idle, self._idle = self._idle, set()
+        for conn in idle:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        deadline = time.monotonic() + timeout
+        while self._requests and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self._pool.shutdown(wait=False)
+        return self._requests == 0
+
+
+def _serve_one(server: PooledWSGIServer, drain_timeout: float,
+               on_shutdown: Optional[Callable[[], object]] = None) -> None:
+    """Serve until SIGTERM/SIGINT, drain in-flight requests, then run on_shutdown."""
+    def stop(signum, frame):
+        # shutdown() blocks until serve_forever returns, so call it off-thread
+        if not server.draining:
+            server.draining = True
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+    drained = server.drain(drain_timeout)
+    logger.info("pid %d stopped (%s)", os.getpid(), "drained" if drained else f"{server.inflight} requests abandoned")
+    if on_shutdown is not None:
+        try:
+            on_shutdown()
+        except Exception:
+            logger.exception("shutdown hook failed in pid %d", os.getpid())
+
+
+def serve(app, host: str = "127.0.0.1", port: int = 5000, threads: int = 8, workers: int = 1,
+          keepalive_timeout: float = 15.0, drain_timeout: float = 10.0, access_log: bool = False,
+          backlog: int = 64, on_shutdown: Optional[Callable[[], object]] = None) -> None:
+    """Serve `app` until SIGTERM/SIGINT.
+
+    `on_shutdown` runs in every serving process (each pre-forked worker, or
+    the single process) once it has drained, before that process exits.
+    """
+    if workers > 1 and not hasattr(os, "fork"):
+        logger.warning("prefork workers are not available on this platform; using 1 process")
+        workers = 1
+    server = PooledWSGIServer(host, port, app, threads, keepalive_timeout, access_log, backlog)
+    server.multiprocess = workers > 1
+    print(f"CriderGPT backend serving on http://{host}:{server.port} "
+          f"({workers} worker(s) x {server.threads} threads, pid {os.getpid()})", flush=True)
+    if workers <= 1:
+        _serve_one(server, drain_timeout, on_shutdown)
+        return
+
+    children: List[int] = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _serve_one(server, drain_timeout, on_shutdown)
+            finally:
+                os._exit(0)
+        children.append(pid)
+    # the parent only supervises; children own the listening socket from here on
+    server.socket.close()
+
+    def forward(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for pid in children:
+        while True:
+            try:
+                os.waitpid(pid, 0)
+                break
+            except InterruptedError:
+                continue
+            except ChildProcessError:
+                break
+    sys.stdout.flush()
@@ -0,0 +1,505 @@
+"""Server-side conversation sessions, bounded in memory and optionally on disk.
+
+A client sends `session_id` with each prompt instead of resending the whole
+conversation. Each session keeps its recent turns in a ring buffer, within
+both a turn count and a byte budget, so one long conversation cannot grow
+without limit. Sessions live in a global LRU. A session that has been idle
+longer than `idle_ttl`, or that falls off the end when there are more than
+`capacity` sessions, is evicted. With `spill_path` set it is first appended to
+a compact log, and a later request for it reads it back.
+
+The spill log is append-only. Each record is a little-endian u32 length
+followed by zlib-compressed JSON, {"id", "updated", "turns": [[role, text], ...]}
+or {"id", "deleted": true}. The latest record for an id wins, and an in-memory
+index maps id -> offset. When dead records make up most of the file it is
+rewritten with only the live ones.
+
+Sessions in memory are per process, and disk I/O happens outside the store's
+lock: an evicted session stays reachable in `_pending` until its record is
+written. Pre-forked workers cannot share memory, so a store serving several
+of them is made `shared` (see `share()`): it keeps nothing in memory and
+reads and writes every session through the spill log (see SpillLog), whose
+file lock makes each turn a single read-modify-write.
+"""
+import json
+import os
+import re
+import secrets
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_CAPACITY = 256
+DEFAULT_MAX_TURNS = 16
+DEFAULT_MAX_BYTES = 8 << 10  # per session
+DEFAULT_IDLE_TTL = 3600.0
+# longest text kept for one turn; the rest of a long prompt or reply is cut
+MAX_TURN_CHARS = 2000
+# the spill log is compacted once it is this big and mostly dead records
+COMPACT_MIN_BYTES = 1 << 20
+# spilled sessions beyond this many are forgotten, oldest first
+DEFAULT_MAX_SPILLED = 10000
+
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+_LEN = struct.Struct("<I")
+
+Turn = Tuple[str, str]  # (role, text): role is "user" or "assistant"
+
+
+def new_session_id() -> str:
+    return secrets.token_urlsafe(16)
+
+
+def valid_session_id(session_id: Any) -> bool:
+    return isinstance(session_id, str) and bool(SESSION_ID_RE.match(session_id))
+
+
+class Session:
+    __slots__ = ("id", "turns", "bytes", "updated", "max_bytes")
+
+    def __init__(self, session_id: str, max_turns: int, max_bytes: int, updated: float = 0.0):
+        self.id = session_id
+        self.turns: Deque[Turn] = deque(maxlen=max_turns)
+        self.bytes = 0
+        self.updated = updated
+        self.max_bytes = max_bytes
+
+    def add(self, role: str, text: str) -> None:
+        text = text[:MAX_TURN_CHARS]
+        if len(self.turns) == self.turns.maxlen:
+            self.bytes -= len(self.turns[0][1].encode("utf-8"))
+        self.turns.append((role, text))
+        self.bytes += len(text.encode("utf-8"))
+        # oldest turns go first; the newest one is always kept
+        while self.bytes > self.max_bytes and len(self.turns) > 1:
+            self.bytes -= len(self.turns.popleft()[1].encode("utf-8"))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"session_id": self.id, "updated": self.updated, "bytes": self.bytes,
+                "turns": [{"role": r, "text": t} for r, t in self.turns]}
+
+
+if os.name == "nt":
+    import msvcrt
+
+    def _lock_file(f) -> None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock_file(f) -> None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_file(f) -> None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f) -> None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class SpillLog:
+    """Append-only record file for evicted sessions.
+
+    Pre-forked workers share one file. Every operation holds an exclusive
+    lock on `path + ".lock"` and first catches up with what other processes
+    did: records appended since the last look are indexed, and a file that
+    was replaced (compacted) or shrank is scanned again from the start.
+    """
+
+    def __init__(self, path: str, max_sessions: int = DEFAULT_MAX_SPILLED):
+        self.path = path
+        self.max_sessions = max_sessions
+        # id -> (offset, record length); insertion order is spill order
+        self.index: "OrderedDict[str, Tuple[int, int]]" = OrderedDict()
+        self.size = 0
+        self.live_bytes = 0
+        self.compactions = 0
+        self._file_id: Optional[Tuple[int, int]] = None  # (st_dev, st_ino) of the file indexed
+        self._thread_lock = threading.Lock()
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        with self._locked():
+            pass
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._thread_lock, open(self.path + ".lock", "a+b") as lock:
+            _lock_file(lock)
+            try:
+                self._refresh()
+                yield
+            finally:
+                _unlock_file(lock)
+
+    def _refresh(self) -> None:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self.index.clear()
+            self.size = self.live_bytes = 0
+            self._file_id = None
+            return
+        if (st.st_dev, st.st_ino) != self._file_id or st.st_size < self.size:
+            self.index.clear()
+            self.size = self.live_bytes = 0
+            self._file_id = (st.st_dev, st.st_ino)
+        if st.st_size != self.size:
+            self._scan(self.size)
+
+    def _scan(self, start: int) -> None:
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read()
+        pos = 0
+        while pos + _LEN.size <= len(data):
+            (n,) = _LEN.unpack_from(data, pos)
+            end = pos + _LEN.size + n
+            if end > len(data):
+                break  # torn write at the tail
+            try:
+                record = json.loads(zlib.decompress(data[pos + _LEN.size:end]))
+                session_id = record["id"]
+            except (zlib.error, ValueError, KeyError, TypeError):
+                break
+            self._index(session_id, None if record.get("deleted") else (start + pos, end - pos))
+            pos = end
+        if pos != len(data):
+            # drop the unreadable tail so later appends stay parseable
+            with open(self.path, "r+b") as f:
+                f.truncate(start + pos)
+        self.size = start + pos
+
+    def _index(self, session_id: str, entry: Optional[Tuple[int, int]]) -> None:
+        old = self.index.pop(session_id, None)
+        if old is not None:
+            self.live_bytes -= old[1]
+        if entry is not None:
+            self.index[session_id] = entry
+            self.live_bytes += entry[1]
+        while len(self.index) > self.max_sessions:
+            _, (_, n) = self.index.popitem(last=False)
+            self.live_bytes -= n
+
+    def _append(self, record: Dict[str, Any]) -> Tuple[int, int]:
+        body = zlib.compress(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        blob = _LEN.pack(len(body)) + body
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(blob)
+        if self._file_id is None:
+            st = os.stat(self.path)
+            self._file_id = (st.st_dev, st.st_ino)
+        self.size = offset + len(blob)
+        return offset, len(blob)
+
+    def write(self, session_id: str, updated: float, turns: List[Turn]) -> None:
+        with self._locked():
+            self._index(session_id, self._append({"id": session_id, "updated": updated, "turns": turns}))
+            self._maybe_compact()
+
+    def delete(self, session_id: str) -> bool:
+        with self._locked():
+            if session_id not in self.index:
+                return False
+            self._append({"id": session_id, "deleted": True})
+            self._index(session_id, None)
+            self._maybe_compact()
+            return True
+
+    def update(self, session_id: str,
+               fn: Callable[[Optional[Dict[str, Any]]], Tuple[float, List[Turn]]]) -> None:
+        """Read-modify-write one session under the file lock.
+
+        `fn(record)` gets the latest record (or None) and returns the new
+        (updated, turns); no other process can write the session in between.
+        """
+        with self._locked():
+            updated, turns = fn(self._read(session_id))
+            self._index(session_id, self._append({"id": session_id, "updated": updated, "turns": turns}))
+            self._maybe_compact()
+
+    def read(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The latest record for a session, or None if it is unknown or unreadable."""
+        with self._locked():
+            return self._read(session_id)
+
+    def _read(self, session_id: str) -> Optional[Dict[str, Any]]:
+        # called with the file lock held
+        entry = self.index.get(session_id)
+        if entry is None:
+            return None
+        offset, n = entry
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                blob = f.read(n)
+            record = json.loads(zlib.decompress(blob[_LEN.size:]))
+            if record["id"] != session_id:
+                return None
+            record["turns"]  # a tombstone or damaged record has none
+        except (OSError, zlib.error, ValueError, KeyError, TypeError):
+            return None
+        return record
+
+    def _maybe_compact(self) -> None:
+        # called with the file lock held
+        if self.size < COMPACT_MIN_BYTES or self.live_bytes * 2 > self.size:
+            return
+        tmp = self.path + ".tmp"
+        index: "OrderedDict[str, Tuple[int, int]]" = OrderedDict()
+        with open(self.path, "rb") as src, open(tmp, "wb") as dst:
+            for session_id, (offset, n) in self.index.items():
+                src.seek(offset)
+                index[session_id] = (dst.tell(), n)
+                dst.write(src.read(n))
+            size = dst.tell()
+        os.replace(tmp, self.path)
+        st = os.stat(self.path)
+        self._file_id = (st.st_dev, st.st_ino)
+        self.index = index
+        self.size = self.live_bytes = size
+        self.compactions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._locked():
+            return {"sessions": len(self.index), "bytes": self.size, "live_bytes": self.live_bytes,
+                    "compactions": self.compactions}
+
+
+class SessionStore:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, max_turns: int = DEFAULT_MAX_TURNS,
+                 max_bytes: int = DEFAULT_MAX_BYTES, idle_ttl: Optional[float] = DEFAULT_IDLE_TTL,
+                 spill_path: Optional[str] = None, clock: Callable[[], float] = time.time,
+                 shared: bool = False):
+        if shared and not spill_path:
+            raise ValueError("a shared session store needs a spill_path")
+        self.capacity = max(1, capacity)
+        self.max_turns = max(1, max_turns)
+        self.max_bytes = max(1, max_bytes)
+        self.idle_ttl = idle_ttl if idle_ttl and idle_ttl > 0 else None
+        self.spill_path = spill_path
+        self.shared = shared
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        # evicted, record not written yet: still served from here
+        self._pending: Dict[str, Session] = {}
+        self._spill: Optional[SpillLog] = None
+        self._spill_lock = threading.Lock()
+        self._stats = {"created": 0, "evictions": 0, "expirations": 0, "spilled": 0, "restored": 0,
+                       "deleted": 0}
+
+    def _spill_log(self) -> Optional[SpillLog]:
+        # opened on first use, so importing the app never touches the disk
+        if self._spill is None and self.spill_path:
+            with self._spill_lock:
+                if self._spill is None:
+                    self._spill = SpillLog(self.spill_path)
+        return self._spill
+
+    def share(self) -> None:
+        """Switch to keeping sessions only in the spill log (before forking workers)."""
+        if not self.spill_path:
+            raise ValueError("a shared session store needs a spill_path")
+        self.flush()
+        with self._lock:
+            self._sessions.clear()
+            self._pending.clear()
+            self.shared = True
+
+    def _from_record(self, session_id: str, record: Optional[Dict[str, Any]]) -> Optional[Session]:
+        """A spilled record as a Session; None if there is none or it has been idle too long."""
+        if record is None:
+            return None
+        if self.idle_ttl and record["updated"] < self._clock() - self.idle_ttl:
+            return None
+        session = Session(session_id, self.max_turns, self.max_bytes, record["updated"])
+        for role, text in record["turns"]:
+            session.add(role, text)
+        return session
+
+    def _enforce_limits(self) -> List[Session]:
+        """Drop idle and excess sessions (lock held); returns those still to be spilled."""
+        evicted = []
+        if self.idle_ttl:
+            cutoff = self._clock() - self.idle_ttl
+            # LRU order is idle order: stop at the first session still in use
+            while self._sessions:
+                oldest = next(iter(self._sessions.values()))
+                if oldest.updated >= cutoff:
+                    break
+                self._sessions.popitem(last=False)
+                self._stats["expirations"] += 1
+                evicted.append(oldest)
+        while len(self._sessions) > self.capacity:
+            _, oldest = self._sessions.popitem(last=False)
+            self._stats["evictions"] += 1
+            evicted.append(oldest)
+        if not self.spill_path:
+            return []
+        evicted = [e for e in evicted if e.turns]
+        for session in evicted:
+            self._pending[session.id] = session
+        return evicted
+
+    def _spill_out(self, evicted: List[Session]) -> None:
+        """Write evicted sessions to the spill log, without holding the store lock."""
+        if not evicted:
+            return
+        spill = self._spill_log()
+        for session in evicted:
+            with self._lock:
+                if self._pending.get(session.id) is not session:
+                    continue  # used again (or deleted) since it was evicted
+                turns, updated = list(session.turns), session.updated
+            spill.write(session.id, updated, turns)
+            with self._lock:
+                if self._pending.get(session.id) is session:
+                    del self._pending[session.id]
+                self._stats["spilled"] += 1
+
+    def _cached(self, session_id: str) -> Optional[Session]:
+        # lock held
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._pending.pop(session_id, None)
+            if session is None:
+                return None
+            self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _get(self, session_id: str, create: bool) -> Tuple[Optional[Session], List[Session]]:
+        """The session (from memory or the spill log) and any sessions its arrival evicted."""
+        with self._lock:
+            session = self._cached(session_id)
+            if session is not None:
+                return session, []
+        spill = self._spill_log()
+        record = spill.read(session_id) if spill is not None else None
+        with self._lock:
+            session = self._cached(session_id)  # another request may have loaded it meanwhile
+            if session is None:
+                if record is None and not create:
+                    return None, []
+                session = Session(session_id, self.max_turns, self.max_bytes, self._clock())
+                if record is not None:
+                    for role, text in record["turns"]:
+                        session.add(role, text)
+                    self._stats["restored"] += 1
+                else:
+                    self._stats["created"] += 1
+                self._sessions[session_id] = session
+            return session, self._enforce_limits()
+
+    def create(self) -> str:
+        session_id = new_session_id()
+        if self.shared:
+            self._spill_log().write(session_id, self._clock(), [])
+            with self._lock:
+                self._stats["created"] += 1
+            return session_id
+        _, evicted = self._get(session_id, create=True)
+        self._spill_out(evicted)
+        return session_id
+
+    def history(self, session_id: str, turns: Optional[int] = None) -> List[Turn]:
+        """Recent turns, oldest first (the last `turns` of them if given)."""
+        if self.shared:
+            session = self._from_record(session_id, self._spill_log().read(session_id))
+            items = list(session.turns) if session is not None else []
+            return items[-turns:] if turns else items
+        session, evicted = self._get(session_id, create=False)
+        self._spill_out(evicted)
+        if session is None:
+            return []
+        with self._lock:
+            items = list(session.turns)
+        return items[-turns:] if turns else items
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        if self.shared:
+            session = self._from_record(session_id, self._spill_log().read(session_id))
+            return session.as_dict() if session is not None else None
+        session, evicted = self._get(session_id, create=False)
+        self._spill_out(evicted)
+        if session is None:
+            return None
+        with self._lock:
+            return session.as_dict()
+
+    def append(self, session_id: str, role: str, text: str) -> None:
+        """Record a turn, creating the session if it is unknown."""
+        if self.shared:
+            self._append_shared(session_id, role, text)
+            return
+        session, evicted = self._get(session_id, create=True)
+        with self._lock:
+            # evicted again between the lookup and here: bring it back
+            if self._sessions.get(session_id) is not session:
+                self._pending.pop(session_id, None)
+                self._sessions[session_id] = session
+            session.add(role, text)
+            session.updated = self._clock()
+        self._spill_out(evicted)
+
+    def _append_shared(self, session_id: str, role: str, text: str) -> None:
+        created = []
+
+        def add(record: Optional[Dict[str, Any]]) -> Tuple[float, List[Turn]]:
+            session = self._from_record(session_id, record)
+            if session is None:
+                session = Session(session_id, self.max_turns, self.max_bytes)
+                created.append(session_id)
+            session.add(role, text)
+            return self._clock(), list(session.turns)
+
+        self._spill_log().update(session_id, add)
+        if created:
+            with self._lock:
+                self._stats["created"] += 1
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            in_memory = self._sessions.pop(session_id, None) is not None
+            in_memory = self._pending.pop(session_id, None) is not None or in_memory
+        spill = self._spill_log()
+        on_disk = spill.delete(session_id) if spill is not None else False
+        if in_memory or on_disk:
+            with self._lock:
+                self._stats["deleted"] += 1
+        return in_memory or on_disk
+
+    def flush(self) -> int:
+        """Spill every session in memory (e.g. at shutdown); returns how many."""
+        spill = self._spill_log()
+        if spill is None:
+            return 0
+        with self._lock:
+            sessions = [(s.id, s.updated, list(s.turns)) for s in self._sessions.values() if s.turns]
+            sessions += [(s.id, s.updated, list(s.turns)) for s in self._pending.values()]
+        for session_id, updated, turns in sessions:
+            spill.write(session_id, updated, turns)
+        return len(sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            evicted = self._enforce_limits()
+        self._spill_out(evicted)
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["size"] = len(self._sessions)
+            out["bytes"] = sum(s.bytes for s in self._sessions.values())
+            spill = self._spill
+        if spill is not None:
+            out["spill"] = spill.stats()
+        out.update(capacity=self.capacity, max_turns=self.max_turns, max_bytes=self.max_bytes,
+                   idle_ttl=self.idle_ttl, shared=self.shared)
+        return out
@@ -0,0 +1,195 @@
+"""In-memory static file table for the built UI (offline_ui/dist).
+
+Every file is read once at startup together with its precompressed variants
+(`.gz`, and `.br` when brotli is installed; see tools/precompress_assets.py).
+Requests are then answered from memory with no stat/open calls:
+
+- the best variant is chosen from Accept-Encoding (br > gzip > identity);
+- each variant has a strong ETag and If-None-Match is answered with 304;
+- content-hashed files (Vite's `assets/name-<hash>.ext`) are cached forever with
+  `immutable`; everything else (index.html) must revalidate.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+COMPRESSIBLE = {".html", ".js", ".mjs", ".css", ".svg", ".json", ".map", ".txt", ".ico", ".xml", ".wasm"}
+# skip tiny files: framing overhead outweighs the savings
+MIN_COMPRESS_SIZE = 256
+# Vite writes content-hashed bundles into assets/, e.g. assets/index-BM_XTRWi.js
+HASHED_DIR = "assets/"
+HASHED_NAME = re.compile(r"[-.][A-Za-z0-9_-]{8,}\.[a-z0-9]+$")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+class Variant(NamedTuple):
+    body: bytes
+    etag: str
+    encoding: Optional[str]
+
+
+class Asset(NamedTuple):
+    mimetype: str
+    cache_control: str
+    variants: Dict[Optional[str], Variant]
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(data, quality=11)
+    raise ValueError(f"unsupported encoding {encoding}")
+
+
+def precompress_dir(root: str, force: bool = False) -> List[Tuple[str, str, int, int]]:
+    """Write .gz/.br siblings for compressible files; returns (path, enc, raw, packed)."""
+    written = []
+    encodings = [("gzip", ".gz")] + ([("br", ".br")] if brotli is not None else [])
+    for dirpath, _, files in os.walk(root):
+        for fn in files:
+            ext = os.path.splitext(fn)[1].lower()
+            if ext not in COMPRESSIBLE:
+                continue
+            src = os.path.join(dirpath, fn)
+            st = os.stat(src)
+            if st.st_size < MIN_COMPRESS_SIZE:
+                continue
+            data = None
+            for enc, suffix in encodings:
+                dst = src + suffix
+                if not force and os.path.exists(dst) and os.stat(dst).st_mtime_ns >= st.st_mtime_ns:
+                    continue
+                if data is None:
+                    with open(src, "rb") as f:
+                        data = f.read()
+                packed = compress(data, enc)
+                if len(packed) >= len(data):
+                    if os.path.exists(dst):
+                        os.remove(dst)
+                    continue
+                with open(dst, "wb") as f:
+                    f.write(packed)
+                written.append((src, enc, len(data), len(packed)))
+    return written
+
+
+def _etag(body: bytes, encoding: Optional[str]) -> str:
+    digest = hashlib.sha256(body).hexdigest()[:20]
+    return f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    prefs: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        prefs[name] = q
+    return prefs
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip() for t in if_none_match.split(",")]
+    # If-None-Match uses weak comparison
+    return any(t == etag or t == "W/" + etag for t in tags)
+
+
+class AssetTable:
+    def __init__(self, root: str, load: bool = True):
+        self.root = root
+        self.assets: Dict[str, Asset] = {}
+        self.bytes = 0
+        if load:
+            self.load()
+
+    def load(self) -> None:
+        assets: Dict[str, Asset] = {}
+        total = 0
+        if os.path.isdir(self.root):
+            for dirpath, _, files in os.walk(self.root):
+                for fn in files:
+                    if fn.endswith((".gz", ".br")):
+                        continue
+                    full = os.path.join(dirpath, fn)
+                    rel = os.path.relpath(full, self.root).replace(os.sep, "/")
+                    asset = self._load_one(full, rel)
+                    assets[rel] = asset
+                    total += sum(len(v.body) for v in asset.variants.values())
+        self.assets = assets
+        self.bytes = total
+
+    def _load_one(self, full: str, rel: str) -> Asset:
+        fn = rel.rsplit("/", 1)[-1]
+        with open(full, "rb") as f:
+            body = f.read()
+            mtime = os.fstat(f.fileno()).st_mtime_ns
+        variants: Dict[Optional[str], Variant] = {None: Variant(body, _etag(body, None), None)}
+        for enc, suffix in (("gzip", ".gz"), ("br", ".br")):
+            # a variant older than its source is left over from a previous build
+            if os.path.exists(full + suffix) and os.stat(full + suffix).st_mtime_ns >= mtime:
+                with open(full + suffix, "rb") as f:
+                    packed = f.read()
+                variants[enc] = Variant(packed, _etag(body, enc), enc)
+        ext = os.path.splitext(fn)[1].lower()
+        if "gzip" not in variants and ext in COMPRESSIBLE and len(body) >= MIN_COMPRESS_SIZE:
+            # not precompressed at build time: do it once here
+            packed = compress(body, "gzip")
+            if len(packed) < len(body):
+                variants["gzip"] = Variant(packed, _etag(body, "gzip"), "gzip")
+        mimetype = mimetypes.guess_type(fn)[0] or "application/octet-stream"
+        if mimetype.startswith("text/") or mimetype in ("application/javascript", "image/svg+xml"):
+            mimetype += "; charset=utf-8"
+        hashed = rel.startswith(HASHED_DIR) and HASHED_NAME.search(fn)
+        cache = IMMUTABLE if hashed else REVALIDATE
+        return Asset(mimetype, cache, variants)
+
+    def lookup(self, path: str, accept_encoding: str = "", if_none_match: str = ""
+               ) -> Optional[Tuple[int, Optional[bytes], Dict[str, str]]]:
+        """Return (status, body, headers) for a request path, or None if unknown."""
+        asset = self.assets.get(path)
+        if asset is None:
+            return None
+        prefs = parse_accept_encoding(accept_encoding)
+        variant = asset.variants[None]
+        for enc in ("br", "gzip"):
+            if enc in asset.variants and prefs.get(enc, prefs.get("*", 0.0)) > 0:
+                variant = asset.variants[enc]
+                break
+        headers = {
+            "Content-Type": asset.mimetype,
+            "Cache-Control": asset.cache_control,
+            "ETag": variant.etag,
+        }
+        if len(asset.variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if variant.encoding:
+            headers["Content-Encoding"] = variant.encoding
+        if etag_matches(if_none_match, variant.etag):
+            return 304, None, headers
+        return 200, variant.body, headers
+
+    def stats(self) -> Dict[str, int]:
+        return {"files": len(self.assets), "bytes": self.bytes}
@@ -0,0 +1,142 @@
+"""Server-Sent Events helpers for /api/respond/stream."""
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+
+def sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class StreamStats:
+    """Counters plus time-to-first-token for streamed replies."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = 0
+        self.completed = 0
+        self.disconnected = 0
+        self.failed = 0
+        self._ttfb_total = 0.0
+        self._ttfb_count = 0
+        self.ttfb_last_ms: Optional[float] = None
+        self.ttfb_max_ms = 0.0
+
+    def first_byte(self, ms: float) -> None:
+        with self._lock:
+            self._ttfb_total += ms
+            self._ttfb_count += 1
+            self.ttfb_last_ms = ms
+            self.ttfb_max_ms = max(self.ttfb_max_ms, ms)
+
+    def bump(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            avg = self._ttfb_total / self._ttfb_count if self._ttfb_count else None
+            return {
+                "started": self.started,
+                "completed": self.completed,
+                "disconnected": self.disconnected,
+                "failed": self.failed,
+                "in_flight": self.started - self.completed - self.disconnected - self.failed,
+                "ttfb_avg_ms": round(avg, 3) if avg is not None else None,
+                "ttfb_last_ms": round(self.ttfb_last_ms, 3) if self.ttfb_last_ms is not None else None,
+                "ttfb_max_ms": round(self.ttfb_max_ms, 3),
+            }
+
+
+class StreamLimiter:
+    """Caps concurrent streams; a slot is held until the response body is closed.
+
+    Streams retrieve and render in the request thread (the inference pool
+    only serves whole replies), so this is their load shedding: over the
+    limit, acquire() fails and the caller answers 503.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self.active = 0
+        self.rejected = 0
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if 0 < self.limit <= self.active:
+                self.rejected += 1
+                return False
+            self.active += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.active -= 1
+
+    def hold(self, body: Iterable[str]) -> "_HeldBody":
+        """Wrap an acquired stream's body so closing it frees the slot."""
+        return _HeldBody(body, self.release)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"limit": self.limit, "active": self.active, "rejected": self.rejected}
+
+
+class _HeldBody:
+    # the WSGI server closes the body even if it was never iterated, which a
+    # generator's own finally would miss
+    def __init__(self, body: Iterable[str], release: Callable[[], None]):
+        self._body = body
+        self._release = release
+
+    def __iter__(self):
+        return iter(self._body)
+
+    def close(self) -> None:
+        release, self._release = self._release, None
+        try:
+            close = getattr(self._body, "close", None)
+            if close:
+                close()
+        finally:
+            if release is not None:
+                release()
+
+
+def stream_events(tokens: Iterator[str], started_at: float, stats: StreamStats,
+                  done: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """Wrap a token generator as SSE `token` events followed by one `done` event.
+
+    If the client goes away the WSGI server closes this generator, which in
+    turn closes `tokens`, so an abandoned generation stops immediately.
+    """
+    stats.bump("started")
+    count = 0
+    ttfb = None
+    try:
+        for tok in tokens:
+            if ttfb is None:
+                ttfb = (time.perf_counter() - started_at) * 1000.0
+                stats.first_byte(ttfb)
+            count += 1
+            yield sse("token", {"text": tok})
+        info = dict(done or {})
+        info.update({
+            "tokens": count,
+            "ttfb_ms": round(ttfb, 3) if ttfb is not None else None,
+            "total_ms": round((time.perf_counter() - started_at) * 1000.0, 3),
+        })
+        yield sse("done", info)
+        stats.bump("completed")
+    except GeneratorExit:
+        stats.bump("disconnected")
+        raise
+    except Exception as e:
+        stats.bump("failed")
+        yield sse("error", {"error": str(e)})
+    finally:
+        close = getattr(tokens, "close", None)
+        if close:
+            close()
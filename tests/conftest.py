@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# the backend modules live at the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def main_module(tmp_path_factory):
+    """main.py imported with its side effects kept out of the repository."""
+    logs = tmp_path_factory.mktemp("logs")
+    os.environ.setdefault("CRIDERGPT_STARTUP_VERIFY", "0")
+    os.environ.setdefault("CRIDERGPT_EVENT_LOG", str(logs / "backend.log"))
+    os.environ.setdefault("CRIDERGPT_SESSION_SPILL", "")
+    import main
+
+    return main
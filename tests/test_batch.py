@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+
+def _lines(response):
+    assert response.mimetype == "application/x-ndjson"
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_batch_answers_in_input_order(main_module):
+    client = main_module.app.test_client()
+    prompts = ["7.3 powerstroke", "corn", "hello"]
+    out = client.post("/api/respond/batch", json={"prompts": prompts}).get_json()
+    assert out["count"] == 3
+    assert out["responses"] == [client.post("/api/respond", json={"prompt": p}).get_json()["response"]
+                                for p in prompts]
+
+
+def test_oversized_batch_is_413(main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "MAX_BATCH", 4)
+    response = main_module.app.test_client().post("/api/respond/batch", json={"prompts": ["x"] * 5})
+    assert response.status_code == 413
+    assert response.get_json()["max_batch"] == 4
+
+
+@pytest.mark.parametrize("body", [{}, {"prompts": "corn"}, {"prompts": ["corn", 3]}, {"prompts": None}])
+def test_prompts_must_be_a_list_of_strings(main_module, body):
+    response = main_module.app.test_client().post("/api/respond/batch", json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "prompts must be a list of strings"}
+
+
+def test_ndjson_is_scored_in_chunks(main_module, monkeypatch):
+    chunks = []
+    real = main_module.INFERENCE.generate_batch
+
+    def recording(prompts, *args, **kwargs):
+        chunks.append(len(prompts))
+        return real(prompts, *args, **kwargs)
+
+    monkeypatch.setattr(main_module.INFERENCE, "generate_batch", recording)
+    prompts = [f"corn {i}" for i in range(main_module.BATCH_STREAM_CHUNK * 2 + 5)]
+    client = main_module.app.test_client()
+    lines = _lines(client.post("/api/respond/batch", json={"prompts": prompts, "stream": True}))
+    assert chunks == [main_module.BATCH_STREAM_CHUNK, main_module.BATCH_STREAM_CHUNK, 5]
+    assert [line["index"] for line in lines] == list(range(len(prompts)))
+    assert all(line["response"].split("\n")[0].endswith(prompts[line["index"]]) for line in lines)
+    # the Accept header selects NDJSON as well
+    accepted = client.post("/api/respond/batch", json={"prompts": prompts[:2]},
+                           headers={"Accept": "application/x-ndjson"})
+    assert [line["index"] for line in _lines(accepted)] == [0, 1]
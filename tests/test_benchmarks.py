@@ -0,0 +1,19 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import bench_backend  # noqa: E402
+
+
+def test_default_corpus_ships_with_the_repo():
+    corpus = bench_backend.DEFAULT_CORPUS
+    assert os.path.dirname(corpus) == os.path.join(ROOT, "benchmarks")
+    # a path .gitignore excludes would be missing from a fresh clone
+    ignored = subprocess.run(["git", "check-ignore", "-q", corpus], cwd=ROOT)
+    assert ignored.returncode == 1
+    prompts = bench_backend.load_corpus(corpus)
+    assert len(prompts) >= 20
+    assert all(p.strip() for p in prompts)
@@ -0,0 +1,54 @@
+import pytest
+
+from brain_registry import BrainRegistry
+
+BRAIN = {"agriculture": {"corn": {"overview": "Corn is planted in spring."}}}
+
+
+def test_put_is_content_addressed_and_evicts_oldest():
+    registry = BrainRegistry(capacity=2)
+    brain_id, snap, created = registry.put(BRAIN)
+    assert created
+    assert registry.put({"agriculture": {"corn": {"overview": "Corn is planted in spring."}}}) == (brain_id, snap, False)
+    registry.put({"a": "one"})
+    registry.put({"b": "two"})
+    assert registry.get(brain_id) is None
+
+
+@pytest.mark.parametrize("body, error", [
+    (["not", "an", "object"], "request body must be a JSON object"),
+    ({"prompt": ["hello"]}, "prompt must be a string"),
+    ({"prompt": "hi", "brain_id": 7}, "brain_id must be a string"),
+    ({"prompt": "hi", "session_id": {"id": "abcdefgh"}}, "session_id must be a string"),
+    ({"prompt": "hi", "strategy": ["bm25"]}, "strategy must be a string"),
+    ({"prompt": "hi", "brain": ["fact"]}, "brain must be a JSON object"),
+])
+def test_malformed_fields_are_rejected_before_the_registry(main_module, monkeypatch, body, error):
+    def untouched(*args, **kwargs):
+        raise AssertionError("malformed request reached the brain registry")
+
+    monkeypatch.setattr(main_module.BRAINS, "get", untouched)
+    monkeypatch.setattr(main_module.BRAINS, "put", untouched)
+    client = main_module.app.test_client()
+    response = client.post("/api/respond", json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": error}
+    assert client.post("/api/respond/stream", json=body).status_code == 400
+    if isinstance(body, dict):
+        batch = client.post("/api/respond/batch", json=dict(body, prompts=["hi"]))
+        assert batch.get_json() == {"error": error}
+
+
+def test_non_json_body_is_rejected(main_module):
+    response = main_module.app.test_client().post("/api/respond", data="prompt=hi")
+    assert response.status_code == 400
+
+
+def test_registered_brain_answers_by_id(main_module):
+    client = main_module.app.test_client()
+    brain_id = client.put("/api/brain", json=BRAIN).get_json()["brain_id"]
+    out = client.post("/api/respond", json={"prompt": "when is corn planted", "brain_id": brain_id}).get_json()
+    assert out["brain_id"] == brain_id
+    assert "spring" in out["response"]
+    missing = client.post("/api/respond", json={"prompt": "hi", "brain_id": "0" * 64})
+    assert missing.status_code == 404
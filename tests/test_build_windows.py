@@ -0,0 +1,94 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+
+@pytest.fixture
+def bw(tmp_path, monkeypatch):
+    """tools/build_windows.py pointed at a scratch copy of the layout it packages."""
+    spec = importlib.util.spec_from_file_location("build_windows", os.path.join(ROOT, "tools", "build_windows.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    for rel, text in {"main.py": "print('main')\n", "responder.py": "x = 1\n",
+                      "agent/agent.py": "y = 2\n", "agent/core_manifest.json": "{}",
+                      "agent/__pycache__/agent.cpython-312.pyc": "junk",
+                      "offline_logs/agent.log": '{"event": "start"}\n', "shadow/objects/ab/cd.z": "obj"}.items():
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+    monkeypatch.setattr(module, "ROOT", tmp_path)
+    monkeypatch.setattr(module, "OFFLINE_UI", tmp_path / "offline_ui")
+    monkeypatch.setattr(module, "DIST_DIR", tmp_path / "offline_ui" / "dist")
+    monkeypatch.setattr(module, "BUILD_DIR", tmp_path / "build" / "cridergpt_app")
+    monkeypatch.setattr(module, "STATE_PATH", tmp_path / "build" / ".build_state.json")
+    return module
+
+
+def _sync(bw, link=True):
+    state = bw.load_state()
+    counts = bw.sync_build_tree(state, workers=2, link=link)
+    bw.save_state(state)
+    return counts
+
+
+def test_incremental_accounting(bw):
+    root, out = bw.ROOT, bw.BUILD_DIR
+    first = _sync(bw)
+    assert first["copied"] + first["linked"] == 6 and first["unchanged"] == 0 and first["pruned"] == 0
+    assert not (out / "agent" / "__pycache__").exists()
+    assert _sync(bw) == {"unchanged": 6, "copied": 0, "linked": 0, "pruned": 0}
+
+    (root / "agent" / "core_manifest.json").write_text('{"changed": true}')
+    (root / "responder.py").unlink()
+    (out / "stray.txt").write_text("left behind")
+    counts = _sync(bw)
+    assert counts == {"unchanged": 4, "copied": 1, "linked": 0, "pruned": 2}
+    assert (out / "agent" / "core_manifest.json").read_text() == '{"changed": true}'
+    assert not (out / "backend" / "responder.py").exists() and not (out / "stray.txt").exists()
+
+
+def test_runtime_written_files_are_copied_not_linked(bw):
+    root, out = bw.ROOT, bw.BUILD_DIR
+    _sync(bw)
+    for rel in ("offline_logs/agent.log", "shadow/objects/ab/cd.z", "agent/core_manifest.json"):
+        assert not os.path.samefile(root / rel, out / rel), rel
+    if not os.path.samefile(root / "main.py", out / "backend" / "main.py"):
+        pytest.skip("filesystem does not support hardlinks")
+    with open(root / "offline_logs" / "agent.log", "a") as f:
+        f.write('{"event": "verify"}\n')
+    assert (out / "offline_logs" / "agent.log").read_text() == '{"event": "start"}\n'
+    assert _sync(bw)["copied"] == 1
+    # --no-hardlinks turns the earlier links into copies once
+    assert _sync(bw, link=False) == {"unchanged": 3, "copied": 3, "linked": 0, "pruned": 0}
+    assert _sync(bw, link=False)["unchanged"] == 6
+
+
+def test_runtime_file_linked_by_an_older_run_is_replaced_by_a_copy(bw):
+    root, out = bw.ROOT, bw.BUILD_DIR
+    _sync(bw)
+    log = out / "offline_logs" / "agent.log"
+    log.unlink()
+    try:
+        os.link(root / "offline_logs" / "agent.log", log)
+    except OSError:
+        pytest.skip("filesystem does not support hardlinks")
+    assert _sync(bw)["copied"] == 1
+    assert not os.path.samefile(root / "offline_logs" / "agent.log", log)
+
+
+def test_plain_prepare_discards_incremental_state(bw, monkeypatch, capsys):
+    _sync(bw)
+    assert bw.STATE_PATH.exists()
+    monkeypatch.setattr(sys, "argv", ["build_windows.py", "--prepare"])
+    bw.main()
+    assert not bw.STATE_PATH.exists()
+    assert (bw.BUILD_DIR / "pyinstaller_cmd.txt").exists()
+    # nothing from before the full rebuild is trusted
+    counts = _sync(bw)
+    assert counts["unchanged"] == 0 and counts["copied"] + counts["linked"] == 6
+    # the full copy brought agent/__pycache__ along; the build file survives
+    assert counts["pruned"] == 1 and (bw.BUILD_DIR / "pyinstaller_cmd.txt").exists()
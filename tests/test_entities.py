@@ -0,0 +1,58 @@
+from entities import EntityRouter, aliases, route, router_for
+from knowledge_store import KnowledgeSnapshot, freeze
+
+
+def _snapshot(data):
+    return KnowledgeSnapshot(freeze(data), "test-sha")
+
+
+KNOWLEDGE = {
+    "mechanical": {
+        "7.3L_Powerstroke": {"issues": ["injector leaks", "turbocharger wear"], "oil": "15w40"},
+        "diesel_engines": {"glow_plugs": "warm the cylinders for a cold start"},
+    },
+    "agriculture": {
+        "FS22_modding": {"scripts": "lua scripts live in the mod folder"},
+        "FFA": {"about": "a student leadership organization"},
+        "WytheBland_map": {"crops": "corn and hay"},
+    },
+}
+
+
+def test_aliases():
+    assert {"7.3l powerstroke", "7.3 powerstroke", "7.3l"} <= aliases("7.3L_Powerstroke")
+    assert {"fs22 modding", "fs 22 modding", "fs22", "fs 22"} <= aliases("FS22_modding")
+    assert "wythe bland map" in aliases("WytheBland_map")
+    assert "ffa" in aliases("FFA")
+    # too short to route on its own
+    assert not any(len(a) < 3 for a in aliases("A_b"))
+
+
+def _router(phrases):
+    names = sorted({n for _, n in phrases})
+    return EntityRouter(names, [(p, names.index(n)) for p, n in phrases])
+
+
+def test_scan_finds_overlapping_and_suffix_matches():
+    router = _router([("he", "he"), ("she", "she"), ("his", "his"), ("hers", "hers")])
+    found = {(router.entities[m.entity], m.start, m.end) for m in router.scan("ushers she his")}
+    # only whole words match: "she" and "his" stand alone, "hers" sits inside "ushers"
+    assert found == {("she", 7, 10), ("his", 11, 14)}
+
+
+def test_route_prefers_longest_match():
+    router = _router([("wythe", "county"), ("wythe bland map", "map")])
+    assert [router.entities[i] for i in router.route("crops on the Wythe Bland map?")] == ["map"]
+    assert [router.entities[i] for i in router.route("wythe, then fs")] == ["county"]
+
+
+def test_route_on_a_snapshot():
+    snapshot = _snapshot(KNOWLEDGE)
+    router = router_for(snapshot)
+    named = [router.entities[i].name for i in router.route("is the 7.3 powerstroke better than FS 22 mods?")]
+    # in order of appearance; "fs 22" is the model-code alias of FS22_modding
+    assert named == ["7.3L_Powerstroke", "FS22_modding"]
+    hits = route(snapshot, "what are the common issues with a 7.3 powerstroke", k=2)
+    assert hits and all(h.path.startswith("mechanical/7.3L_Powerstroke") for h in hits)
+    assert "issues" in hits[0].path
+    assert route(snapshot, "nothing named here") == []
@@ -0,0 +1,58 @@
+import warnings
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from agent import eventlog
+
+WINDOWS_PATH = r"C:\Program Files\CriderGPT\agent\core_manifest.json"
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    path = str(tmp_path / "agent.log")
+    log = eventlog.EventLog(path)
+    log.emit("verify", status="fail", paths=[WINDOWS_PATH])
+    log.emit("restore", status="ok", path=r"C:\Program Files\CriderGPT\main.py")
+    log.emit("restore", status="ok", path="/opt/cridergpt/main.py")
+    log.emit("restore", status="ok", path="knowledge/café.json")
+    log.close()
+    return path
+
+
+def _events(log_path, path_glob):
+    return [r["event"] for r in eventlog.iter_records(log_path, path_glob=path_glob)]
+
+
+def test_windows_path_substring(log_path):
+    assert _events(log_path, r"C:\Program Files\CriderGPT") == ["verify", "restore"]
+    assert _events(log_path, "core_manifest.json") == ["verify"]
+
+
+def test_windows_path_glob(log_path):
+    assert _events(log_path, r"C:\Program Files\*\main.py") == ["restore"]
+
+
+def test_posix_and_non_ascii_paths(log_path):
+    assert _events(log_path, "/opt/cridergpt") == ["restore"]
+    assert _events(log_path, "café") == ["restore"]
+    assert _events(log_path, "nowhere") == []
+
+
+def test_timestamps_are_utc_with_a_z_suffix():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        stamp = eventlog.utc_now()
+        since = eventlog.parse_time("15m")
+    assert stamp.endswith("Z") and "+" not in stamp
+    parsed = datetime.fromisoformat(stamp[:-1]).replace(tzinfo=timezone.utc)
+    assert abs(datetime.now(timezone.utc) - parsed) < timedelta(seconds=5)
+    assert since.endswith("Z") and since < stamp
+
+
+def test_parse_time_accepts_naive_and_aware_now():
+    naive = datetime(2026, 3, 1, 12, 0, 0)
+    aware = datetime(2026, 3, 1, 7, 0, 0, tzinfo=timezone(timedelta(hours=-5)))
+    assert eventlog.parse_time("2h", naive) == "2026-03-01T10:00:00Z"
+    assert eventlog.parse_time("2h", aware) == "2026-03-01T10:00:00Z"
+    assert eventlog.parse_time("2026-03-01 09:30") == "2026-03-01T09:30"
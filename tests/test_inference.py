@@ -0,0 +1,83 @@
+from concurrent.futures import Future
+
+import pytest
+
+import inference
+from inference import Cancelled, GenerationTimeout, PoolBackend, ResponderModel
+from knowledge_store import DEFAULT_KNOWLEDGE_PATH
+
+
+def _pool(**kwargs):
+    config = {"knowledge_path": DEFAULT_KNOWLEDGE_PATH, "model": "responder", "cache_size": 16}
+    return PoolBackend(config, **kwargs)
+
+
+def test_backstop_timeout_is_a_generation_timeout(monkeypatch):
+    pool = _pool(timeout=0.05)
+    pending = Future()
+    monkeypatch.setattr(pool, "submit", lambda *args, **kwargs: pending)
+    monkeypatch.setattr(inference, "CANCEL_GRACE", -5.0)
+    with pytest.raises(GenerationTimeout):
+        pool.generate_batch(["hello"], None)
+    assert pending.cancelled()
+
+
+def test_backstop_timeout_answers_504(main_module, monkeypatch):
+    def stuck(*args, **kwargs):
+        raise GenerationTimeout("no answer")
+
+    monkeypatch.setattr(main_module.INFERENCE, "generate_batch", stuck)
+    client = main_module.app.test_client()
+    assert client.post("/api/respond", json={"prompt": "hello"}).status_code == 504
+    body = client.post("/api/respond/batch", json={"prompts": ["a", "b"], "stream": True}).get_data(as_text=True)
+    assert '"error"' in body
+
+
+def test_responder_model_honours_cancel(main_module):
+    snapshot = main_module.KNOWLEDGE.current()
+    with pytest.raises(Cancelled):
+        ResponderModel().generate("tell me about the 7.3 powerstroke", snapshot, None, lambda: True)
+
+
+def test_pool_reports_worker_cache():
+    pool = _pool(workers=1, timeout=30)
+    try:
+        pool.generate("tell me about the 7.3 powerstroke", None)
+        pool.generate("Tell me about the 7.3 Powerstroke!", None)  # same cache key
+        cache = pool.stats()["cache"]
+        assert cache["workers"] == 1
+        assert cache["hits"] == 1 and cache["misses"] == 1
+    finally:
+        pool.close()
+
+
+def test_pool_close_stops_its_workers():
+    pool = _pool(workers=1)
+    pool.start()
+    assert pool.generate_batch(["hello"], None)
+    process = pool._slots[0].process
+    assert process.is_alive()
+    pool.close()
+    process.join(5)
+    assert not process.is_alive()
+
+
+def test_shutdown_flushes_sessions_then_stops_inference(main_module, monkeypatch):
+    calls = []
+    monkeypatch.setattr(main_module.SESSIONS, "flush", lambda: calls.append("flush"))
+    monkeypatch.setattr(main_module.INFERENCE, "close", lambda: calls.append("close"))
+    main_module._shutdown()
+    assert calls == ["flush", "close"]
+
+
+def test_pool_mode_does_not_warm_brains_in_the_parent(tmp_path):
+    import os
+    import subprocess
+    import sys
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, CRIDERGPT_INFERENCE="pool", CRIDERGPT_STARTUP_VERIFY="0", CRIDERGPT_SESSION_SPILL="",
+               CRIDERGPT_EVENT_LOG=str(tmp_path / "backend.log"))
+    out = subprocess.run([sys.executable, "-c", "import main; print(len(main.BRAINS._warmers))"],
+                         cwd=root, env=env, capture_output=True, text=True, timeout=60)
+    assert out.stdout.strip() == "0", out.stderr
@@ -0,0 +1,89 @@
+import json
+import os
+
+import pytest
+
+import knowledge_snapshot
+import retrieval
+from knowledge_snapshot import SnapshotError
+from knowledge_store import KnowledgeSnapshot, KnowledgeStore
+
+BRAIN = {
+    "personality": {"tone": "plain spoken"},
+    "agriculture": {"corn": {"overview": "Corn is planted in spring."},
+                    "wheat": {"overview": "Winter wheat is planted in the fall."}},
+    "mechanical": {"7.3L_Powerstroke": {"common_issues": ["Injector o-rings leak", "CPS failures"]},
+                   "torque_specs": {"head_bolts": 65}},
+    "local_history": {"fair": "The county fair started in 1911 — ünïcode included."},
+}
+QUERIES = ["when is wheat planted", "7.3 injector", "head bolts", "county fair", "nothing matches"]
+
+
+def _compile(tmp_path, brain=BRAIN):
+    source = tmp_path / "knowledge.json"
+    source.write_text(json.dumps(brain, ensure_ascii=False), encoding="utf-8")
+    out = str(tmp_path / "knowledge.snap")
+    knowledge_snapshot.write_snapshot(source.read_bytes(), out, os.stat(source))
+    return source, out
+
+
+def test_round_trip_matches_parsed_json(tmp_path):
+    source, out = _compile(tmp_path)
+    mapped = knowledge_snapshot.load(out, str(source))
+    parsed = KnowledgeSnapshot.from_data(BRAIN, source="test")
+    assert mapped.format == "snapshot"
+    assert mapped.data == {"personality": {"tone": "plain spoken"}}
+    mapped_facts, parsed_facts = retrieval.facts_for(mapped), retrieval.facts_for(parsed)
+    assert len(mapped_facts) == len(parsed_facts)
+    assert list(mapped_facts.texts) == parsed_facts.texts
+    assert list(mapped_facts.paths) == parsed_facts.paths
+    assert [mapped_facts.section(i) for i in range(len(mapped_facts))] == \
+        [parsed_facts.section(i) for i in range(len(parsed_facts))]
+    for query in QUERIES:
+        assert retrieval.search(mapped, query, k=5) == retrieval.search(parsed, query, k=5)
+
+
+def test_stale_snapshot_is_ignored(tmp_path):
+    source, out = _compile(tmp_path)
+    edited = dict(BRAIN, agriculture={"corn": {"overview": "Corn is planted in May."}})
+    source.write_text(json.dumps(edited, ensure_ascii=False), encoding="utf-8")
+    assert knowledge_snapshot.load(out, str(source)) is None
+    # same size and a new mtime: decided by the content hash
+    _compile(tmp_path)
+    text = source.read_text(encoding="utf-8")
+    source.write_text(text.replace("spring", "sprinG"), encoding="utf-8")
+    os.utime(source, ns=(1, 1))
+    assert knowledge_snapshot.load(out, str(source)) is None
+    source.write_text(text, encoding="utf-8")
+    os.utime(source, ns=(1, 1))
+    assert knowledge_snapshot.load(out, str(source)) is not None
+
+
+@pytest.mark.parametrize("damage", ["magic", "version", "truncated", "block"])
+def test_corrupt_snapshot_is_rejected(tmp_path, damage):
+    _, out = _compile(tmp_path)
+    raw = bytearray(open(out, "rb").read())
+    if damage == "magic":
+        raw[:4] = b"JUNK"
+    elif damage == "version":
+        raw[4:8] = (knowledge_snapshot.FORMAT_VERSION + 1).to_bytes(4, "little")
+    elif damage == "truncated":
+        raw = raw[:knowledge_snapshot.HEADER.size]
+    else:
+        raw = raw[:-16]
+    with open(out, "wb") as f:
+        f.write(raw)
+    with pytest.raises(SnapshotError):
+        knowledge_snapshot.load(out)
+
+
+def test_store_falls_back_to_json_when_the_snapshot_is_bad(tmp_path):
+    source, out = _compile(tmp_path)
+    store = KnowledgeStore(str(source), snapshot_path=out)
+    assert store.current().format == "snapshot"
+
+    with open(out, "r+b") as f:
+        f.write(b"JUNK")
+    fresh = KnowledgeStore(str(source), snapshot_path=out).current()
+    assert getattr(fresh, "format", None) != "snapshot"
+    assert retrieval.search(fresh, "wheat")[0].path == "agriculture/wheat/overview"
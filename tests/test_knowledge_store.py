@@ -0,0 +1,85 @@
+import json
+import logging
+import os
+
+import pytest
+
+from knowledge_store import KnowledgeStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _write(path, data, mtime_ns):
+    path.write_text(json.dumps(data))
+    # explicit mtimes: two writes within the filesystem's timestamp granularity must still differ
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / "knowledge.json"
+    _write(path, {"mechanical": {"oil": "15w40"}}, 1_000_000_000)
+    clock = Clock()
+    return KnowledgeStore(str(path), check_interval=2.0, clock=clock), path, clock
+
+
+def test_snapshot_is_frozen_and_shared(store):
+    ks, _, _ = store
+    snap = ks.load()
+    assert ks.current() is snap
+    with pytest.raises(TypeError):
+        snap.data["mechanical"]["oil"] = "changed"
+    with pytest.raises(TypeError):
+        snap.data["new"] = {}
+
+
+def test_reload_only_when_signature_changes(store):
+    ks, path, clock = store
+    first = ks.load()
+    seen = []
+    ks.add_listener(lambda old, new: seen.append((old, new)))
+    clock.now = 10.0
+    assert ks.current() is first  # unchanged file: no reparse
+    _write(path, {"mechanical": {"oil": "5w30"}}, 2_000_000_000)
+    clock.now = 11.0  # within check_interval of the last check
+    assert ks.current() is first
+    clock.now = 13.0
+    second = ks.current()
+    assert second is not first and second.data["mechanical"]["oil"] == "5w30"
+    assert second.sha256 != first.sha256
+    assert seen == [(first, second)]
+    assert ks.stats()["reloads"] == 1
+
+
+def test_failed_reload_keeps_snapshot_and_logs_once(store, caplog):
+    ks, path, clock = store
+    good = ks.load()
+    path.write_text("{ not json")
+    os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+    with caplog.at_level(logging.WARNING, logger="knowledge_store"):
+        for i in range(1, 6):
+            clock.now = 10.0 * i
+            assert ks.current() is good
+    failures = [r for r in caplog.records if "knowledge load failed" in r.getMessage()]
+    assert len(failures) == 1
+    assert ks.stats()["load_errors"] == 1  # the broken file is not re-parsed every interval
+    # once the file changes again it is retried, and a good file goes live
+    _write(path, {"mechanical": {"oil": "0w20"}}, 3_000_000_000)
+    clock.now = 100.0
+    fixed = ks.current()
+    assert fixed is not good and fixed.data["mechanical"]["oil"] == "0w20"
+    assert ks.stats()["last_error"] is None
+
+
+def test_vanished_file_keeps_last_snapshot(store):
+    ks, path, clock = store
+    good = ks.load()
+    path.unlink()
+    clock.now = 10.0
+    assert ks.current() is good
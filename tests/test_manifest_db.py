@@ -0,0 +1,89 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from agent import agent, runtime_init
+from agent.manifest_db import ManifestDB, has_manifest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    tracked = tmp_path / "core.txt"
+    tracked.write_text("original")
+    manifest = tmp_path / "core_manifest.json"
+    manifest.write_text(json.dumps({str(tracked): "0" * 64}))
+    db = tmp_path / "core_manifest.db"
+    monkeypatch.setattr(agent, "MANIFEST_PATH", str(manifest))
+    monkeypatch.setattr(agent, "MANIFEST_DB_PATH", str(db))
+    monkeypatch.setattr(agent, "TREE_PATH", str(tmp_path / "core_manifest.merkle.json"))
+    monkeypatch.setattr(agent, "LOG_PATH", str(tmp_path / "agent.log"))
+    monkeypatch.setattr(agent, "VERIFY_CACHE_PATH", str(tmp_path / "verify_cache.json"))
+    monkeypatch.setattr(runtime_init, "MANIFEST_PATH", str(manifest))
+    monkeypatch.setattr(runtime_init, "MANIFEST_DB_PATH", str(db))
+    monkeypatch.setattr(runtime_init, "LOG_PATH", str(tmp_path / "agent.log"))
+    monkeypatch.setattr(runtime_init, "VERIFY_CACHE_PATH", str(tmp_path / "verify_cache.json"))
+    return manifest, db
+
+
+@pytest.mark.parametrize("action", ["runs", "export"])
+def test_read_commands_do_not_create_the_database(paths, action):
+    manifest, db = paths
+    before = manifest.read_text()
+    with pytest.raises(SystemExit):
+        agent.db_command(action, str(manifest), None, 20)
+    assert not db.exists()
+    assert manifest.read_text() == before
+
+
+def test_readonly_open_of_missing_database_fails(tmp_path):
+    import sqlite3
+
+    with pytest.raises(sqlite3.OperationalError):
+        ManifestDB(str(tmp_path / "missing.db"), readonly=True)
+    assert not (tmp_path / "missing.db").exists()
+
+
+def test_empty_database_falls_back_to_json(paths):
+    manifest, db = paths
+    ManifestDB(str(db)).close()  # schema only, no files rows
+    assert not has_manifest(str(db))
+    assert agent.load_manifest() == json.loads(manifest.read_text())
+    # the stale hash in the JSON is still caught
+    assert runtime_init.verify_manifest()["status"] == "fail"
+
+
+def test_export_of_empty_database_keeps_json(paths):
+    manifest, db = paths
+    ManifestDB(str(db)).close()
+    before = manifest.read_text()
+    with pytest.raises(SystemExit):
+        agent.db_command("export", str(manifest), None, 20)
+    assert manifest.read_text() == before
+
+
+def test_import_then_export_round_trip(paths, tmp_path):
+    manifest, db = paths
+    agent.db_command("import", str(manifest), None, 20)
+    assert has_manifest(str(db))
+    out = tmp_path / "out.json"
+    agent.db_command("export", str(out), None, 20)
+    assert json.loads(out.read_text()) == json.loads(manifest.read_text())
+
+
+def test_protect_updates_existing_database(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "a.txt").write_text("a")
+    out = tmp_path / "core_manifest.json"
+    db = tmp_path / "core_manifest.db"
+    with ManifestDB(str(db)) as stale:
+        stale.replace([("gone.txt", "0" * 64, None, None)])
+    subprocess.run([sys.executable, "-m", "agent.protect", "--paths", str(src), "--out", str(out)],
+                   cwd=ROOT, check=True, capture_output=True)
+    with ManifestDB(str(db), readonly=True) as fresh:
+        assert fresh.manifest() == json.loads(out.read_text())
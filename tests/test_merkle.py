@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from agent import agent, merkle, protect
+
+MANIFEST = {
+    "./agent/agent.py": "a" * 64,
+    "./agent/protect.py": "b" * 64,
+    "./agent/examples/demo.json": "c" * 64,
+    "./main.py": "d" * 64,
+    "./knowledge/knowledge.json": "e" * 64,
+}
+
+
+def test_split_and_join_round_trip():
+    assert merkle.split_path("./agent//x.py") == ["agent", "x.py"]
+    assert merkle.split_path("/abs/path") == ["", "abs", "path"]
+    assert merkle.join_path(merkle.split_path("/abs/path")) == "/abs/path"
+    assert merkle.split_path(".") == []
+
+
+def test_tree_hash_depends_only_on_content():
+    tree = merkle.build_tree(MANIFEST)
+    assert merkle.build_tree(dict(reversed(list(MANIFEST.items()))))["hash"] == tree["hash"]
+    touched = merkle.build_tree(dict(MANIFEST, **{"./agent/examples/demo.json": "f" * 64}))
+    assert touched["hash"] != tree["hash"]
+    assert merkle.find(touched, "knowledge")["hash"] == merkle.find(tree, "knowledge")["hash"]
+    assert merkle.find(touched, "agent")["hash"] != merkle.find(tree, "agent")["hash"]
+
+
+def test_subtree_manifest():
+    tree = merkle.build_tree(MANIFEST)
+    assert merkle.subtree_manifest(tree, "agent/examples") == {"agent/examples/demo.json": "c" * 64}
+    assert sorted(merkle.subtree_manifest(tree, "./agent")) == \
+        ["agent/agent.py", "agent/examples/demo.json", "agent/protect.py"]
+    assert merkle.subtree_manifest(tree, "main.py") == {"main.py": "d" * 64}
+    assert merkle.subtree_manifest(tree, "offline_ui") is None
+
+
+def test_diff_reports_changes_and_skips_equal_subtrees():
+    a = merkle.build_tree(MANIFEST)
+    changed = dict(MANIFEST, **{"./agent/examples/demo.json": "f" * 64, "./agent/new.py": "0" * 64})
+    del changed["./main.py"]
+    stats = {}
+    assert list(merkle.diff(a, merkle.build_tree(changed), stats=stats)) == [
+        ("~", "agent/examples/demo.json"), ("+", "agent/new.py"), ("-", "main.py")]
+    # root, agent, examples, demo.json, agent.py, protect.py, knowledge; not knowledge.json
+    assert stats["visited"] == 7
+    assert list(merkle.diff(a, merkle.build_tree(MANIFEST))) == []
+
+
+def test_diff_file_replaced_by_directory():
+    a = merkle.build_tree({"docs": "1" * 64})
+    b = merkle.build_tree({"docs/readme.md": "2" * 64})
+    assert list(merkle.diff(a, b)) == [("-", "docs"), ("+", "docs/readme.md")]
+
+
+def test_save_and_load(tmp_path):
+    tree = merkle.build_tree(MANIFEST)
+    out = tmp_path / "core_manifest.merkle.json"
+    merkle.save_tree(tree, str(out))
+    assert merkle.load(str(out)) == tree
+    flat = tmp_path / "core_manifest.json"
+    flat.write_text(json.dumps(MANIFEST))
+    assert merkle.load(str(flat))["hash"] == tree["hash"]
+    assert merkle.tree_path(str(flat)) == str(out)
+
+
+@pytest.fixture
+def tracked(tmp_path, monkeypatch):
+    for rel in ("core/a.txt", "core/sub/b.txt", "other/c.txt"):
+        (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel).write_text(rel)
+    manifest_path = tmp_path / "core_manifest.json"
+    protect.save_manifest(protect.build_manifest([str(tmp_path / "core"), str(tmp_path / "other")]),
+                          str(manifest_path))
+    monkeypatch.setattr(agent, "MANIFEST_PATH", str(manifest_path))
+    monkeypatch.setattr(agent, "MANIFEST_DB_PATH", str(tmp_path / "core_manifest.db"))
+    monkeypatch.setattr(agent, "TREE_PATH", merkle.tree_path(str(manifest_path)))
+    monkeypatch.setattr(agent, "LOG_PATH", str(tmp_path / "agent.log"))
+    monkeypatch.setattr(agent, "VERIFY_CACHE_PATH", str(tmp_path / "verify_cache.json"))
+    return tmp_path
+
+
+def test_subtree_verify_checks_only_that_directory(tracked, capsys):
+    (tracked / "other" / "c.txt").write_text("tampered")
+    agent.verify_manifest(subdir=str(tracked / "core"))
+    assert "Manifest entries: 2\nMissing: 0\nMismatched: 0" in capsys.readouterr().out
+    (tracked / "core" / "sub" / "b.txt").write_text("tampered")
+    agent.verify_manifest(subdir=str(tracked / "core" / "sub"))
+    assert "Manifest entries: 1\nMissing: 0\nMismatched: 1" in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        agent.verify_manifest(subdir=str(tracked / "untracked"))
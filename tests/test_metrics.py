@@ -0,0 +1,94 @@
+import pytest
+from flask import Flask, Response
+
+from metrics import Histogram, Metrics
+
+
+def test_histogram_buckets_are_upper_inclusive():
+    hist = Histogram(buckets=(1, 10, 100))
+    for value in (0.5, 1, 1.5, 10, 99, 100, 250):
+        hist.observe(value)
+    assert hist.counts == [2, 2, 2, 1]
+    assert (hist.count, hist.sum, hist.max) == (7, 462.0, 250)
+
+
+def test_quantiles_interpolate_within_buckets():
+    hist = Histogram(buckets=(10, 20))
+    assert hist.quantile(0.5) is None
+    for value in (12, 14, 16, 18):
+        hist.observe(value)
+    assert hist.quantile(0.5) == pytest.approx(15.0)
+    assert hist.quantile(0.99) == pytest.approx(18.0)  # capped at the observed max
+    hist.observe(50)
+    assert hist.quantile(1.0) == 50
+    out = hist.as_dict()
+    assert (out["count"], out["max_ms"], out["avg_ms"]) == (5, 50, 22.0)
+    assert out["p50_ms"] == pytest.approx(16.25)
+
+
+def test_prometheus_text_has_cumulative_buckets_in_seconds():
+    metrics = Metrics()
+    metrics.observe("/api/respond", "POST", 200, 3.0, request_bytes=20, response_bytes=100)
+    metrics.observe("/api/respond", "POST", 200, 40.0)
+    metrics.observe("/api/respond", "POST", 503, 0.2)
+    metrics.observe_stage("retrieval", 0.3)
+    text = metrics.render_prometheus()
+    lines = text.splitlines()
+    assert text.endswith("\n")
+    assert 'cridergpt_requests_total{endpoint="/api/respond",method="POST",status="200"} 2' in lines
+    assert 'cridergpt_requests_total{endpoint="/api/respond",method="POST",status="503"} 1' in lines
+    assert 'cridergpt_request_bytes_total{endpoint="/api/respond",method="POST"} 20' in lines
+    assert 'cridergpt_response_bytes_total{endpoint="/api/respond",method="POST"} 100' in lines
+    prefix = 'cridergpt_request_duration_seconds_bucket{endpoint="/api/respond",method="POST",le='
+    buckets = {line[len(prefix):].split("}")[0].strip('"'): int(line.rsplit(" ", 1)[1])
+               for line in lines if line.startswith(prefix)}
+    assert (buckets["0.00025"], buckets["0.0025"], buckets["0.005"], buckets["0.05"], buckets["+Inf"]) == (1, 1, 2, 3, 3)
+    counts = list(buckets.values())
+    assert counts == sorted(counts)
+    assert 'cridergpt_request_duration_seconds_sum{endpoint="/api/respond",method="POST"} 0.043200' in lines
+    assert 'cridergpt_request_duration_seconds_count{endpoint="/api/respond",method="POST"} 3' in lines
+    assert 'cridergpt_stage_duration_seconds_bucket{stage="retrieval",le="0.0005"} 1' in lines
+    assert "# TYPE cridergpt_request_duration_seconds histogram" in lines
+    assert "cridergpt_requests_in_flight 0" in lines
+
+
+def test_installed_hooks_count_streamed_bodies_when_closed():
+    app = Flask(__name__)
+    metrics = Metrics()
+    metrics.install(app)
+
+    @app.route("/items/<int:n>")
+    def items(n):
+        return Response((f"{i}\n" for i in range(n)), mimetype="text/plain")
+
+    @app.route("/fixed", methods=["POST"])
+    def fixed():
+        with metrics.stage("work"):
+            return "done"
+
+    client = app.test_client()
+    streamed = client.get("/items/3")
+    assert streamed.get_data() == b"0\n1\n2\n"
+    assert metrics.snapshot()["in_flight"] == 1
+    # the WSGI server closes the body once it has been sent
+    streamed.close()
+    client.post("/fixed", data=b"payload").close()
+    client.get("/nowhere").close()
+    snap = metrics.snapshot()
+    assert snap["in_flight"] == 0
+    streamed = snap["endpoints"]["GET /items/<int:n>"]
+    assert (streamed["count"], streamed["response_bytes"], streamed["statuses"]) == (1, 6, {"200": 1})
+    fixed_stats = snap["endpoints"]["POST /fixed"]
+    assert (fixed_stats["request_bytes"], fixed_stats["response_bytes"]) == (7, 4)
+    assert snap["endpoints"]["GET <unmatched>"]["statuses"] == {"404": 1}
+    assert snap["stages"]["work"]["count"] == 1
+
+
+def test_metrics_endpoint_negotiates_prometheus(main_module):
+    client = main_module.app.test_client()
+    client.get("/api/health")
+    assert client.get("/api/metrics").get_json()["endpoints"]["GET /api/health"]["count"] >= 1
+    for response in (client.get("/api/metrics?format=prometheus"),
+                     client.get("/api/metrics", headers={"Accept": "text/plain"})):
+        assert response.mimetype == "text/plain"
+        assert 'cridergpt_requests_total{endpoint="/api/health",method="GET",status="200"}' in response.get_data(as_text=True)
@@ -0,0 +1,137 @@
+import hashlib
+import os
+
+import pytest
+
+from agent import protect
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def tree(tmp_path):
+    files = {
+        "a.txt": b"alpha",
+        "empty.bin": b"",
+        "big.bin": os.urandom(protect.READ_BLOCK * 2 + 123),
+        "pkg/mod.py": b"print('hi')\n",
+        "pkg/__pycache__/mod.cpython-312.pyc": b"\0\0",
+        "pkg/sub/data.json": b"{}",
+    }
+    for rel, data in files.items():
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    return tmp_path, files
+
+
+def test_sha256_of_file_matches_hashlib_on_both_read_paths(tree, monkeypatch):
+    root, files = tree
+    for rel in ("a.txt", "empty.bin", "big.bin"):
+        assert protect.sha256_of_file(str(root / rel)) == _digest(files[rel])
+    monkeypatch.setattr(protect, "MMAP_THRESHOLD", 1)
+    assert protect.sha256_of_file(str(root / "big.bin")) == _digest(files["big.bin"])
+
+
+def test_iter_files_prunes_excludes_and_applies_includes(tree):
+    root, _ = tree
+    rel = lambda found: sorted(os.path.relpath(p, root).replace(os.sep, "/") for p, _ in found)
+    assert rel(protect.iter_files([str(root)])) == ["a.txt", "big.bin", "empty.bin", "pkg/mod.py", "pkg/sub/data.json"]
+    assert rel(protect.iter_files([str(root)], exclude=["sub", "*.bin"])) == \
+        ["a.txt", "pkg/__pycache__/mod.cpython-312.pyc", "pkg/mod.py"]
+    assert rel(protect.iter_files([str(root)], include=["*.py", "*.json"])) == ["pkg/mod.py", "pkg/sub/data.json"]
+    assert rel(protect.iter_files([str(root / "a.txt"), str(root / "nope")])) == ["a.txt"]
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_parallel_hashing_matches_serial_hashes(tree, workers):
+    root, files = tree
+    seen = []
+    manifest, stats = protect.hash_tree([str(root)], workers=workers,
+                                        progress=lambda n, nbytes, s: seen.append((n, nbytes)))
+    expected = {str(root / rel): _digest(data) for rel, data in files.items() if "__pycache__" not in rel}
+    assert manifest == expected
+    assert stats.files == len(expected) and stats.errors == 0
+    assert stats.bytes == sum(len(files[os.path.relpath(p, root)]) for p in expected)
+    assert [n for n, _ in seen] == list(range(1, len(expected) + 1))
+    assert seen[-1][1] == stats.bytes
+
+
+def test_unreadable_files_hash_to_none(tree):
+    root, _ = tree
+    results, stats = protect.hash_files([(str(root / "a.txt"), 5), (str(root / "gone.txt"), 9)], workers=2)
+    assert results == {str(root / "a.txt"): _digest(b"alpha"), str(root / "gone.txt"): None}
+    assert (stats.files, stats.errors, stats.bytes) == (2, 1, 5)
+    assert protect.hash_tree([str(root / "gone.txt")])[0] == {}
+
+
+def _old(path):
+    # well outside the racy window
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+
+
+def test_verify_cache_trusts_unchanged_files_and_rehashes_changed_ones(tmp_path):
+    settled, edited = tmp_path / "settled.txt", tmp_path / "edited.txt"
+    settled.write_bytes(b"one")
+    edited.write_bytes(b"two")
+    _old(settled)
+    _old(edited)
+    manifest = {str(settled): _digest(b"one"), str(edited): _digest(b"two")}
+    cache_path = str(tmp_path / "cache" / "verify_cache.json")
+    first = protect.verify_hashes(manifest, cache=protect.VerifyCache(cache_path))
+    assert (first["cached"], first["hashed"], first["mismatched"]) == (0, 2, [])
+
+    edited.write_bytes(b"TWO")
+    second = protect.verify_hashes(manifest, cache=protect.VerifyCache(cache_path))
+    assert (second["cached"], second["hashed"], second["mismatched"]) == (1, 1, [str(edited)])
+    full = protect.verify_hashes(manifest, cache=protect.VerifyCache(cache_path), full=True)
+    assert (full["cached"], full["hashed"]) == (0, 2)
+
+
+def test_recently_modified_files_are_not_persisted(tmp_path):
+    fresh, settled = tmp_path / "fresh.txt", tmp_path / "settled.txt"
+    fresh.write_bytes(b"just written")
+    settled.write_bytes(b"old")
+    _old(settled)
+    cache_path = str(tmp_path / "verify_cache.json")
+    manifest = {str(fresh): _digest(b"just written"), str(settled): _digest(b"old")}
+    cache = protect.VerifyCache(cache_path)
+    protect.verify_hashes(manifest, cache=cache)
+    # kept in memory, but a same-tick edit could hide behind the mtime once on disk
+    assert cache.lookup(str(fresh), protect.stat_signature(os.stat(fresh))) is not None
+    reloaded = protect.VerifyCache(cache_path)
+    assert set(reloaded.entries) == {str(settled)}
+    assert protect.verify_hashes(manifest, cache=reloaded)["hashed"] == 1
+
+
+def test_same_size_edit_with_restored_mtime_is_caught_by_ctime(tmp_path):
+    path = tmp_path / "core.txt"
+    path.write_bytes(b"aaaa")
+    _old(path)
+    manifest = {str(path): _digest(b"aaaa")}
+    cache_path = str(tmp_path / "verify_cache.json")
+    protect.verify_hashes(manifest, cache=protect.VerifyCache(cache_path))
+    cached_sig = protect.VerifyCache(cache_path).entries[str(path)][0]
+    path.write_bytes(b"bbbb")
+    _old(path)
+    if protect.stat_signature(os.stat(path)) == cached_sig:
+        pytest.skip("filesystem ctime did not advance")
+    assert protect.verify_hashes(manifest, cache=protect.VerifyCache(cache_path))["mismatched"] == [str(path)]
+
+
+def test_missing_files_are_dropped_and_bad_cache_files_ignored(tmp_path):
+    path = tmp_path / "core.txt"
+    path.write_bytes(b"x")
+    _old(path)
+    cache_path = tmp_path / "verify_cache.json"
+    manifest = {str(path): _digest(b"x")}
+    protect.verify_hashes(manifest, cache=protect.VerifyCache(str(cache_path)))
+    path.unlink()
+    result = protect.verify_hashes(manifest, cache=protect.VerifyCache(str(cache_path)))
+    assert result["missing"] == [str(path)]
+    assert protect.VerifyCache(str(cache_path)).entries == {}
+    for junk in ("not json", '{"version": 999, "entries": {"a": [1, 2, 3, 4, "d"]}}', '{"version": 1, "entries": {"a": 5}}'):
+        cache_path.write_text(junk)
+        assert protect.VerifyCache(str(cache_path)).entries == {}
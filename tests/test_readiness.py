@@ -0,0 +1,66 @@
+import threading
+import time
+
+from readiness import Readiness
+
+
+def test_failed_step_is_done_but_not_ready():
+    r = Readiness()
+
+    def boom():
+        raise ValueError("bad manifest")
+
+    r.start([("knowledge", lambda: {"facts": 3}), ("integrity", boom)], background=False)
+    state = r.snapshot()
+    assert state["done"] and not state["ready"]
+    assert r.failed == ["integrity"]
+    assert state["steps"]["knowledge"]["facts"] == 3
+    assert state["steps"]["integrity"]["error"] == "ValueError: bad manifest"
+
+
+def test_wait_for_returns_when_its_step_finishes():
+    r = Readiness()
+    release = threading.Event()
+    r.start([("static", lambda: None), ("integrity", lambda: release.wait(5))])
+    try:
+        t0 = time.perf_counter()
+        assert r.wait_for("static", 5)
+        assert time.perf_counter() - t0 < 2
+        assert not r.done
+        assert not r.wait_for("integrity", 0.05)
+    finally:
+        release.set()
+    assert r.wait_for("integrity", 5) and r.wait(5)
+    # a step that is not part of this run does not block once startup is over
+    assert r.wait_for("never", 0)
+
+
+def test_failed_integrity_check_fails_readiness(main_module, monkeypatch):
+    from agent import runtime_init
+
+    monkeypatch.setattr(runtime_init, "verify_manifest", lambda: {
+        "status": "fail", "checked": 4, "missing": ["a.py"], "mismatched": ["b.py", "c.py"]})
+    r = Readiness()
+    r.start([("integrity", main_module._verify_integrity)], background=False)
+    assert r.failed == ["integrity"]
+    assert "1 missing and 2 modified of 4" in r.snapshot()["steps"]["integrity"]["error"]
+
+    monkeypatch.setattr(main_module, "READINESS", r)
+    response = main_module.app.test_client().get("/api/ready")
+    assert response.status_code == 503
+    assert response.get_json()["done"] is True
+
+
+def test_static_requests_wait_only_for_the_assets(main_module, monkeypatch):
+    r = Readiness()
+    release = threading.Event()
+    r.start([("static", lambda: None), ("integrity", lambda: release.wait(5))])
+    monkeypatch.setattr(main_module, "READINESS", r)
+    monkeypatch.setattr(main_module, "STATIC_WAIT", 5.0)
+    try:
+        t0 = time.perf_counter()
+        main_module.app.test_client().get("/no-such-asset.js")
+        assert time.perf_counter() - t0 < 2
+        assert not r.done
+    finally:
+        release.set()
@@ -0,0 +1,32 @@
+from response_cache import ResponseCache, normalize_prompt
+
+
+def test_key_folds_case_whitespace_and_punctuation():
+    assert normalize_prompt("  Tell me about the 7.3L   Powerstroke?! ") == "tell me about the 7.3l powerstroke"
+    assert ResponseCache.key("FS22 modding", "sha") == ResponseCache.key("fs22, modding!", "sha")
+    assert ResponseCache.key("fs22 modding", "sha-a") != ResponseCache.key("fs22 modding", "sha-b")
+
+
+def test_invalidate_drops_only_that_knowledge():
+    cache = ResponseCache(8)
+    cache.put(cache.key("a", "old"), 1)
+    cache.put(cache.key("b", "old"), 2)
+    cache.put(cache.key("a", "new"), 3)
+    assert cache.invalidate("old") == 2
+    assert cache.get(cache.key("a", "old")) is None
+    assert cache.get(cache.key("a", "new")) == 3
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_lru_and_ttl():
+    now = [0.0]
+    cache = ResponseCache(2, ttl=10, clock=lambda: now[0])
+    cache.put(cache.key("a", "k"), 1)
+    cache.put(cache.key("b", "k"), 2)
+    cache.get(cache.key("a", "k"))
+    cache.put(cache.key("c", "k"), 3)  # evicts b, the least recently used
+    assert cache.get(cache.key("b", "k")) is None
+    now[0] = 11.0
+    assert cache.get(cache.key("a", "k")) is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["expirations"] == 1
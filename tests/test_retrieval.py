@@ -0,0 +1,79 @@
+import math
+
+import pytest
+
+import retrieval
+from knowledge_store import KnowledgeSnapshot
+from retrieval import Bm25Index, flatten_facts, tokenize
+
+BRAIN = {
+    "personality": {"tone": "friendly tractor talk"},
+    "agriculture": {
+        "corn": {"overview": "Corn is planted in spring after the soil warms."},
+        "soybeans": {"overview": "Soybeans fix nitrogen and follow corn in rotation."},
+        "wheat": {"overview": "Winter wheat is planted in the fall."},
+    },
+    "mechanical": {
+        "7.3L_Powerstroke": {"common_issues": ["Injector o-rings leak", "CPS failures stall the engine"]},
+        "torque_specs": {"head_bolts": 65, "enabled": True},
+    },
+}
+
+
+def _index(brain=BRAIN):
+    return Bm25Index(flatten_facts(brain))
+
+
+def test_tokenize_drops_stopwords_folds_plurals_and_keeps_dotted_numbers():
+    assert tokenize("Tell me about the 7.3L injectors") == ["7.3l", "injector"]
+    assert tokenize("Grass, glass and bus") == ["grass", "glass", "bus"]
+    assert tokenize("") == []
+
+
+def test_flatten_skips_meta_sections_and_non_text_leaves():
+    facts = flatten_facts(BRAIN)
+    assert "personality" not in facts.sections
+    assert facts.paths[facts.texts.index("65")] == "mechanical/torque_specs/head_bolts"
+    assert "True" not in facts.texts
+    assert facts.section(facts.texts.index("Injector o-rings leak")) == "mechanical"
+    assert len(facts) == 6
+
+
+def test_idf_favours_rare_terms():
+    index = _index()
+    n = len(index)
+    idf, docs, tfs = index.lookup("corn")
+    assert list(docs) == [0, 1] and list(tfs) == [2, 1]
+    assert idf == pytest.approx(math.log(1.0 + (n - 2 + 0.5) / 2.5))
+    assert index.lookup("wheat")[0] > idf
+    assert index.lookup("combine") is None
+
+
+def test_search_ranks_the_matching_fact_first():
+    index = _index()
+    top = index.search("when is winter wheat planted", k=2)
+    assert top[0].path == "agriculture/wheat/overview"
+    assert top[0].score > top[1].score
+    assert [h.path for h in index.search("powerstroke injector o-ring")][:1] == ["mechanical/7.3L_Powerstroke/common_issues/0"]
+    # path keys are indexed alongside the text
+    assert index.search("head bolts")[0].text == "65"
+
+
+def test_search_breaks_ties_by_fact_order_and_honours_k():
+    index = _index({"a": {"x": "tractor", "y": "tractor", "z": "tractor"}})
+    assert [h.fact_id for h in index.search("tractor", k=2)] == [0, 1]
+
+
+def test_empty_knowledge_base_and_unmatched_queries_return_nothing():
+    empty = _index({})
+    assert len(empty) == 0 and empty.avgdl == 0.0
+    assert empty.search("corn") == []
+    assert _index().search("the and of") == []
+    assert _index().search("combine harvester") == []
+
+
+def test_index_is_built_once_per_snapshot():
+    snap = KnowledgeSnapshot.from_data(BRAIN, source="test")
+    assert retrieval.index_for(snap) is retrieval.index_for(snap)
+    assert [hits[0].section for hits in retrieval.search_batch(snap, ["soybean nitrogen", "cps stall"])] == \
+        ["agriculture", "mechanical"]
@@ -0,0 +1,105 @@
+import http.client
+import socket
+import threading
+import time
+
+import pytest
+
+from server import PooledWSGIServer
+
+
+def _app(release=None):
+    def app(environ, start_response):
+        if environ["PATH_INFO"] == "/slow":
+            release.wait(5)
+        start_response("200 OK", [("Content-Type", "text/plain"), ("Content-Length", "2")])
+        return [b"ok"]
+    return app
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(app, **kwargs):
+        server = PooledWSGIServer("127.0.0.1", 0, app, **kwargs)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        if not server.draining:
+            server.shutdown()
+            server.server_close()
+            server.drain(1)
+
+
+def _stop(server, timeout=5.0):
+    # what the SIGTERM handler in _serve_one does
+    server.draining = True
+    server.shutdown()
+    server.server_close()
+    return server.drain(timeout)
+
+
+def test_idle_keepalive_connection_does_not_block_drain(serve):
+    server = serve(_app())
+    conn = http.client.HTTPConnection("127.0.0.1", server.port)
+    conn.request("GET", "/health")
+    assert conn.getresponse().read() == b"ok"
+    # the connection stays open, waiting for a next request
+    t0 = time.monotonic()
+    assert _stop(server)
+    assert time.monotonic() - t0 < 1.0
+    assert server.inflight == 0
+    conn.close()
+
+
+def test_unused_connection_does_not_block_drain(serve):
+    server = serve(_app())
+    sock = socket.create_connection(("127.0.0.1", server.port))
+    time.sleep(0.1)
+    t0 = time.monotonic()
+    assert _stop(server)
+    assert time.monotonic() - t0 < 1.0
+    sock.close()
+
+
+def test_inflight_request_finishes_during_drain(serve):
+    release = threading.Event()
+    server = serve(_app(release))
+    result = {}
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", server.port)
+        conn.request("GET", "/slow")
+        resp = conn.getresponse()
+        result["status"], result["body"] = resp.status, resp.read()
+        result["connection"] = resp.getheader("Connection")
+
+    t = threading.Thread(target=client)
+    t.start()
+    while server.inflight == 0:
+        time.sleep(0.01)
+    threading.Timer(0.2, release.set).start()
+    assert _stop(server)
+    t.join(5)
+    assert result == {"status": 200, "body": b"ok", "connection": "close"}
+
+
+def test_backlog_is_bounded(serve):
+    release = threading.Event()
+    server = serve(_app(release), threads=1, backlog=0)
+    busy = http.client.HTTPConnection("127.0.0.1", server.port)
+    busy.request("GET", "/slow")
+    while server.inflight == 0:
+        time.sleep(0.01)
+    shed = http.client.HTTPConnection("127.0.0.1", server.port)
+    shed.request("GET", "/health")
+    resp = shed.getresponse()
+    assert resp.status == 503 and resp.getheader("Retry-After") == "1"
+    assert server.rejected == 1
+    release.set()
+    assert busy.getresponse().status == 200
@@ -0,0 +1,222 @@
+import os
+
+import pytest
+
+import sessions
+from sessions import SessionStore, SpillLog
+
+
+@pytest.fixture
+def small_compaction(monkeypatch):
+    monkeypatch.setattr(sessions, "COMPACT_MIN_BYTES", 256)
+
+
+def _write(log, session_id, text):
+    log.write(session_id, 0.0, [["user", text]])
+
+
+def test_spill_round_trip_and_tombstone(tmp_path):
+    log = SpillLog(str(tmp_path / "s.log"))
+    _write(log, "aaaaaaaa", "hello")
+    assert log.read("aaaaaaaa")["turns"] == [["user", "hello"]]
+    assert log.delete("aaaaaaaa")
+    assert log.read("aaaaaaaa") is None
+    # a fresh index built from the file agrees
+    assert SpillLog(str(tmp_path / "s.log")).read("aaaaaaaa") is None
+
+
+def test_other_process_compaction_is_picked_up(tmp_path, small_compaction):
+    path = str(tmp_path / "s.log")
+    a, b = SpillLog(path), SpillLog(path)
+    _write(a, "keepkeep", "kept")
+    for i in range(50):
+        _write(a, "churnchurn", "x" * 100 + str(i))
+    assert a.compactions
+    # b's offsets predate the rewrite; it must re-index, not read garbage
+    assert b.read("keepkeep")["turns"] == [["user", "kept"]]
+    assert b.read("churnchurn")["turns"][0][1].endswith("49")
+    _write(b, "fromb000", "b")
+    assert a.read("fromb000")["turns"] == [["user", "b"]]
+
+
+def test_damaged_record_reads_as_missing(tmp_path):
+    path = str(tmp_path / "s.log")
+    log = SpillLog(path)
+    _write(log, "aaaaaaaa", "hello")
+    offset, n = log.index["aaaaaaaa"]
+    with open(path, "r+b") as f:
+        f.seek(offset + n - 2)
+        f.write(b"\0\0")
+    assert log.read("aaaaaaaa") is None
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    path = str(tmp_path / "s.log")
+    _write(SpillLog(path), "aaaaaaaa", "hello")
+    size = os.path.getsize(path)
+    with open(path, "ab") as f:
+        f.write(b"\xff\x00\x00\x00partial")
+    log = SpillLog(path)
+    assert os.path.getsize(path) == size
+    assert log.read("aaaaaaaa")["turns"] == [["user", "hello"]]
+
+
+def test_eviction_spills_and_restores(tmp_path):
+    store = SessionStore(capacity=1, spill_path=str(tmp_path / "s.log"))
+    store.append("first000", "user", "tell me about the 7.3 powerstroke")
+    store.append("second00", "user", "hi")
+    assert store.stats()["spilled"] == 1
+    assert store.history("first000") == [("user", "tell me about the 7.3 powerstroke")]
+    assert store.stats()["restored"] == 1
+
+
+def test_workers_share_spilled_sessions(tmp_path):
+    path = str(tmp_path / "s.log")
+    one, two = SessionStore(spill_path=path), SessionStore(spill_path=path)
+    one.append("shared00", "user", "hello")
+    assert one.flush() == 1
+    assert two.get("shared00")["turns"] == [{"role": "user", "text": "hello"}]
+    assert two.delete("shared00")
+    assert SessionStore(spill_path=path).get("shared00") is None
+
+
+def test_shared_stores_see_every_turn(tmp_path):
+    path = str(tmp_path / "s.log")
+    one = SessionStore(spill_path=path, max_turns=3, shared=True)
+    two = SessionStore(spill_path=path, max_turns=3, shared=True)
+    one.append("shared00", "user", "what engine is in the 4020")
+    two.append("shared00", "assistant", "a six cylinder diesel")
+    one.append("shared00", "user", "how much oil")
+    two.append("shared00", "assistant", "about 12 quarts")
+    # nothing is cached in memory: each store reads the latest record
+    assert one.history("shared00") == two.history("shared00") == [
+        ("assistant", "a six cylinder diesel"), ("user", "how much oil"), ("assistant", "about 12 quarts")]
+    assert one.stats()["size"] == 0 and one.stats()["shared"] is True
+    created = two.create()
+    assert one.get(created)["turns"] == []
+    assert one.delete("shared00")
+    assert two.get("shared00") is None and two.history("shared00") == []
+
+
+def test_shared_appends_from_concurrent_writers_are_not_lost(tmp_path):
+    import threading
+
+    path = str(tmp_path / "s.log")
+    stores = [SessionStore(spill_path=path, max_turns=100, max_bytes=1 << 20, shared=True) for _ in range(2)]
+
+    def talk(store, name):
+        for i in range(20):
+            store.append("together", "user", f"{name}{i}")
+
+    threads = [threading.Thread(target=talk, args=(store, name)) for store, name in zip(stores, "ab")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    texts = [text for _, text in stores[0].history("together")]
+    assert sorted(texts) == sorted(f"{n}{i}" for n in "ab" for i in range(20))
+    assert [t for t in texts if t.startswith("a")] == [f"a{i}" for i in range(20)]
+
+
+def test_shared_sessions_expire_when_idle(tmp_path):
+    now = [0.0]
+    store = SessionStore(idle_ttl=10, spill_path=str(tmp_path / "s.log"), clock=lambda: now[0], shared=True)
+    store.append("idle0000", "user", "hello")
+    now[0] = 60.0
+    assert store.get("idle0000") is None
+    store.append("idle0000", "user", "again")
+    assert store.history("idle0000") == [("user", "again")]
+
+
+def test_share_moves_sessions_to_the_spill_log(tmp_path):
+    path = str(tmp_path / "s.log")
+    store = SessionStore(spill_path=path)
+    store.append("before00", "user", "hello")
+    store.share()
+    assert store.stats()["size"] == 0
+    assert SessionStore(spill_path=path, shared=True).history("before00") == [("user", "hello")]
+    with pytest.raises(ValueError):
+        SessionStore().share()
+
+
+def test_sessions_unavailable_is_a_clear_error(main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "SESSIONS_UNAVAILABLE", "sessions need a spill log")
+    client = main_module.app.test_client()
+    response = client.post("/api/respond", json={"prompt": "hi", "session_id": "abcdefgh"})
+    assert response.status_code == 501
+    assert response.get_json() == {"error": "sessions need a spill log"}
+    assert client.post("/api/session").status_code == 501
+    assert client.get("/api/session/abcdefgh").status_code == 501
+    assert client.post("/api/respond", json={"prompt": "hi"}).status_code == 200
+
+
+def test_session_bytes_are_bounded():
+    store = SessionStore(max_turns=100, max_bytes=500)
+    for _ in range(50):
+        store.append("bounded0", "user", "word " * 20)
+    stats = store.stats()
+    assert stats["bytes"] <= 500
+    assert len(store.history("bounded0")) == 5
+
+
+def test_idle_sessions_expire(tmp_path):
+    now = [0.0]
+    store = SessionStore(idle_ttl=10, spill_path=str(tmp_path / "s.log"), clock=lambda: now[0])
+    store.append("idle0000", "user", "hello")
+    now[0] = 60.0
+    stats = store.stats()
+    assert stats["size"] == 0 and stats["expirations"] == 1 and stats["spilled"] == 1
+    assert store.history("idle0000") == [("user", "hello")]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="pre-forked workers need fork")
+def test_serve_workers_share_sessions_and_exit_on_sigterm(tmp_path):
+    import http.client
+    import json
+    import signal
+    import socket
+    import subprocess
+    import sys
+    import time
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    spill = str(tmp_path / "sessions.log")
+    env = dict(os.environ, CRIDERGPT_SESSION_SPILL=spill, CRIDERGPT_STARTUP_VERIFY="0",
+               CRIDERGPT_EVENT_LOG=str(tmp_path / "backend.log"))
+    proc = subprocess.Popen([sys.executable, "main.py", "--serve", "--workers", "2", "--port", str(port)],
+                            cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 20
+        while True:
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+                conn.request("POST", "/api/respond", json.dumps({"prompt": "hello", "session_id": "flushme01"}),
+                             {"Content-Type": "application/json"})
+                assert conn.getresponse().status == 200
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+        # later turns may land on either worker; each sees the whole conversation
+        for prompt in ("what are its common issues", "thanks"):
+            fresh = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            fresh.request("POST", "/api/respond", json.dumps({"prompt": prompt, "session_id": "flushme01"}),
+                          {"Content-Type": "application/json", "Connection": "close"})
+            assert fresh.getresponse().status == 200
+            fresh.close()
+        check = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        check.request("GET", "/api/session/flushme01", headers={"Connection": "close"})
+        assert len(json.loads(check.getresponse().read())["turns"]) == 6
+        check.close()
+        # the keep-alive connection stays open: shutdown must not wait for it
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(10) == 0
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+    turns = SpillLog(spill).read("flushme01")["turns"]
+    assert [role for role, _ in turns] == ["user", "assistant"] * 3
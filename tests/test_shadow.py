@@ -0,0 +1,68 @@
+import os
+import zlib
+
+import pytest
+
+from agent import protect, shadow
+from agent.shadow import ShadowStore
+
+
+@pytest.fixture
+def files(tmp_path):
+    out = {}
+    for rel, data in {"core/a.txt": b"alpha\n" * 100, "core/b.bin": os.urandom(3000), "core/same.txt": b"alpha\n" * 100}.items():
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        out[str(path)] = data
+    return out
+
+
+@pytest.mark.parametrize("codec", sorted(shadow.CODECS))
+def test_snapshot_restore_round_trip(tmp_path, files, codec):
+    store = ShadowStore(str(tmp_path / "shadow"))
+    os.chmod(next(iter(files)), 0o640)
+    stats = store.snapshot(list(files), codec=codec, note="before")
+    # identical contents share one object
+    assert (stats["files"], stats["stored"], stats["unreadable"]) == (3, 2, [])
+    record = store.load_snapshot()
+    assert record["id"] == stats["id"] and record["created"].endswith("Z") and record["note"] == "before"
+    for path in files:
+        os.remove(path)
+    for path, entry in record["files"].items():
+        store.restore_file(entry["sha256"], path, entry["mode"])
+    for path, data in files.items():
+        with open(path, "rb") as f:
+            assert f.read() == data
+    assert os.stat(next(iter(files))).st_mode & 0o777 == 0o640
+
+
+def test_known_content_is_not_compressed_again(tmp_path, files, monkeypatch):
+    store = ShadowStore(str(tmp_path / "shadow"))
+    path = next(iter(files))
+    digest, size, created = store.put_file(path)
+    assert (digest, size, created) == (protect.sha256_of_file(path), len(files[path]), True)
+
+    def no_compress(codec):
+        raise AssertionError("compressed a file the store already holds")
+
+    monkeypatch.setattr(shadow, "_compressor", no_compress)
+    assert store.put_file(path) == (digest, size, False)
+    same = [p for p in files if p.endswith("same.txt")][0]
+    assert store.put_file(same) == (digest, size, False)
+
+
+def test_corrupt_object_is_not_restored(tmp_path, files):
+    store = ShadowStore(str(tmp_path / "shadow"))
+    path = next(iter(files))
+    digest, _, _ = store.put_file(path)
+    obj = store.find_object(digest)
+    with open(obj, "wb") as f:
+        f.write(zlib.compress(b"forged"))
+    target = tmp_path / "restored.txt"
+    target.write_bytes(b"keep me")
+    with pytest.raises(ValueError, match="corrupt"):
+        store.restore_file(digest, str(target))
+    assert target.read_bytes() == b"keep me"
+    with pytest.raises(FileNotFoundError):
+        store.restore_file("0" * 64, str(target))
@@ -0,0 +1,89 @@
+import gzip
+import os
+
+import pytest
+
+from static_assets import IMMUTABLE, REVALIDATE, AssetTable, parse_accept_encoding, precompress_dir
+
+BUNDLE = b"export const greeting = 'howdy';\n" * 64
+
+
+@pytest.fixture
+def dist(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "index.html").write_bytes(b"<!doctype html><title>CriderGPT</title>" + b"<p>field</p>" * 40)
+    (tmp_path / "assets" / "index-BM_XTRWi.js").write_bytes(BUNDLE)
+    (tmp_path / "assets" / "logo.png").write_bytes(os.urandom(600))
+    (tmp_path / "tiny.css").write_bytes(b"body{margin:0}")
+    return tmp_path
+
+
+def test_accept_encoding_parsing():
+    assert parse_accept_encoding("gzip, br;q=0.5, identity;q=bogus") == {"gzip": 1.0, "br": 0.5, "identity": 0.0}
+
+
+def test_content_negotiation_picks_the_best_available_variant(dist):
+    table = AssetTable(str(dist))
+    status, body, headers = table.lookup("assets/index-BM_XTRWi.js", "gzip, deflate")
+    assert status == 200 and headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(body) == BUNDLE
+    assert headers["Vary"] == "Accept-Encoding"
+    assert headers["Content-Type"].endswith("; charset=utf-8")
+    for refused in ("", "identity", "gzip;q=0"):
+        status, body, headers = table.lookup("assets/index-BM_XTRWi.js", refused)
+        assert body == BUNDLE and "Content-Encoding" not in headers
+    assert table.lookup("missing.js") is None
+
+
+def test_brotli_is_preferred_when_precompressed(dist):
+    (dist / "index.html.br").write_bytes(b"brotli body")
+    table = AssetTable(str(dist))
+    _, body, headers = table.lookup("index.html", "gzip, br")
+    assert (body, headers["Content-Encoding"]) == (b"brotli body", "br")
+    _, body, headers = table.lookup("index.html", "gzip")
+    assert headers["Content-Encoding"] == "gzip"
+
+
+def test_only_content_hashed_assets_are_immutable(dist):
+    table = AssetTable(str(dist))
+    assert table.lookup("assets/index-BM_XTRWi.js")[2]["Cache-Control"] == IMMUTABLE
+    assert table.lookup("assets/logo.png")[2]["Cache-Control"] == REVALIDATE
+    assert table.lookup("index.html")[2]["Cache-Control"] == REVALIDATE
+
+
+def test_etag_per_variant_and_304(dist):
+    table = AssetTable(str(dist))
+    _, _, plain = table.lookup("index.html")
+    _, _, packed = table.lookup("index.html", "gzip")
+    assert plain["ETag"] != packed["ETag"] and packed["ETag"].endswith('-gzip"')
+    assert table.lookup("index.html", "gzip", packed["ETag"])[:2] == (304, None)
+    assert table.lookup("index.html", "gzip", "W/" + packed["ETag"])[0] == 304
+    assert table.lookup("index.html", "gzip", '"other", *')[0] == 200
+    assert table.lookup("index.html", "", "*")[0] == 304
+    # a gzip ETag does not validate the identity body
+    assert table.lookup("index.html", "", packed["ETag"])[0] == 200
+
+
+def test_precompress_skips_small_files_and_variants_that_do_not_shrink(dist):
+    (dist / "noise.js").write_bytes(os.urandom(4096))
+    (dist / "noise.js.gz").write_bytes(b"stale")
+    os.utime(dist / "noise.js.gz", ns=(1, 1))
+    written = {(os.path.relpath(src, dist), enc) for src, enc, raw, packed in precompress_dir(str(dist))}
+    assert ("index.html", "gzip") in written
+    assert ("noise.js", "gzip") not in written
+    assert not (dist / "noise.js.gz").exists()
+    assert not (dist / "tiny.css.gz").exists()
+    assert not (dist / "assets" / "logo.png.gz").exists()
+    # up to date variants are left alone unless forced
+    assert precompress_dir(str(dist)) == []
+    assert ("index.html", "gzip") in {(os.path.relpath(s, dist), e) for s, e, _, _ in precompress_dir(str(dist), True)}
+
+
+def test_variant_older_than_its_source_is_ignored(dist):
+    precompress_dir(str(dist))
+    gz = dist / "index.html.gz"
+    gz.write_bytes(gzip.compress(b"old build"))
+    source = dist / "index.html"
+    os.utime(gz, ns=(1, 1))
+    body = AssetTable(str(dist)).lookup("index.html", "gzip")[1]
+    assert gzip.decompress(body) == source.read_bytes()
@@ -0,0 +1,82 @@
+import json
+
+import responder
+
+PROMPT = "tell me about the 7.3 powerstroke"
+
+
+def _events(response):
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    assert response.headers["Cache-Control"] == "no-cache"
+    events = []
+    for block in response.get_data(as_text=True).split("\n\n"):
+        if block:
+            event, data = block.split("\n")
+            events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    # as the WSGI server does once the body is sent
+    response.close()
+    return events
+
+
+def _untimed(events):
+    return [(name, {k: v for k, v in data.items() if not k.endswith("_ms")}) for name, data in events]
+
+
+def test_tokens_then_done_spell_out_the_reply(main_module):
+    client = main_module.app.test_client()
+    events = _events(client.post("/api/respond/stream", json={"prompt": PROMPT}))
+    names = [name for name, _ in events]
+    assert names == ["token"] * (len(events) - 1) + ["done"]
+    text = "".join(data["text"] for _, data in events[:-1])
+    assert text == client.post("/api/respond", json={"prompt": PROMPT}).get_json()["response"]
+    done = events[-1][1]
+    assert done["tokens"] == len(events) - 1
+    assert done["ttfb_ms"] <= done["total_ms"]
+
+
+def test_get_query_parameters_match_post(main_module):
+    client = main_module.app.test_client()
+    brain_id = client.put("/api/brain", json={"mechanical": {"tractor": "The 4020 has a 6 cylinder engine."}}
+                          ).get_json()["brain_id"]
+    body = {"prompt": "4020 engine", "brain_id": brain_id, "strategy": "bm25"}
+    posted = _events(client.post("/api/respond/stream", json=body))
+    fetched = _events(client.get("/api/respond/stream", query_string=body))
+    assert _untimed(fetched) == _untimed(posted)
+    assert fetched[-1][1]["brain_id"] == brain_id
+    assert client.get("/api/respond/stream", query_string={"prompt": "x", "strategy": "nope"}).status_code == 400
+
+
+def test_failure_mid_stream_ends_with_an_error_event(main_module, monkeypatch):
+    def broken(prompt, snapshot, **kwargs):
+        yield "partial reply"
+        raise RuntimeError("retrieval exploded")
+
+    monkeypatch.setattr(responder, "iter_reply", broken)
+    before = main_module.STREAM_STATS.snapshot()["failed"]
+    events = _events(main_module.app.test_client().post("/api/respond/stream", json={"prompt": PROMPT}))
+    assert events == [("token", {"text": "partial"}), ("token", {"text": " reply"}),
+                      ("error", {"error": "retrieval exploded"})]
+    assert main_module.STREAM_STATS.snapshot()["failed"] == before + 1
+
+
+def test_streams_over_the_cap_are_shed_with_503(main_module, monkeypatch):
+    import streaming
+
+    slots = streaming.StreamLimiter(1)
+    monkeypatch.setattr(main_module, "STREAM_SLOTS", slots)
+    client = main_module.app.test_client()
+    held = client.post("/api/respond/stream", json={"prompt": PROMPT}, buffered=False)
+    assert slots.snapshot()["active"] == 1
+    busy = client.post("/api/respond/stream", json={"prompt": PROMPT})
+    assert busy.status_code == 503
+    assert busy.headers["Retry-After"] == "1" and busy.get_json()["error"] == "busy"
+    # closing the first stream, even unread, frees its slot
+    held.close()
+    assert slots.snapshot() == {"limit": 1, "active": 0, "rejected": 1}
+    assert _events(client.post("/api/respond/stream", json={"prompt": PROMPT}))[-1][0] == "done"
+    assert slots.snapshot()["active"] == 0
+    # a request that fails before streaming does not keep its slot
+    assert client.post("/api/respond/stream", json={"prompt": "x", "brain_id": "0" * 64}).status_code == 404
+    assert slots.snapshot()["active"] == 0
+    assert main_module.app.test_client().get("/api/respond/stream/stats").get_json()["slots"]["rejected"] == 1
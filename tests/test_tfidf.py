@@ -0,0 +1,66 @@
+import pytest
+
+import retrieval
+
+np = pytest.importorskip("numpy")
+import tfidf  # noqa: E402
+
+
+def _table(facts):
+    table = retrieval.FactTable()
+    for path, text in facts:
+        table.add(path.split("/", 1)[0], path, text)
+    return table
+
+
+def _dense_scores(matrix, query):
+    # reference: the textbook dense cosine similarity
+    vocab = matrix.vocab
+    docs = np.zeros((len(matrix.facts), len(vocab)))
+    for row, (p, t) in enumerate(zip(matrix.facts.paths, matrix.facts.texts)):
+        for term in retrieval.fact_terms(p, t):
+            docs[row, vocab[term]] += 1
+    q = np.zeros(len(vocab))
+    for term in retrieval.tokenize(query):
+        if term in vocab:
+            q[vocab[term]] += 1
+    docs *= matrix.idf
+    q *= matrix.idf
+    docs /= np.maximum(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12)
+    q /= max(np.linalg.norm(q), 1e-12)
+    return docs @ q
+
+
+def test_ranking_matches_dense_cosine():
+    facts = _table([
+        ("mechanical/7.3L_Powerstroke/issues", "injector leaks and turbocharger wear"),
+        ("mechanical/7.3L_Powerstroke/oil", "15w40 diesel oil every 5000 miles"),
+        ("welding/flux_welding/tips", "keep the flux core wire dry"),
+        ("fs22/FS22_modding/scripts", "lua scripts live in the mod folder"),
+    ])
+    matrix = tfidf.TfidfMatrix(facts)
+    for query in ("powerstroke injector leaks", "flux core wire", "lua mod scripts", "nothing matches"):
+        expected = _dense_scores(matrix, query)
+        hits = matrix.search(query, k=4)
+        assert [h.fact_id for h in hits] == [int(i) for i in np.argsort(-expected, kind="stable")
+                                              if expected[i] > 0][:4]
+        for h in hits:
+            assert h.score == pytest.approx(expected[h.fact_id], rel=1e-5)
+
+
+def test_memory_grows_with_postings_not_vocabulary():
+    n = 5000
+    # every fact has its own terms: a dense facts x vocabulary matrix would be n * 2n floats
+    facts = _table([(f"s/e{i}/f", f"alpha{i} beta{i} shared") for i in range(n)])
+    matrix = tfidf.TfidfMatrix(facts)
+    assert len(matrix.vocab) > 2 * n
+    assert matrix.nbytes < n * len(matrix.vocab) * 4 // 100
+    assert [h.fact_id for h in matrix.search(f"alpha{n - 1}")] == [n - 1]
+
+
+def test_batches_span_score_blocks(monkeypatch):
+    facts = _table([(f"s/e{i}/f", f"term{i}") for i in range(100)])
+    matrix = tfidf.TfidfMatrix(facts)
+    monkeypatch.setattr(tfidf, "SCORE_BLOCK_BYTES", 4 * 100 * 3)  # three prompts per block
+    queries = [f"term{i}" for i in range(10)]
+    assert [hits[0].fact_id for hits in matrix.search_batch(queries, k=2)] == list(range(10))
@@ -0,0 +1,48 @@
+import hashlib
+import json
+import threading
+import time
+
+from agent import watch
+
+
+def _wait_for(events, predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        found = [fields for name, fields in list(events) if predicate(name, fields)]
+        if found:
+            return found[0]
+        time.sleep(0.01)
+    raise AssertionError(f"no matching event in {events}")
+
+
+def test_polling_watch_reports_tampering_and_restore(tmp_path):
+    tracked = tmp_path / "core.txt"
+    tracked.write_text("original")
+    manifest_path = tmp_path / "core_manifest.json"
+    manifest = {str(tracked): hashlib.sha256(b"original").hexdigest()}
+    manifest_path.write_text(json.dumps(manifest))
+    events = []
+    stop = threading.Event()
+    worker = threading.Thread(target=watch.watch, kwargs=dict(
+        load_manifest=lambda: json.loads(manifest_path.read_text()), manifest_path=str(manifest_path),
+        log=lambda event, **fields: events.append((event, fields)), debounce=0.05, poll=True, interval=0.02,
+        workers=1, stop=stop))
+    worker.start()
+    try:
+        started = _wait_for(events, lambda name, f: name == "watch.started")
+        assert started["backend"] == "PollingWatcher" and started["files"] == 1
+        assert not [f for name, f in events if name == "watch.file"]
+
+        tracked.write_text("tampered!")
+        tampered = _wait_for(events, lambda name, f: name == "watch.file")
+        assert tampered == {"path": str(tracked), "status": "TAMPERED", "restored": False}
+
+        tracked.write_text("original")
+        restored = _wait_for(events, lambda name, f: name == "watch.file" and f["status"] == "ok")
+        assert restored["restored"] is True
+    finally:
+        stop.set()
+        worker.join(5)
+    assert not worker.is_alive()
+    assert events[-1] == ("watch.stopped", {})
@@ -0,0 +1,130 @@
+"""Sparse TF-IDF scoring with NumPy.
+
+The fact table is compiled once per KnowledgeSnapshot into L2-normalized
+float32 TF-IDF weights, stored column-major as compressed sparse arrays
+(`indptr`, `indices`, `data`: for each term, the facts that contain it). Memory
+grows with the number of (fact, term) pairs, not facts x vocabulary, so a
+large knowledge base with a real vocabulary stays in the tens of megabytes.
+
+A prompt touches only the postings of its own terms: each term's weight is
+scattered into a score row with one vectorized add, and a block of prompts is
+ranked together with `argpartition`. Score rows are dense over facts, so a
+batch is processed in blocks of at most SCORE_BLOCK_BYTES.
+
+NumPy is optional; `available()` reports whether this strategy can be used.
+"""
+import math
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+import retrieval
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the install
+    np = None
+
+# upper bound for one block of dense score rows (prompts x facts, float32)
+SCORE_BLOCK_BYTES = 16 << 20
+
+
+def available() -> bool:
+    return np is not None
+
+
+class TfidfMatrix:
+    def __init__(self, facts: retrieval.FactTable):
+        if np is None:
+            raise RuntimeError("the tfidf strategy requires numpy")
+        self.facts = facts
+        docs = [Counter(retrieval.fact_terms(p, t)) for p, t in zip(facts.paths, facts.texts)]
+        df: Counter = Counter()
+        for counts in docs:
+            df.update(counts.keys())
+        self.vocab: Dict[str, int] = {term: i for i, term in enumerate(sorted(df))}
+        n = len(docs)
+        self.idf = np.array([math.log((1.0 + n) / (1.0 + df[t])) + 1.0 for t in sorted(df)], dtype=np.float32)
+        nnz = sum(len(counts) for counts in docs)
+        rows = np.empty(nnz, dtype=np.int32)
+        cols = np.empty(nnz, dtype=np.int32)
+        tf = np.empty(nnz, dtype=np.float32)
+        pos = 0
+        for row, counts in enumerate(docs):
+            end = pos + len(counts)
+            rows[pos:end] = row
+            cols[pos:end] = [self.vocab[term] for term in counts]
+            tf[pos:end] = list(counts.values())
+            pos = end
+        weights = tf * self.idf[cols]
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=n))
+        norms[norms == 0.0] = 1.0
+        weights = (weights / norms[rows]).astype(np.float32)
+        # column-major: postings of term t are indices/data[indptr[t]:indptr[t + 1]]
+        order = np.argsort(cols, kind="stable")
+        self.indices = rows[order]
+        self.data = weights[order]
+        self.indptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cols, minlength=len(self.vocab)), out=self.indptr[1:])
+
+    def __len__(self) -> int:
+        return len(self.facts)
+
+    @property
+    def nbytes(self) -> int:
+        return self.indices.nbytes + self.data.nbytes + self.indptr.nbytes + self.idf.nbytes
+
+    def vectorize(self, query: str) -> List[Tuple[int, float]]:
+        """(term column, weight) pairs of the L2-normalized query vector."""
+        counts = Counter(col for col in map(self.vocab.get, retrieval.tokenize(query)) if col is not None)
+        weights = [(col, tf * float(self.idf[col])) for col, tf in counts.items()]
+        norm = math.sqrt(sum(w * w for _, w in weights)) or 1.0
+        return [(col, w / norm) for col, w in weights]
+
+    def _score_into(self, row, query: str) -> None:
+        for col, weight in self.vectorize(query):
+            lo, hi = self.indptr[col], self.indptr[col + 1]
+            # a term's postings name each fact once, so fancy-index += is exact
+            row[self.indices[lo:hi]] += weight * self.data[lo:hi]
+
+    def search_batch(self, queries: Sequence[str], k: int = 3) -> List[List[retrieval.Hit]]:
+        n = len(self.facts)
+        if not queries:
+            return []
+        if n == 0 or k <= 0:
+            return [[] for _ in queries]
+        k = min(k, n)
+        block = max(1, SCORE_BLOCK_BYTES // (4 * n))
+        facts = self.facts
+        out = []
+        for start in range(0, len(queries), block):
+            chunk = queries[start:start + block]
+            scores = np.zeros((len(chunk), n), dtype=np.float32)
+            for row, query in enumerate(chunk):
+                self._score_into(scores[row], query)
+            if k < n:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                top = np.broadcast_to(np.arange(n), (len(chunk), n))
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            for ids, vals in zip(top.tolist(), top_scores.tolist()):
+                out.append([retrieval.Hit(i, s, facts.section(i), facts.paths[i], facts.texts[i])
+                            for i, s in zip(ids, vals) if s > 0.0])
+        return out
+
+    def search(self, query: str, k: int = 3) -> List[retrieval.Hit]:
+        return self.search_batch([query], k)[0]
+
+
+def build_matrix(snapshot) -> TfidfMatrix:
+    return TfidfMatrix(retrieval.facts_for(snapshot))
+
+
+def matrix_for(snapshot) -> TfidfMatrix:
+    return snapshot.derived("tfidf", build_matrix)
+
+
+def warm(snapshot) -> None:
+    matrix_for(snapshot)
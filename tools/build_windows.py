@@ -12,6 +12,15 @@ Usage (recommended on Windows):
 Usage (to prepare frontend bundle on current machine):
   python tools/build_windows.py --prepare
 
+Usage (repeated packaging runs):
+  python tools/build_windows.py --prepare --incremental
+
+With --incremental the build keeps a content-hash manifest of its inputs and
+outputs in build/.build_state.json. The frontend build is skipped while the
+sources under offline_ui/ are unchanged, only changed files are copied
+(hardlinked where the filesystem allows), and outputs whose source is gone are
+pruned. Files whose size and mtime are unchanged are not re-hashed.
+
 This script is safe to run locally and is intended to be run by Jessie on a dev
 machine or CI runner that targets Windows. It writes a /build/ folder with the
 prepared payload and a `pyinstaller_cmd.txt` file containing the exact command
@@ -19,18 +28,32 @@ to run on Windows.
 """
 from __future__ import annotations
 import argparse
+import hashlib
 import json
 import os
 import platform
 import shutil
 import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[1]
 OFFLINE_UI = ROOT / "offline_ui"
 BUILD_DIR = ROOT / "build" / "cridergpt_app"
 DIST_DIR = OFFLINE_UI / "dist"
+STATE_PATH = ROOT / "build" / ".build_state.json"
+STATE_VERSION = 1
+# everything under offline_ui/ that feeds `npm run build`
+FRONTEND_INPUTS = ["src", "public", "index.html", "package.json", "package-lock.json", "vite.config.ts",
+                   "tsconfig.json", "tailwind.config.js", "postcss.config.cjs"]
+# files in the build tree that are not copies of a source
+BUILD_OWN_FILES = {"pyinstaller_cmd.txt"}
+# written by the running app, so a hardlinked output would change with it
+RUNTIME_DIRS = ("offline_logs", "shadow")
+SKIP_NAMES = {"__pycache__"}
+SKIP_SUFFIXES = (".pyc", ".pyo")
 
 
 def check_dirs():
@@ -51,9 +74,172 @@ def run_frontend_build():
         subprocess.check_call(["npm", "install"], cwd=str(OFFLINE_UI))
     print("Running npm run build in offline_ui...")
     subprocess.check_call(["npm", "run", "build"], cwd=str(OFFLINE_UI))
+    print("Precompressing dist assets (gzip/brotli)...")
+    subprocess.check_call([sys.executable, str(ROOT / "tools" / "precompress_assets.py"), "--dist", str(DIST_DIR)])
     return True
 
 
+# ------------------------------------------------------------- incremental
+
+
+def load_state() -> dict:
+    try:
+        state = json.loads(STATE_PATH.read_text(encoding="utf-8"))
+        if state.get("version") == STATE_VERSION:
+            return state
+    except (OSError, ValueError):
+        pass
+    return {"version": STATE_VERSION, "sources": {}, "outputs": {}, "frontend": None}
+
+
+def save_state(state: dict) -> None:
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, STATE_PATH)
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_hash(path: Path, known: dict) -> str:
+    """sha256 of a file, reusing `known[rel]` = [size, mtime_ns, sha] when the stat matches."""
+    rel = path.relative_to(ROOT).as_posix()
+    st = path.stat()
+    entry = known.get(rel)
+    if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+        return entry[2]
+    digest = _sha256(path)
+    known[rel] = [st.st_size, st.st_mtime_ns, digest]
+    return digest
+
+
+def _walk(src: Path):
+    if src.is_file():
+        yield src
+        return
+    for dirpath, dirnames, filenames in os.walk(src):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_NAMES)
+        for fn in sorted(filenames):
+            if not fn.endswith(SKIP_SUFFIXES):
+                yield Path(dirpath) / fn
+
+
+def frontend_inputs_hash(known: dict, workers: int) -> str:
+    files = [p for name in FRONTEND_INPUTS if (OFFLINE_UI / name).exists() for p in _walk(OFFLINE_UI / name)]
+    with ThreadPoolExecutor(workers) as pool:
+        digests = list(pool.map(lambda p: file_hash(p, known), files))
+    h = hashlib.sha256()
+    for p, digest in zip(files, digests):
+        h.update(f"{p.relative_to(OFFLINE_UI).as_posix()}\0{digest}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def build_plan() -> dict:
+    """Build-tree path (relative to BUILD_DIR) -> source file, same layout as prepare_build_tree."""
+    plan = {}
+    for p in sorted(ROOT.glob("*.py")):
+        plan[f"backend/{p.name}"] = p
+    for d in ["agent", "offline_logs", "shadow"]:
+        src = ROOT / d
+        if src.exists():
+            for p in _walk(src):
+                plan[f"{d}/{p.relative_to(src).as_posix()}"] = p
+    if DIST_DIR.exists():
+        for p in _walk(DIST_DIR):
+            plan[f"www/{p.relative_to(DIST_DIR).as_posix()}"] = p
+    return plan
+
+
+def linkable(rel: str) -> bool:
+    """Only immutable inputs (backend code, agent code, the built UI) may be hardlinked."""
+    top = rel.split("/", 1)[0]
+    if top in RUNTIME_DIRS:
+        return False
+    return top in ("backend", "www") or rel.endswith(".py")
+
+
+def _place(src: Path, dst: Path, link: bool) -> str:
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if dst.exists() or dst.is_symlink():
+        dst.unlink()
+    if link:
+        try:
+            os.link(src, dst)
+            return "linked"
+        except OSError:
+            pass  # other volume, or no hardlink support: fall back to a copy
+    shutil.copy2(src, dst)
+    return "copied"
+
+
+def sync_build_tree(state: dict, workers: int, link: bool = True) -> dict:
+    """Bring BUILD_DIR in line with build_plan(), touching only what changed."""
+    plan = build_plan()
+    known = state["sources"]
+    outputs = state["outputs"]
+    BUILD_DIR.mkdir(parents=True, exist_ok=True)
+
+    def one(item):
+        rel, src = item
+        digest = file_hash(src, known)
+        dst = BUILD_DIR / rel
+        may_link = link and linkable(rel)
+        if outputs.get(rel) == digest and dst.exists():
+            out, st = dst.stat(), src.stat()
+            # a runtime file hardlinked by an older run must become a real copy
+            if out.st_size == st.st_size and (may_link or not os.path.samestat(out, st)):
+                return rel, digest, "unchanged"
+        return rel, digest, _place(src, dst, may_link)
+
+    counts = {"unchanged": 0, "copied": 0, "linked": 0, "pruned": 0}
+    new_outputs = {}
+    with ThreadPoolExecutor(workers) as pool:
+        for rel, digest, action in pool.map(one, plan.items()):
+            counts[action] += 1
+            new_outputs[rel] = digest
+
+    # prune outputs whose source no longer exists (or was never ours)
+    for dirpath, dirnames, filenames in os.walk(BUILD_DIR, topdown=False):
+        for fn in filenames:
+            rel = (Path(dirpath) / fn).relative_to(BUILD_DIR).as_posix()
+            if rel not in new_outputs and rel not in BUILD_OWN_FILES:
+                os.remove(Path(dirpath) / fn)
+                counts["pruned"] += 1
+        if Path(dirpath) != BUILD_DIR and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+    state["outputs"] = new_outputs
+    state["sources"] = {k: v for k, v in known.items() if (ROOT / k).exists()}
+    return counts
+
+
+def prepare_incremental(skip_frontend: bool, workers: int, link: bool) -> None:
+    started = time.perf_counter()
+    state = load_state()
+    inputs = frontend_inputs_hash(state["sources"], workers) if OFFLINE_UI.exists() else None
+    if skip_frontend:
+        print("Frontend build: skipped (--skip-frontend)")
+    elif inputs is not None and state.get("frontend") == inputs and DIST_DIR.exists():
+        print("Frontend build: skipped (offline_ui sources unchanged)")
+    else:
+        try:
+            if run_frontend_build():
+                state["frontend"] = inputs
+        except Exception as e:
+            print("Frontend build failed:", e)
+    if not DIST_DIR.exists():
+        print("Warning: frontend dist not found; build will include no static UI. Run frontend build first.")
+    counts = sync_build_tree(state, workers, link)
+    save_state(state)
+    print(f"Build tree: {counts['unchanged']} unchanged, {counts['copied']} copied, {counts['linked']} hardlinked, "
+          f"{counts['pruned']} pruned ({time.perf_counter() - started:.2f}s)")
+
+
 def prepare_build_tree():
     # clear build dir
     if BUILD_DIR.exists():
@@ -109,6 +295,12 @@ def main():
     parser.add_argument("--pyinstaller", action="store_true", help="Run pyinstaller when on Windows")
     parser.add_argument("--icon", help="Path to .ico to embed into exe (relative to repo root)")
     parser.add_argument("--version", default="1.0", help="Version string to embed into exe name")
+    parser.add_argument("--incremental", action="store_true",
+                        help="With --prepare: rebuild only what changed since the last incremental run")
+    parser.add_argument("--skip-frontend", action="store_true", help="With --incremental: never run npm")
+    parser.add_argument("--no-hardlinks", action="store_true", help="With --incremental: copy code and UI assets too")
+    parser.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 1) * 2),
+                        help="Threads for hashing and copying (--incremental)")
     args = parser.parse_args()
 
     print("Checking required directories...")
@@ -116,13 +308,20 @@ def main():
     for k, v in present.items():
         print(f"  {k}: {'FOUND' if v else 'MISSING'}")
 
-    if args.prepare:
+    if args.prepare and args.incremental:
+        prepare_incremental(args.skip_frontend, args.workers, link=not args.no_hardlinks)
+        cmd = generate_pyinstaller_command(args.icon, args.version)
+        write_pyinstaller_cmd(cmd)
+    elif args.prepare:
         # run frontend build if possible
         try:
             run_frontend_build()
         except Exception as e:
             print("Frontend build failed:", e)
         prepare_build_tree()
+        # the tree was rebuilt from scratch: the next incremental run must not trust old state
+        if STATE_PATH.exists():
+            STATE_PATH.unlink()
         cmd = generate_pyinstaller_command(args.icon, args.version)
         write_pyinstaller_cmd(cmd)
 
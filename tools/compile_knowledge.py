@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Validate knowledge.json and compile it into a memory-mappable snapshot.
+
+The snapshot (default: knowledge/knowledge.snap) holds a string table, the
+fact table and the prebuilt search index, stamped with the SHA-256 of the
+source JSON. The backend maps it at startup instead of parsing JSON, and
+falls back to the JSON whenever the stamp no longer matches.
+
+Usage:
+  python tools/compile_knowledge.py                 # validate + compile
+  python tools/compile_knowledge.py --check         # validate only
+
+Exits with code 0 on success, 1 on validation errors.
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import knowledge_snapshot  # noqa: E402
+import retrieval  # noqa: E402
+
+KNOW = os.path.join(ROOT, 'knowledge', 'knowledge.json')
+
+
+def _check_leaf(value, where, errors):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _check_leaf(v, f'{where}/{k}', errors)
+    elif isinstance(value, list):
+        for i, v in enumerate(value):
+            if isinstance(v, (dict, list)):
+                errors.append(f'{where}/{i}: lists may only hold strings or numbers')
+            else:
+                _check_leaf(v, f'{where}/{i}', errors)
+    elif isinstance(value, bool) or value is None:
+        errors.append(f'{where}: facts must be strings or numbers, got {json.dumps(value)}')
+    elif not isinstance(value, (str, int, float)):
+        errors.append(f'{where}: unsupported value type {type(value).__name__}')
+
+
+def validate(data):
+    """Return a list of schema errors (empty when the knowledge base is valid)."""
+    errors = []
+    if not isinstance(data, dict):
+        return ['top level must be a JSON object']
+    personality = data.get('personality')
+    if personality is not None:
+        if not isinstance(personality, dict):
+            errors.append('personality: must be an object')
+        elif not isinstance(personality.get('tone', ''), str):
+            errors.append('personality/tone: must be a string')
+    permissions = data.get('permissions')
+    if permissions is not None:
+        if not isinstance(permissions, dict):
+            errors.append('permissions: must be an object')
+        elif not isinstance(permissions.get('allow_edit', False), bool):
+            errors.append('permissions/allow_edit: must be true or false')
+    for section, body in data.items():
+        if section in retrieval.META_SECTIONS:
+            continue
+        if not isinstance(body, dict):
+            errors.append(f'{section}: sections must be objects keyed by entity')
+            continue
+        for entity, fields in body.items():
+            if not isinstance(fields, dict):
+                errors.append(f'{section}/{entity}: entities must be objects')
+                continue
+            _check_leaf(fields, f'{section}/{entity}', errors)
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate and compile knowledge.json')
+    parser.add_argument('--source', default=KNOW, help='knowledge JSON to compile')
+    parser.add_argument('--out', help='snapshot path (default: <source>.snap)')
+    parser.add_argument('--check', action='store_true', help='validate only; do not write a snapshot')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print('knowledge.json not found at', args.source)
+        sys.exit(1)
+    with open(args.source, 'rb') as f:
+        st = os.fstat(f.fileno())
+        raw = f.read()
+    try:
+        data = json.loads(raw.decode('utf-8'))
+    except ValueError as e:
+        print('Invalid JSON:', e)
+        sys.exit(1)
+    errors = validate(data)
+    if errors:
+        print(f'{args.source}: {len(errors)} schema error(s)')
+        for e in errors:
+            print('  ', e)
+        sys.exit(1)
+    print('Schema OK:', args.source)
+    if args.check:
+        return
+    out = args.out or knowledge_snapshot.default_path(args.source)
+    info = knowledge_snapshot.write_snapshot(raw, out, st)
+    print(f"Wrote {out}: {info['facts']} facts, {info['terms']} terms, {info['bytes']} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""Precompress the built UI (offline_ui/dist) for the backend's static table.
+
+Writes `<file>.gz` (and `<file>.br` when the optional `brotli` package is
+installed) next to every compressible asset, skipping variants that would
+not be smaller. Run after `npm run build`; tools/build_windows.py does this
+automatically.
+
+Usage:
+  python tools/precompress_assets.py [--dist offline_ui/dist] [--force]
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import static_assets  # noqa: E402
+
+DIST = os.path.join(ROOT, 'offline_ui', 'dist')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompress static UI assets')
+    parser.add_argument('--dist', default=DIST, help='built frontend directory')
+    parser.add_argument('--force', action='store_true', help='recompress even if up to date')
+    args = parser.parse_args()
+    if not os.path.isdir(args.dist):
+        print('dist folder not found at', args.dist)
+        sys.exit(1)
+    if static_assets.brotli is None:
+        print('brotli not installed; writing gzip variants only (pip install brotli for .br)')
+    written = static_assets.precompress_dir(args.dist, force=args.force)
+    for path, enc, raw, packed in written:
+        print(f'  {os.path.relpath(path, args.dist)} [{enc}] {raw} -> {packed} bytes')
+    print(f'Wrote {len(written)} compressed variant(s) in {args.dist}')
+
+
+if __name__ == '__main__':
+    main()